@@ -0,0 +1,6 @@
+"""
+Benchmarks of PyPSA for airspeed velocity (asv).
+
+Run them with ``asv run`` from the root of the repository, see
+:doc:`unit_testing` in the documentation.
+"""
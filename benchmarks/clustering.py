@@ -0,0 +1,27 @@
+"""
+Benchmarks of the spatial clustering.
+"""
+
+from pypsa.networkclustering import (busmap_by_rectangular_grid,
+                                     get_clustering_from_busmap)
+
+from .common import sizes
+from .synthetic import synthetic_network
+
+
+class Clustering:
+    params = sizes
+    param_names = ['buses']
+    timeout = 300
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses, n_snapshots=24, extendable=False)
+        # all lines must have the same type to be aggregated
+        self.n.lines['type'] = ''
+        self.busmap = busmap_by_rectangular_grid(self.n.buses, 10)
+
+    def time_busmap_by_rectangular_grid(self, n_buses):
+        busmap_by_rectangular_grid(self.n.buses, 10)
+
+    def time_get_clustering_from_busmap(self, n_buses):
+        get_clustering_from_busmap(self.n, self.busmap)
@@ -0,0 +1,23 @@
+"""
+Helpers shared by the benchmarks.
+"""
+
+import logging
+import shutil
+
+# keep the output of asv clean
+logging.getLogger('pypsa').setLevel(logging.ERROR)
+
+#: numbers of buses of the synthetic networks
+sizes = [100, 500, 2000]
+
+
+def solver_name():
+    """
+    Return the name of an installed open source solver, the benchmark is
+    skipped if neither cbc nor glpk is available.
+    """
+    for solver, executable in [('cbc', 'cbc'), ('glpk', 'glpsol')]:
+        if shutil.which(executable) is not None:
+            return solver
+    raise NotImplementedError("Neither cbc nor glpk is installed")
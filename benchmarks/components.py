@@ -0,0 +1,39 @@
+"""
+Benchmarks of building, copying and checking networks.
+"""
+
+import pypsa
+
+from .common import sizes
+from .synthetic import synthetic_network
+
+
+class Network:
+
+    def time_create(self):
+        pypsa.Network()
+
+
+class Copy:
+    params = sizes
+    param_names = ['buses']
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses)
+
+    def time_copy(self, n_buses):
+        self.n.copy()
+
+    def time_getitem(self, n_buses):
+        self.n[self.n.buses.index[::2]]
+
+
+class ConsistencyCheck:
+    params = (sizes, [False, True])
+    param_names = ['buses', 'fail_fast']
+
+    def setup(self, n_buses, fail_fast):
+        self.n = synthetic_network(n_buses, n_snapshots=168)
+
+    def time_consistency_check(self, n_buses, fail_fast):
+        self.n.consistency_check(fail_fast=fail_fast)
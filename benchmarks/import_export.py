@@ -0,0 +1,69 @@
+"""
+Benchmarks of the export and import of networks.
+"""
+
+import shutil
+import tempfile
+
+import pypsa
+
+from .common import sizes
+from .synthetic import synthetic_network
+
+
+class _ExportImport:
+    params = sizes
+    param_names = ['buses']
+    suffix = None
+
+    def setup(self, n_buses):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = self.tmpdir + '/network' + self.suffix
+        self.n = synthetic_network(n_buses, n_snapshots=168, n_dc_buses=5)
+        self.export(self.n, self.path)
+
+    def teardown(self, n_buses):
+        shutil.rmtree(self.tmpdir)
+
+    def time_export(self, n_buses):
+        self.export(self.n, self.path)
+
+    def time_import(self, n_buses):
+        self.load(pypsa.Network(), self.path)
+
+
+class CsvFolder(_ExportImport):
+    suffix = ''
+
+    def export(self, n, path):
+        n.export_to_csv_folder(path)
+
+    def load(self, n, path):
+        n.import_from_csv_folder(path)
+
+
+class Hdf5(_ExportImport):
+    suffix = '.h5'
+
+    def export(self, n, path):
+        n.export_to_hdf5(path)
+
+    def load(self, n, path):
+        n.import_from_hdf5(path)
+
+
+class NetCDF(_ExportImport):
+    suffix = '.nc'
+
+    def setup(self, n_buses):
+        try:
+            import netCDF4, xarray
+        except ImportError:
+            raise NotImplementedError("xarray or netCDF4 is not installed")
+        super().setup(n_buses)
+
+    def export(self, n, path):
+        n.export_to_netcdf(path)
+
+    def load(self, n, path):
+        n.import_from_netcdf(path)
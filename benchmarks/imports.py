@@ -0,0 +1,27 @@
+"""
+Benchmarks of the import time, each measured in a fresh interpreter.
+"""
+
+import os
+
+ac_dc = os.path.join(os.path.dirname(__file__), os.pardir, 'examples',
+                     'ac-dc-meshed', 'ac-dc-data')
+
+
+def timeraw_import_pypsa():
+    return "import pypsa"
+
+
+def timeraw_import_pypsa_and_read_network():
+    return """
+    import pypsa
+    pypsa.Network({!r})
+    """.format(ac_dc)
+
+
+def timeraw_import_pypsa_linopf():
+    return "import pypsa.linopf"
+
+
+def timeraw_import_pypsa_opf():
+    return "import pypsa.opf"
@@ -0,0 +1,94 @@
+"""
+Benchmarks of building and solving the linear optimal power flow with and
+without pyomo.
+"""
+
+import os
+import tempfile
+
+from pypsa.linopf import prepare_lopf, assign_solution
+from pypsa.linopt import run_and_read_cbc, run_and_read_glpk
+from pypsa.opf import network_lopf_build_model
+
+from .common import sizes, solver_name
+from .synthetic import synthetic_network
+
+
+def _remove_lp_file(fdp, problem_fn):
+    os.close(fdp)
+    os.remove(problem_fn)
+
+
+class PrepareLopf:
+    params = sizes
+    param_names = ['buses']
+    timeout = 300
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses, n_snapshots=24, n_dc_buses=5)
+        self.n.calculate_dependent_values()
+        self.n.determine_network_topology()
+
+    def time_prepare_lopf(self, n_buses):
+        _remove_lp_file(*prepare_lopf(self.n))
+
+    def peakmem_prepare_lopf(self, n_buses):
+        _remove_lp_file(*prepare_lopf(self.n))
+
+
+class BuildPyomoModel:
+    params = sizes[:-1]
+    param_names = ['buses']
+    timeout = 300
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses, n_snapshots=24, n_dc_buses=5)
+
+    def time_network_lopf_build_model(self, n_buses):
+        network_lopf_build_model(self.n, formulation='kirchhoff')
+
+    def peakmem_network_lopf_build_model(self, n_buses):
+        network_lopf_build_model(self.n, formulation='kirchhoff')
+
+
+class AssignSolution:
+    params = sizes[:-1]
+    param_names = ['buses']
+    timeout = 600
+
+    def setup(self, n_buses):
+        solver = solver_name()
+        # without capacity expansion the open source solvers are much faster
+        self.n = n = synthetic_network(n_buses, n_snapshots=24, n_dc_buses=5,
+                                       extendable=False)
+        n.calculate_dependent_values()
+        n.determine_network_topology()
+        fdp, problem_fn = prepare_lopf(n)
+        fds, solution_fn = tempfile.mkstemp(suffix='.sol')
+        run = run_and_read_cbc if solver == 'cbc' else run_and_read_glpk
+        res = run(n, problem_fn, solution_fn, None, None, False, False, False)
+        self.variables_sol, self.constraints_dual = res[2], res[3]
+        _remove_lp_file(fdp, problem_fn)
+        _remove_lp_file(fds, solution_fn)
+
+    def time_assign_solution(self, n_buses):
+        # keep the references to repeat the assignment
+        assign_solution(self.n, self.n.snapshots, self.variables_sol,
+                        self.constraints_dual, keep_references=True)
+
+
+class Lopf:
+    params = (sizes[:-1], [False, True])
+    param_names = ['buses', 'pyomo']
+    timeout = 600
+
+    def setup(self, n_buses, pyomo):
+        self.solver = solver_name()
+        self.n = synthetic_network(n_buses, n_snapshots=24, n_dc_buses=5,
+                                   extendable=False)
+
+    def time_lopf(self, n_buses, pyomo):
+        self.n.lopf(solver_name=self.solver, pyomo=pyomo)
+
+    def peakmem_lopf(self, n_buses, pyomo):
+        self.n.lopf(solver_name=self.solver, pyomo=pyomo)
@@ -0,0 +1,76 @@
+"""
+Benchmarks of the linear and non-linear power flow.
+"""
+
+from .common import sizes
+from .synthetic import synthetic_network
+
+
+class PowerFlow:
+    params = (sizes, ['nr', 'fdxb'])
+    param_names = ['buses', 'algorithm']
+    timeout = 300
+
+    def setup(self, n_buses, algorithm):
+        # the non-linear power flow does not support DC sub-networks
+        self.n = synthetic_network(n_buses, n_snapshots=2)
+        self.n.determine_network_topology()
+        self.sub_network = self.n.sub_networks.obj.iat[0]
+
+    def time_network_pf(self, n_buses, algorithm):
+        self.n.pf(algorithm=algorithm)
+
+    def time_sub_network_pf(self, n_buses, algorithm):
+        self.sub_network.pf(self.n.snapshots, algorithm=algorithm)
+
+    def peakmem_network_pf(self, n_buses, algorithm):
+        self.n.pf(algorithm=algorithm)
+
+
+class ParallelPowerFlow:
+    params = ([1, 2, 4], ['thread', 'process'])
+    param_names = ['workers', 'executor']
+    timeout = 300
+
+    def setup(self, workers, executor):
+        self.n = synthetic_network(500, n_snapshots=24)
+        self.n.determine_network_topology()
+
+    def time_network_pf(self, workers, executor):
+        self.n.pf(workers=workers, executor=executor)
+
+
+class LinearPowerFlow:
+    params = sizes
+    param_names = ['buses']
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses, n_snapshots=24, n_dc_buses=5)
+        self.n.determine_network_topology()
+
+    def time_network_lpf(self, n_buses):
+        self.n.lpf()
+
+    def time_calculate_B_H(self, n_buses):
+        for sub_network in self.n.sub_networks.obj:
+            sub_network.calculate_B_H()
+
+    def peakmem_network_lpf(self, n_buses):
+        self.n.lpf()
+
+
+class DependentValues:
+    params = sizes
+    param_names = ['buses']
+
+    def setup(self, n_buses):
+        self.n = synthetic_network(n_buses)
+        self.n.lines.type = 'Al/St 240/40 4-bundle 380.0'
+        self.n.calculate_dependent_values()
+
+    def time_unchanged(self, n_buses):
+        self.n.calculate_dependent_values()
+
+    def time_changed_line(self, n_buses):
+        self.n.lines.iat[0, self.n.lines.columns.get_loc('length')] += 1.
+        self.n.calculate_dependent_values()
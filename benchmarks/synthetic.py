@@ -0,0 +1,128 @@
+"""
+Parametric synthetic networks for the benchmarks.
+
+The buses are placed on a square grid and connected to their neighbours by
+lines, so that the network is meshed and forms a single synchronous area.
+A few random lines between more distant buses, a DC sub-network and
+time-varying loads, wind and solar availabilities are added. All data
+is drawn from a seeded random state, so that equal parameters give equal
+networks.
+"""
+
+import numpy as np
+import pandas as pd
+
+import pypsa
+
+
+def synthetic_network(n_buses=100, n_snapshots=24, generators_per_bus=2,
+                      storage_fraction=0.2, extra_lines=0.1, n_dc_buses=0,
+                      extendable=True, seed=0):
+    """
+    Build a synthetic network.
+
+    Parameters
+    ----------
+    n_buses : int
+        Number of AC buses, placed on a square grid.
+    n_snapshots : int
+        Number of hourly snapshots.
+    generators_per_bus : int
+        Number of generators at each bus, cycling through wind, solar, gas
+        and coal starting at a different carrier for each bus.
+    storage_fraction : float
+        Fraction of buses with a storage unit.
+    extra_lines : float
+        Number of additional lines between random buses relative to the
+        number of buses.
+    n_dc_buses : int
+        Number of DC buses, each connected to the AC grid by a converter
+        link and to the next DC bus by a DC line. The non-linear power flow
+        does not support DC sub-networks.
+    extendable : bool
+        Make the line, generator and storage capacities extendable.
+    seed : int
+        Seed of the random state.
+
+    Returns
+    -------
+    pypsa.Network
+    """
+
+    rng = np.random.RandomState(seed)
+    n = pypsa.Network()
+    n.set_snapshots(pd.date_range('2020-01-01', periods=n_snapshots, freq='H'))
+    hours = np.arange(n_snapshots)
+
+    width = int(np.ceil(np.sqrt(n_buses)))
+    buses = pd.Index(['bus{}'.format(i) for i in range(n_buses)])
+    x = np.arange(n_buses) % width + rng.uniform(-.2, .2, n_buses)
+    y = np.arange(n_buses) // width + rng.uniform(-.2, .2, n_buses)
+    n.madd('Bus', buses, v_nom=380., x=x, y=y)
+
+    # neighbours on the grid and random meshing
+    i = np.arange(n_buses)
+    right = i[(i % width < width - 1) & (i + 1 < n_buses)]
+    down = i[i + width < n_buses]
+    n_extra = int(extra_lines * n_buses)
+    extra0 = rng.randint(0, n_buses, n_extra)
+    extra1 = rng.randint(0, n_buses, n_extra)
+    keep = extra0 != extra1
+    bus0 = np.r_[right, down, extra0[keep]]
+    bus1 = np.r_[right + 1, down + width, extra1[keep]]
+    length = 100. * np.hypot(x[bus0] - x[bus1], y[bus0] - y[bus1])
+    n.madd('Line', ['line{}'.format(k) for k in range(len(bus0))],
+           bus0=buses[bus0], bus1=buses[bus1], length=length,
+           x=0.3 * length, r=0.03 * length, s_nom=1000.,
+           s_nom_extendable=extendable, capital_cost=40. * length)
+
+    # loads with a daily profile
+    daily = 1 + 0.3 * np.sin(2 * np.pi * (hours - 6) / 24)
+    load = rng.uniform(50, 200, n_buses)
+    n.madd('Load', buses, suffix=' load', bus=buses,
+           p_set=pd.DataFrame(np.outer(daily, load), n.snapshots, buses))
+
+    carriers = pd.DataFrame({'marginal_cost': [0., 0., 30., 20.],
+                             'capital_cost': [1000., 600., 400., 1500.],
+                             'co2_emissions': [0., 0., 0.2, 0.3]},
+                            index=['wind', 'solar', 'gas', 'coal'])
+    n.madd('Carrier', carriers.index, co2_emissions=carriers.co2_emissions)
+
+    gens = pd.DataFrame([(b, carriers.index[(k + j) % len(carriers)])
+                         for k in range(generators_per_bus)
+                         for j, b in enumerate(buses)],
+                        columns=['bus', 'carrier'])
+    gens.index = gens.bus + ' ' + gens.carrier + gens.groupby(['bus', 'carrier']).cumcount().astype(str)
+    profile = {'wind': lambda k: rng.beta(1.5, 3, (n_snapshots, k)),
+               'solar': lambda k: np.clip(np.sin(np.pi * (hours % 24 - 6) / 12), 0, None)[:, None]
+                                  * rng.uniform(0.6, 1., (n_snapshots, k))}
+    p_max_pu = pd.concat([pd.DataFrame(profile[c](len(g)), n.snapshots, g.index)
+                          for c, g in gens.groupby('carrier') if c in profile], axis=1)
+    # the dispatch of the power flow follows the load
+    p_set = np.outer(daily, load.sum() / len(gens) * np.ones(len(gens)))
+    n.madd('Generator', gens.index, bus=gens.bus, carrier=gens.carrier,
+           p_nom=rng.uniform(100, 400, len(gens)), p_nom_extendable=extendable,
+           marginal_cost=carriers.marginal_cost.reindex(gens.carrier).values
+                         + rng.uniform(0, 1, len(gens)),
+           capital_cost=carriers.capital_cost.reindex(gens.carrier).values,
+           p_max_pu=p_max_pu,
+           p_set=pd.DataFrame(p_set, n.snapshots, gens.index))
+
+    storage = buses[rng.rand(n_buses) < storage_fraction]
+    n.madd('StorageUnit', storage, suffix=' battery', bus=storage,
+           p_nom=rng.uniform(50, 100, len(storage)), max_hours=4,
+           p_nom_extendable=extendable, capital_cost=500., marginal_cost=0.1,
+           efficiency_store=0.95, efficiency_dispatch=0.95,
+           cyclic_state_of_charge=True)
+
+    if n_dc_buses:
+        dc = pd.Index(['dc{}'.format(k) for k in range(n_dc_buses)])
+        ac = buses[rng.choice(n_buses, n_dc_buses, replace=False)]
+        n.madd('Bus', dc, carrier='DC', v_nom=200.,
+               x=x[buses.get_indexer(ac)], y=y[buses.get_indexer(ac)])
+        n.madd('Link', dc, suffix=' converter', bus0=ac, bus1=dc, p_min_pu=-1,
+               p_nom=500., efficiency=0.98)
+        n.madd('Line', dc[:-1] + ' dc', bus0=dc[:-1], bus1=dc[1:], r=1.,
+               s_nom=500., s_nom_extendable=extendable, capital_cost=100.)
+
+    return n
@@ -26,13 +26,32 @@ Grid calculation library.
 from __future__ import absolute_import
 
 from . import components, descriptors
-from . import pf, opf, opt, plot, networkclustering, io, contingency, geo, stats
+from . import pf, io, profiling
 
-import sys
+import importlib, sys
+
+# submodules which depend on slow or optional imports like pyomo or matplotlib
+# are only imported on first access, e.g. of pypsa.opf
+_lazy_submodules = ['opf', 'opt', 'plot', 'networkclustering', 'contingency',
+                    'geo', 'stats']
 
 #do this as long as python 2.7 should be supported
 if sys.version_info.major >= 3:
-    from . import linopf, linopt
+    _lazy_submodules += ['linopf', 'linopt']
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in _lazy_submodules:
+            return importlib.import_module('.' + name, __name__)
+        raise AttributeError("module {!r} has no attribute {!r}"
+                             .format(__name__, name))
+
+    def __dir__():
+        return sorted(list(globals()) + _lazy_submodules)
+else:
+    for _module in _lazy_submodules:
+        importlib.import_module('.' + _module, __name__)
+    del _module
 
 
 
@@ -33,6 +33,7 @@ import numpy as np
 import pandas as pd
 from scipy.sparse import csgraph
 from collections import namedtuple
+import hashlib
 import os
 
 
@@ -42,7 +43,8 @@ try:
 except ValueError:
     _pd_version = LooseVersion(pd.__version__)
 
-from .descriptors import Dict, get_switchable_as_dense
+from .descriptors import Dict, get_switchable_as_dense, LazyMethod
+from .profiling import profiled
 
 from .io import (export_to_csv_folder, import_from_csv_folder,
                  export_to_hdf5, import_from_hdf5,
@@ -53,22 +55,12 @@ from .io import (export_to_csv_folder, import_from_csv_folder,
 from .pf import (network_lpf, sub_network_lpf, network_pf,
                  sub_network_pf, find_bus_controls, find_slack_bus, find_cycles,
                  calculate_Y, calculate_PTDF, calculate_B_H,
-                 calculate_dependent_values)
-
-from .contingency import (calculate_BODF, network_lpf_contingency,
-                          network_sclopf)
-
-
-from .opf import network_lopf, network_opf
-
-from .plot import plot, iplot
+                 calculate_B_fast_decoupled, calculate_dependent_values)
 
 from .graph import graph, incidence_matrix, adjacency_matrix
 
-import sys
-
-if sys.version_info.major >= 3:
-    from .linopf import network_lopf as network_lopf_lowmem
+# the optimisation (pyomo), plotting (matplotlib) and contingency modules are
+# imported on first use, see LazyMethod
 
 import logging
 logger = logging.getLogger(__name__)
@@ -98,6 +90,276 @@ for component in components.index:
 
 del component
 
+
+# processed component attributes, keyed by a hash of the components and
+# component_attrs they are derived from
+_schemas = {}
+
+
+def _content_hash(components, component_attrs):
+    h = hashlib.md5()
+    frames = [("components", components)] + sorted(iteritems(component_attrs))
+    for key, df in frames:
+        h.update(str((key, list(df.columns))).encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def _component_schema(components, component_attrs):
+    """
+    Return the processed attributes of all components, i.e. the attributes
+    with the columns 'static', 'varying', 'typ' and 'dtype' and defaults
+    coerced to their types, the empty component DataFrames and the names of
+    the time-varying attributes.
+
+    The schema is computed once per process for each content of
+    `components` and `component_attrs` and shared between all networks
+    built from them. It must therefore be treated as read-only, networks
+    copy the parts they expose.
+    """
+
+    key = _content_hash(components, component_attrs)
+    if key in _schemas:
+        return _schemas[key]
+
+    schema = Dict(components=Dict(components.T.to_dict()), types=Dict(),
+                  static=Dict(), varying=Dict(), standard_types=Dict())
+
+    for c_type in set(components.type.unique()) - {np.nan}:
+        schema.types[c_type] = set(components.index[components.type == c_type])
+
+    for component in components.index:
+        attrs = component_attrs[component].copy()
+
+        attrs['static'] = (attrs['type'] != 'series')
+        attrs['varying'] = attrs['type'].isin({'series', 'static or series'})
+        attrs['typ'] = attrs['type'].map({'boolean': bool, 'int': int, 'string': str}).fillna(float)
+        attrs['dtype'] = attrs['type'].map({'boolean': np.dtype(bool), 'int': np.dtype(int),
+                                            'string': np.dtype('O')}).fillna(np.dtype(float))
+
+        bool_b = attrs.type == 'boolean'
+        attrs.loc[bool_b, 'default'] = attrs.loc[bool_b].isin({True, 'True'})
+
+        #exclude Network because it's not in a DF and has non-typical attributes
+        if component != "Network":
+            attrs.loc[attrs.typ == str, "default"] = attrs.loc[attrs.typ == str, "default"].replace({np.nan: ""})
+            for typ in (str, float, int):
+                attrs.loc[attrs.typ == typ, "default"] = attrs.loc[attrs.typ == typ, "default"].astype(typ)
+
+        schema.components[component]["attrs"] = attrs
+
+        static_dtypes = attrs.loc[attrs.static, "dtype"].drop(["name"])
+        df = pd.DataFrame({k: pd.Series(dtype=d) for k, d in static_dtypes.iteritems()},
+                          columns=static_dtypes.index)
+        df.index.name = "name"
+        schema.static[component] = df
+
+        schema.varying[component] = attrs.index[attrs.varying]
+
+    _schemas[key] = schema
+    return schema
+
+
+def _consistency_issues(network, errors_only=False):
+    """
+    Iterate over the problems found by Network.consistency_check as
+    dictionaries, starting with the cheapest checks. If `errors_only`, the
+    checks which can only lead to warnings are skipped.
+    """
+
+    n = network
+
+    def issue(c, attr, check, severity, message, elements=None, snapshots=None):
+        return dict(component=c.name, attribute=attr, check=check,
+                    severity=severity, elements=elements, snapshots=snapshots,
+                    message=message)
+
+    for c in n.iterate_components(n.all_components):
+        duplicated = c.df.index.duplicated()
+        if duplicated.any():
+            yield issue(c, "name", "index", "error",
+                        "The following %s are defined more than once:\n%s"
+                        % (c.list_name, c.df.index[duplicated].unique()),
+                        elements=c.df.index[duplicated].unique())
+
+    for c in n.iterate_components(n.one_port_components|n.branch_components):
+        for attr in c.df.columns[c.df.columns.str.match(r"^bus\d*$")]:
+            missing = ~c.df[attr].isin(n.buses.index).values
+            if attr not in {"bus", "bus0", "bus1"}:
+                # the additional buses of multi-links are optional
+                missing &= (c.df[attr] != "").values
+            if missing.any():
+                yield issue(c, attr, "bus", "error",
+                            "The following %s have %s which are not defined:\n%s"
+                            % (c.list_name, attr, c.df.index[missing]),
+                            elements=c.df.index[missing])
+
+    # impedances given by zero values are fine if they are defined by a type
+    type_attrs = {"Line": ("line_types", {"x": "x_per_length", "r": "r_per_length"}),
+                  "Transformer": ("transformer_types", {"x": "vsc", "r": "vscr"})}
+    for c in n.iterate_components(n.passive_branch_components):
+        types, type_attr = type_attrs.get(c.name, (None, {}))
+        zero = {}
+        for attr in ["x", "r"]:
+            zero[attr] = (c.df[attr] == 0.).values
+            if attr in type_attr:
+                by_type = getattr(n, types)[type_attr[attr]].reindex(c.df.type).fillna(0.).values
+                if c.name == "Line":
+                    by_type = by_type * c.df.length.values
+                zero[attr] &= (by_type == 0.)
+
+        bad = zero["x"] & zero["r"]
+        if bad.any():
+            yield issue(c, "x", "impedance", "error",
+                        "The following %s have zero series impedance, which will break the load flow:\n%s"
+                        % (c.list_name, c.df.index[bad]),
+                        elements=c.df.index[bad])
+
+        if errors_only:
+            continue
+
+        for attr in ["x", "r"]:
+            if zero[attr].any():
+                yield issue(c, attr, "impedance", "warning",
+                            "The following %s have zero %s, which could break the linear load flow:\n%s"
+                            % (c.list_name, attr, c.df.index[zero[attr]]),
+                            elements=c.df.index[zero[attr]])
+
+    for c in n.iterate_components({"Transformer"}):
+        bad = (c.df["s_nom"] == 0.).values
+        if bad.any():
+            yield issue(c, "s_nom", "impedance", "error",
+                        "The following %s have zero s_nom, which is used to define the impedance and will thus break the load flow:\n%s"
+                        % (c.list_name, c.df.index[bad]),
+                        elements=c.df.index[bad])
+
+    for c in n.iterate_components(n.all_components):
+        for attr in c.attrs.index[c.attrs.varying & c.attrs.static]:
+            attr_df = c.pnl[attr]
+
+            unknown = attr_df.columns[~attr_df.columns.isin(c.df.index)]
+            if len(unknown):
+                yield issue(c, attr, "time series", "error",
+                            "The following %s have time series defined for attribute %s in network.%s_t, but are not defined in network.%s:\n%s"
+                            % (c.list_name, attr, c.list_name, c.list_name, unknown),
+                            elements=unknown)
+
+            missing = n.snapshots[~n.snapshots.isin(attr_df.index)]
+            if len(missing):
+                yield issue(c, attr, "time series", "error",
+                            "In the time-dependent Dataframe for attribute %s of network.%s_t the following snapshots are missing:\n%s"
+                            % (attr, c.list_name, missing),
+                            snapshots=missing)
+
+            if errors_only:
+                continue
+
+            extra = attr_df.index[~attr_df.index.isin(n.snapshots)]
+            if len(extra):
+                yield issue(c, attr, "time series", "warning",
+                            "In the time-dependent Dataframe for attribute %s of network.%s_t the following snapshots are defined which are not in network.snapshots:\n%s"
+                            % (attr, c.list_name, extra),
+                            snapshots=extra)
+
+    # NaN values of inputs, unless NaN is their default
+    for c in n.iterate_components(n.all_components):
+        attrs = c.attrs
+        inputs = attrs.status.str.contains("Input") & attrs.default.notnull()
+
+        static = attrs.index[inputs & attrs.static & (attrs.typ == float)].intersection(c.df.columns)
+        nan = c.df[static].isnull()
+        for attr in static.intersection(attrs.index[attrs.varying]):
+            # static values are overridden by time series
+            nan.loc[c.pnl[attr].columns.intersection(nan.index), attr] = False
+        for attr in static[nan.values.any(axis=0)]:
+            yield issue(c, attr, "nan", "error",
+                        "The attribute %s of the following %s has NaN values:\n%s"
+                        % (attr, c.list_name, c.df.index[nan[attr].values]),
+                        elements=c.df.index[nan[attr].values])
+
+        for attr in attrs.index[inputs & attrs.varying]:
+            attr_df = c.pnl[attr]
+            nan = attr_df.isnull().values
+            if nan.any():
+                elements = attr_df.columns[nan.any(axis=0)]
+                snapshots = attr_df.index[nan.any(axis=1)]
+                yield issue(c, attr, "nan", "error",
+                            "The attribute %s of the following %s has NaN values in network.%s_t:\n%s\nfor the following snapshots:\n%s"
+                            % (attr, c.list_name, c.list_name, elements, snapshots),
+                            elements=elements, snapshots=snapshots)
+
+    for c in n.iterate_components(n.all_components):
+        static = c.attrs.index[c.attrs.static]
+        for attr in static.intersection(["p_nom", "s_nom", "e_nom"]):
+            if attr + "_max" not in static or attr + "_min" not in static:
+                continue
+            bad = (c.df[attr + "_max"] < c.df[attr + "_min"]).values
+            if bad.any():
+                yield issue(c, attr, "bounds", "error",
+                            "The following %s have smaller maximum than minimum expansion limit which can lead to infeasibility:\n%s"
+                            % (c.list_name, c.df.index[bad]),
+                            elements=c.df.index[bad])
+
+        varying = c.attrs.index[c.attrs.varying]
+        for attr in varying[varying.str.endswith("_max_pu")]:
+            min_attr = attr[:-len("_max_pu")] + "_min_pu"
+            if min_attr not in varying:
+                continue
+            max_pu = get_switchable_as_dense(n, c.name, attr)
+            min_pu = get_switchable_as_dense(n, c.name, min_attr)
+            bad = max_pu.values < min_pu.values
+            if bad.any():
+                elements = max_pu.columns[bad.any(axis=0)]
+                snapshots = max_pu.index[bad.any(axis=1)]
+                yield issue(c, attr, "bounds", "error",
+                            "The following %s have a smaller maximum than minimum operational limit which can lead to infeasibility:\n%s\nfor the following snapshots:\n%s"
+                            % (c.list_name, elements, snapshots),
+                            elements=elements, snapshots=snapshots)
+
+    if errors_only:
+        return
+
+    #check all dtypes of component attributes
+
+    for c in n.iterate_components():
+
+        #first check static attributes
+
+        dtypes_soll = c.attrs.loc[c.attrs["static"], "dtype"].drop("name")
+        unmatched = (c.df.dtypes[dtypes_soll.index] != dtypes_soll)
+
+        if unmatched.any():
+            yield issue(c, None, "dtype", "warning",
+                        "The following attributes of the dataframe %s have the wrong dtype:\n%s\n"
+                        "They are:\n%s\n"
+                        "but should be:\n%s"
+                        % (c.list_name,
+                           unmatched.index[unmatched],
+                           c.df.dtypes[dtypes_soll.index[unmatched]],
+                           dtypes_soll[unmatched]))
+
+        #now check varying attributes
+
+        types_soll = c.attrs.loc[c.attrs["varying"], ["typ", "dtype"]]
+
+        for attr, typ, dtype in types_soll.itertuples():
+            if c.pnl[attr].empty:
+                continue
+
+            unmatched = (c.pnl[attr].dtypes != dtype)
+
+            if unmatched.any():
+                yield issue(c, attr, "dtype", "warning",
+                            "The following columns of time-varying attribute %s in %s_t have the wrong dtype:\n%s\n"
+                            "They are:\n%s\n"
+                            "but should be:\n%s"
+                            % (attr, c.list_name,
+                               unmatched.index[unmatched],
+                               c.pnl[attr].dtypes[unmatched],
+                               typ),
+                            elements=unmatched.index[unmatched])
+
+
 class Basic(object):
     """Common to every object."""
 
@@ -195,17 +457,17 @@ class Network(Basic):
 
 #    lopf = network_lopf
 
-    opf = network_opf
+    opf = LazyMethod('opf', 'network_opf')
 
-    plot = plot
+    plot = LazyMethod('plot', 'plot')
 
-    iplot = iplot
+    iplot = LazyMethod('plot', 'iplot')
 
     calculate_dependent_values = calculate_dependent_values
 
-    lpf_contingency = network_lpf_contingency
+    lpf_contingency = LazyMethod('contingency', 'network_lpf_contingency')
 
-    sclopf = network_sclopf
+    sclopf = LazyMethod('contingency', 'network_sclopf')
 
     graph = graph
 
@@ -238,50 +500,35 @@ class Network(Basic):
         self.snapshot_weightings = pd.Series(index=self.snapshots,data=1.)
 
         if override_components is None:
-            self.components = components
-        else:
-            self.components = override_components
+            override_components = components
 
         if override_component_attrs is None:
-            self.component_attrs = component_attrs
-        else:
-            self.component_attrs = override_component_attrs
-
-        for c_type in set(self.components.type.unique()) - {np.nan}:
-            setattr(self, c_type + "_components",
-                    set(self.components.index[self.components.type == c_type]))
-
-        self.one_port_components = self.passive_one_port_components|self.controllable_one_port_components
-
-        self.branch_components = self.passive_branch_components|self.controllable_branch_components
+            override_component_attrs = component_attrs
 
-        self.all_components = set(self.components.index) - {"Network"}
+        self.component_attrs = override_component_attrs
 
-        self.components = Dict(self.components.T.to_dict())
+        # the processed attributes are shared with all networks with the same
+        # components and component_attrs, each network gets its own copies
+        self._schema = _component_schema(override_components,
+                                         override_component_attrs)
 
-        for component in self.components:
-            #make copies to prevent unexpected sharing of variables
-            attrs = self.component_attrs[component].copy()
+        for c_type, names in iteritems(self._schema.types):
+            setattr(self, c_type + "_components", set(names))
 
-            attrs['static'] = (attrs['type'] != 'series')
-            attrs['varying'] = attrs['type'].isin({'series', 'static or series'})
-            attrs['typ'] = attrs['type'].map({'boolean': bool, 'int': int, 'string': str}).fillna(float)
-            attrs['dtype'] = attrs['type'].map({'boolean': np.dtype(bool), 'int': np.dtype(int),
-                                                'string': np.dtype('O')}).fillna(np.dtype(float))
+        self.one_port_components = self.passive_one_port_components|self.controllable_one_port_components
 
-            bool_b = attrs.type == 'boolean'
-            attrs.loc[bool_b, 'default'] = attrs.loc[bool_b].isin({True, 'True'})
+        self.branch_components = self.passive_branch_components|self.controllable_branch_components
 
-            #exclude Network because it's not in a DF and has non-typical attributes
-            if component != "Network":
-                attrs.loc[attrs.typ == str, "default"] = attrs.loc[attrs.typ == str, "default"].replace({np.nan: ""})
-                for typ in (str, float, int):
-                    attrs.loc[attrs.typ == typ, "default"] = attrs.loc[attrs.typ == typ, "default"].astype(typ)
+        self.all_components = set(override_components.index) - {"Network"}
 
-            self.components[component]["attrs"] = attrs
+        self.components = Dict({c: dict(d, attrs=d["attrs"].copy())
+                                for c, d in iteritems(self._schema.components)})
 
         self._build_dataframes()
 
+        # last inputs and results of calculate_dependent_values
+        self._dependent_values = {}
+
         if not ignore_standard_types:
             self.read_in_default_standard_types()
 
@@ -302,14 +549,7 @@ class Network(Basic):
 
         for component in self.all_components:
 
-            attrs = self.components[component]["attrs"]
-
-            static_dtypes = attrs.loc[attrs.static, "dtype"].drop(["name"])
-
-            df = pd.DataFrame({k: pd.Series(dtype=d) for k, d in static_dtypes.iteritems()},
-                              columns=static_dtypes.index)
-
-            df.index.name = "name"
+            df = self._schema.static[component].copy()
 
             setattr(self,self.components[component]["list_name"],df)
 
@@ -317,7 +557,7 @@ class Network(Basic):
                                          columns=[],
                                          #it's currently hard to imagine non-float series, but this could be generalised
                                          dtype=np.dtype(float))
-                        for k in attrs.index[attrs.varying]})
+                        for k in self._schema.varying[component]})
 
             setattr(self,self.components[component]["list_name"]+"_t",pnl)
 
@@ -328,14 +568,24 @@ class Network(Basic):
 
             list_name = self.components[std_type]["list_name"]
 
-            file_name = os.path.join(dir_name,
-                                     standard_types_dir_name,
-                                     list_name + ".csv")
+            # the standard types are read in once per schema and copied
+            if std_type not in self._schema.standard_types:
+                file_name = os.path.join(dir_name,
+                                         standard_types_dir_name,
+                                         list_name + ".csv")
+
+                standard_types = pd.read_csv(file_name, index_col=0)
+
+                self.import_components_from_dataframe(standard_types, std_type)
+
+                self._schema.standard_types[std_type] = (standard_types,
+                                                         self.df(std_type).copy())
+            else:
+                standard_types, df = self._schema.standard_types[std_type]
 
-            self.components[std_type]["standard_types"] = pd.read_csv(file_name,
-                                                                      index_col=0)
+                setattr(self, list_name, pd.concat([self.df(std_type), df]))
 
-            self.import_components_from_dataframe(self.components[std_type]["standard_types"], std_type)
+            self.components[std_type]["standard_types"] = standard_types.copy()
 
 
     def df(self, component_name):
@@ -429,7 +679,8 @@ class Network(Basic):
             construction, e.g. .lp file - useful for debugging
         formulation : string
             Formulation of the linear power flow equations to use; must be
-            one of ["angles","cycles","kirchhoff","ptdf"]
+            one of ["angles","cycles","kirchhoff","ptdf"], the "cycles"
+            formulation is only available when pyomo is True.
         extra_functionality : callable function
             This function must take two arguments
             `extra_functionality(network,snapshots)` and is called after
@@ -440,13 +691,14 @@ class Network(Basic):
         Other Parameters
         ----------------
         ptdf_tolerance : float
-            Only taking effect when pyomo is True.
             Value below which PTDF entries are ignored
         free_memory : set, default {'pyomo'}
-            Only taking effect when pyomo is True.
             Any subset of {'pypsa', 'pyomo'}. Allows to stash `pypsa` time-series
-            data away while the solver runs (as a pickle to disk) and/or free
-            `pyomo` data after the solution has been extracted.
+            data away while the solver runs (memory-mapped from disk afterwards)
+            and/or free `pyomo` data while the solution is extracted (the
+            variables and constraints read are dropped from the model one by
+            one; with `extra_postprocessing` only after it has run). The
+            'pyomo' option only takes effect when pyomo is True.
         solver_io : string, default None
             Only taking effect when pyomo is True.
             Solver Input-Output option, e.g. "python" to use "gurobipy" for
@@ -466,7 +718,8 @@ class Network(Basic):
             Only taking effect when pyomo is False.
             Use this to warmstart the optimization. Pass a string which gives
             the path to the basis file. If set to True, a path to
-            a basis file must be given in network.basis_fn.
+            a basis file must be given in network.basis_fn. For cbc and
+            gurobi the labelled basis in network.basis is used if present.
         store_basis : bool, default True
             Only taking effect when pyomo is False.
             Whether to store the basis of the optimization results. If True,
@@ -488,6 +741,19 @@ class Network(Basic):
             Only taking effect when pyomo is False.
             Path to directory where necessary files are written, default None leads
             to the default temporary directory used by tempfile.mkstemp().
+        presolve : bool, default False
+            Only taking effect when pyomo is False.
+            Substitute variables which are fixed to zero and drop empty or
+            always slack constraints before writing out the problem.
+        calculate_angles : bool, default True
+            Only taking effect when pyomo is False.
+            Recover the voltage angles from the optimised bus injections,
+            set to False to skip this if the angles are not needed.
+        dry_run : bool, default False
+            Only taking effect when pyomo is False.
+            Return the estimated size of the linear problem instead of
+            building and solving it, see
+            :func:`pypsa.linopf.estimate_lopf_size`.
 
         Returns
         -------
@@ -506,9 +772,10 @@ class Network(Basic):
                 'solver_name': solver_name, 'solver_logfile': solver_logfile}
         args.update(kwargs)
         if pyomo:
-            return network_lopf(self, **args)
+            from .opf import network_lopf
         else:
-            return network_lopf_lowmem(self, **args)
+            from .linopf import network_lopf
+        return network_lopf(self, **args)
 
 
 
@@ -898,6 +1165,7 @@ class Network(Basic):
         return pd.concat((self.df(c) for c in self.controllable_branch_components),
                          keys=self.controllable_branch_components, sort=True)
 
+    @profiled
     def determine_network_topology(self):
         """
         Build sub_networks from topology.
@@ -954,152 +1222,52 @@ class Network(Basic):
                 if not (skip_empty and self.df(c).empty))
 
 
-    def consistency_check(self):
+    def consistency_check(self, fail_fast=False):
         """
         Checks the network for consistency; e.g.
         that all components are connected to existing buses and
         that no impedances are singular.
 
-        Prints warnings if anything is potentially inconsistent.
+        The checks are vectorized over all elements and snapshots of a
+        component. Problems which break the power flow or the optimisation
+        (undefined buses, singular impedances, misaligned time series, NaN
+        values and inconsistent bounds) are errors, the others (e.g. zero
+        resistances or wrong dtypes) are warnings.
+
+        Parameters
+        ----------
+        fail_fast : bool, default False
+            Raise a ValueError at the first error and skip the checks which
+            can only lead to warnings. This is cheap enough to run before
+            every solve.
+
+        Returns
+        -------
+        report : pandas.DataFrame
+            One row per problem with the columns 'component', 'attribute',
+            'check', 'severity' ('error' or 'warning'), 'elements' and
+            'snapshots' (affected elements and snapshots as pandas.Index or
+            None) and 'message'. Without fail_fast, all problems are
+            additionally logged as warnings.
 
         Examples
         --------
         >>> network.consistency_check()
+        >>> network.consistency_check(fail_fast=True)
 
         """
 
+        columns = ['component', 'attribute', 'check', 'severity',
+                   'elements', 'snapshots', 'message']
+        report = []
+        for issue in _consistency_issues(self, errors_only=fail_fast):
+            if fail_fast:
+                raise ValueError(issue['message'])
+            logger.warning(issue['message'])
+            report.append(issue)
 
-        for c in self.iterate_components(self.one_port_components):
-            missing = c.df.index[~c.df.bus.isin(self.buses.index)]
-            if len(missing) > 0:
-                logger.warning("The following %s have buses which are not defined:\n%s",
-                               c.list_name, missing)
-
-        for c in self.iterate_components(self.branch_components):
-            for attr in ["bus0","bus1"]:
-                missing = c.df.index[~c.df[attr].isin(self.buses.index)]
-                if len(missing) > 0:
-                    logger.warning("The following %s have %s which are not defined:\n%s",
-                                   c.list_name, attr, missing)
-
-        def bad_by_type(branch, attr):
-            if branch.type not in self.line_types.index:
-                return True
-            elif self.line_types.loc[branch.type, attr+'_per_length'] * branch.length == 0.:
-                return True
-            else:
-                return False
-
-        for c in self.iterate_components(self.passive_branch_components):
-            for attr in ["x","r"]:
-                bad = c.df.index[(c.df[attr] == 0.) & c.df.apply(bad_by_type, args=(attr,), axis=1)]
-                if len(bad) > 0:
-                    logger.warning("The following %s have zero %s, which could break the linear load flow:\n%s",
-                                   c.list_name, attr, bad)
-
-            bad = c.df.index[(c.df["x"] == 0.) & (c.df["r"] == 0.) &
-                             c.df.apply(bad_by_type, args=('x',), axis=1) &
-                             c.df.apply(bad_by_type, args=('r',), axis=1)]
-            if len(bad) > 0:
-                logger.warning("The following %s have zero series impedance, which will break the load flow:\n%s",
-                               c.list_name, bad)
-
-
-        for c in self.iterate_components({"Transformer"}):
-            bad = c.df.index[c.df["s_nom"] == 0.]
-            if len(bad) > 0:
-                logger.warning("The following %s have zero s_nom, which is used to define the impedance and will thus break the load flow:\n%s",
-                               c.list_name, bad)
-
-
-        for c in self.iterate_components(self.all_components):
-            for attr in c.attrs.index[c.attrs.varying & c.attrs.static]:
-                attr_df = c.pnl[attr]
-
-                diff = attr_df.columns.difference(c.df.index)
-                if len(diff) > 0:
-                    logger.warning("The following %s have time series defined for attribute %s in network.%s_t, but are not defined in network.%s:\n%s",
-                                   c.list_name, attr, c.list_name, c.list_name, diff)
-
-                diff = self.snapshots.difference(attr_df.index)
-                if len(diff) > 0:
-                    logger.warning("In the time-dependent Dataframe for attribute %s of network.%s_t the following snapshots are missing:\n%s",
-                                   attr, c.list_name, diff)
-
-                diff = attr_df.index.difference(self.snapshots)
-                if len(diff) > 0:
-                    logger.warning("In the time-dependent Dataframe for attribute %s of network.%s_t the following snapshots are defined which are not in network.snapshots:\n%s",
-                                   attr, c.list_name, diff)
-
-        static_attrs = ['p_nom', 's_nom', 'e_nom']
-        varying_attrs = ['p_max_pu', 'e_max_pu']
-        for c in self.iterate_components(self.all_components - {'TransformerType'}):
-            varying_attr = c.attrs.index[c.attrs.varying].intersection(varying_attrs)
-            static_attr = c.attrs.index[c.attrs.static].intersection(static_attrs)
-
-            if len(static_attr):
-                diff = (getattr(self, c.list_name)[static_attr[0] + "_max"] -
-                        getattr(self, c.list_name)[static_attr[0] + "_min"])
-                if not diff[diff < 0].empty:
-                    logger.warning("The following %s have smaller maximum than minimum expansion limit which can lead to infeasibilty:\n%s",
-                                   c.list_name, diff[diff < 0].index)
-
-            if len(varying_attr):
-                max_pu = get_switchable_as_dense(self, c.name, varying_attr[0][0] + "_max_pu")
-                min_pu = get_switchable_as_dense(self, c.name, varying_attr[0][0] + "_min_pu")
-
-                # check for NaN values:
-                if max_pu.isnull().values.any():
-                    for col in max_pu.columns[max_pu.isnull().any()]:
-                        logger.warning("The attribute %s of element %s of %s has NaN values for the following snapshots:\n%s",
-                                       varying_attr[0][0] + "_max_pu", col, c.list_name, max_pu.index[max_pu[col].isnull()])
-                if min_pu.isnull().values.any():
-                    for col in min_pu.columns[min_pu.isnull().any()]:
-                        logger.warning("The attribute %s of element %s of %s has NaN values for the following snapshots:\n%s",
-                                       varying_attr[0][0] + "_min_pu", col, c.list_name, min_pu.index[min_pu[col].isnull()])
-
-                diff = max_pu - min_pu
-                diff = diff[diff < 0].dropna(axis=1, how='all')
-                for col in diff.columns:
-                    logger.warning("The element %s of %s has a smaller maximum than minimum operational limit which can lead to infeasibility for the following snapshots:\n%s",
-                                   col, c.list_name, diff[col].dropna().index)
-
-        #check all dtypes of component attributes
-
-        for c in self.iterate_components():
-
-            #first check static attributes
-
-            dtypes_soll = c.attrs.loc[c.attrs["static"], "dtype"].drop("name")
-            unmatched = (c.df.dtypes[dtypes_soll.index] != dtypes_soll)
-
-            if unmatched.any():
-                logger.warning("The following attributes of the dataframe %s have the wrong dtype:\n%s\n"
-                               "They are:\n%s\n"
-                               "but should be:\n%s",
-                               c.list_name,
-                               unmatched.index[unmatched],
-                               c.df.dtypes[dtypes_soll.index[unmatched]],
-                               dtypes_soll[unmatched])
+        return pd.DataFrame(report, columns=columns)
 
-            #now check varying attributes
-
-            types_soll = c.attrs.loc[c.attrs["varying"], ["typ", "dtype"]]
-
-            for attr, typ, dtype in types_soll.itertuples():
-                if c.pnl[attr].empty:
-                    continue
-
-                unmatched = (c.pnl[attr].dtypes != dtype)
-
-                if unmatched.any():
-                    logger.warning("The following columns of time-varying attribute %s in %s_t have the wrong dtype:\n%s\n"
-                                   "They are:\n%s\n"
-                                   "but should be:\n%s",
-                                   attr,c.list_name,
-                                   unmatched.index[unmatched],
-                                   c.pnl[attr].dtypes[unmatched],
-                                   typ)
 
 class SubNetwork(Common):
     """
@@ -1126,7 +1294,9 @@ class SubNetwork(Common):
 
     calculate_B_H = calculate_B_H
 
-    calculate_BODF = calculate_BODF
+    calculate_B_fast_decoupled = calculate_B_fast_decoupled
+
+    calculate_BODF = LazyMethod('contingency', 'calculate_BODF')
 
     graph = graph
 
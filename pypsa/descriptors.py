@@ -33,8 +33,11 @@ __copyright__ = "Copyright 2015-2017 Tom Brown (FIAS), Jonas Hoersch (FIAS), GNU
 #destroyed if the key object goes out of scope
 
 from collections import OrderedDict
+from contextlib import contextmanager
 from itertools import repeat
 
+import gc, importlib, os, tempfile
+
 import networkx as nx
 import pandas as pd
 import numpy as np
@@ -145,6 +148,38 @@ class Dict(dict):
         return dict_keys + obj_attrs
 
 
+class LazyMethod(object):
+    """
+    Method of a component class, which is looked up in a submodule of pypsa on
+    first access. The submodule is only imported then, so that e.g. pyomo or
+    matplotlib are not loaded by ``import pypsa`` but on the first call of
+    ``network.lopf`` or ``network.plot``.
+
+    Parameters
+    ----------
+    module : str
+        Name of the submodule of pypsa, e.g. 'opf'
+    name : str
+        Name of the function in the submodule
+
+    Examples
+    --------
+    >>> class Network(Basic):
+    ...     opf = LazyMethod('opf', 'network_opf')
+    """
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self.func = None
+
+    def __get__(self, obj, cls=None):
+        if self.func is None:
+            module = importlib.import_module('.' + self.module, __package__)
+            self.func = getattr(module, self.name)
+        return self.func.__get__(obj, cls)
+
+
 def get_switchable_as_dense(network, component, attr, snapshots=None, inds=None):
     """
     Return a Dataframe for a time-varying component attribute with values for all
@@ -291,6 +326,82 @@ def free_output_series_dataframes(network, components=None):
         for attr in attrs.index[attrs['varying'] & (attrs['status'] == 'Output')]:
             pnl[attr] = pd.DataFrame(index=network.snapshots, columns=[])
 
+@contextmanager
+def empty_network(network):
+    """
+    Release the time-series of all components while the context is active,
+    e.g. while a solver runs.
+
+    The values of numeric time-series are written to a temporary file,
+    which is memory-mapped copy-on-write when the context exits. The data
+    is therefore not read back upfront and unpickled, but paged in from
+    disk when it is accessed. Non-numeric time-series are kept in memory.
+
+    Parameters
+    ----------
+    network : pypsa.Network
+
+    Examples
+    --------
+    >>> with empty_network(network):
+            run_solver()
+
+    """
+    logger.debug("Storing pypsa timeseries to disk")
+
+    fd, fn = tempfile.mkstemp(prefix='pypsa-series-')
+    stored = {}
+    with os.fdopen(fd, 'wb') as f:
+        for c in network.all_components:
+            attr = network.components[c]["list_name"] + "_t"
+            pnl = getattr(network, attr)
+            frames = {}
+            for k, df in iteritems(pnl):
+                dtypes = df.dtypes.unique() if isinstance(df, pd.DataFrame) else []
+                if len(dtypes) != 1 or dtypes[0].kind not in 'biuf':
+                    frames[k] = df
+                    continue
+                # write the values in their memory layout to avoid a copy,
+                # blocks which are neither C- nor F-contiguous are copied
+                block = df.values
+                order = 'F' if block.flags.f_contiguous else 'C'
+                f.write(b'\0' * (-f.tell() % 64))
+                frames[k] = (df.index, df.columns, block.dtype, f.tell(),
+                             block.shape, order)
+                np.ravel(block, order=order).tofile(f)
+            stored[attr] = (type(pnl), frames)
+            setattr(network, attr, None)
+        size = f.tell()
+
+    # drop the last references to the frames before collecting
+    pnl = df = block = None
+    gc.collect()
+
+    try:
+        yield
+    finally:
+        logger.debug("Mapping pypsa timeseries from disk")
+        if size == 0:
+            buf = np.empty(0, dtype=np.uint8)
+        elif os.name == 'nt':
+            # a mapped file cannot be removed on windows
+            buf = np.fromfile(fn, dtype=np.uint8)
+        else:
+            buf = np.memmap(fn, dtype=np.uint8, mode='c')
+        os.remove(fn)
+
+        for attr, (cls, frames) in iteritems(stored):
+            pnl = cls()
+            for k, df in iteritems(frames):
+                if isinstance(df, tuple):
+                    index, columns, dtype, offset, shape, order = df
+                    nbytes = int(np.prod(shape)) * dtype.itemsize
+                    block = (buf[offset:offset + nbytes].view(dtype)
+                             .reshape(shape, order=order))
+                    df = pd.DataFrame(block, index=index, columns=columns, copy=False)
+                pnl[k] = df
+            setattr(network, attr, pnl)
+
 def zsum(s, *args, **kwargs):
     """
     pandas 0.21.0 changes sum() behavior so that the result of applying sum
@@ -36,11 +36,21 @@ import pypsa
 import numpy as np
 import math
 
+# xarray is slow to import and only needed for netCDF, it is imported on first
+# use by _import_xarray
 try:
-    import xarray as xr
-    has_xarray = True
+    from importlib.util import find_spec
 except ImportError:
-    has_xarray = False
+    # python 2
+    from pkgutil import find_loader as find_spec
+has_xarray = find_spec('xarray') is not None
+xr = None
+
+def _import_xarray():
+    global xr
+    if xr is None:
+        import xarray
+        xr = xarray
 
 class ImpExper(object):
     ds = None
@@ -199,6 +209,7 @@ class ExporterHDF5(Exporter):
 if has_xarray:
     class ImporterNetCDF(Importer):
         def __init__(self, path):
+            _import_xarray()
             self.path = path
             if isinstance(path, string_types):
                 self.ds = xr.open_dataset(path)
@@ -249,6 +260,7 @@ if has_xarray:
         def __init__(self, path, least_significant_digit=None):
             self.path = path
             self.least_significant_digit = least_significant_digit
+            _import_xarray()
             self.ds = xr.Dataset()
 
         def save_attributes(self, attrs):
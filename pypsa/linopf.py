@@ -19,18 +19,23 @@ Originally retrieved from nomopyomo ( -> 'no more Pyomo').
 """
 
 
-from .pf import (_as_snapshots, get_switchable_as_dense as get_as_dense)
+from .pf import (_as_snapshots, get_switchable_as_dense as get_as_dense,
+                 solve_B)
+from .profiling import profiled, stage
 from .descriptors import (get_bounds_pu, get_extendable_i, get_non_extendable_i,
-                          expand_series, nominal_attrs, additional_linkports, Dict)
+                          expand_series, nominal_attrs, additional_linkports, Dict,
+                          empty_network)
 
 from .linopt import (linexpr, write_bound, write_constraint, set_conref,
                      set_varref, get_con, get_var, join_exprs, run_and_read_cbc,
                      run_and_read_gurobi, run_and_read_glpk, define_constraints,
-                     define_variables, align_with_static_component, define_binaries)
+                     define_variables, align_with_static_component, define_binaries,
+                     read_basis, write_basis, References, LinearExpression)
 
 
 import pandas as pd
 import numpy as np
+from scipy.sparse import csr_matrix
 
 import gc, time, os, re, shutil
 from tempfile import mkstemp
@@ -42,7 +47,23 @@ lookup = pd.read_csv(os.path.join(os.path.dirname(__file__), 'variables.csv'),
                      index_col=['component', 'variable'])
 
 
-def define_nominal_for_extendable_variables(n, c, attr):
+def _lp_size(n, *args, **kwargs):
+    # number of variables and constraints of the linear problem for profiling
+    return dict(variables=n._xCounter - 1, constraints=n._cCounter - 1)
+
+
+def _component_info(n, sns, c, attr, *args, **kwargs):
+    return dict(component=c, attr=attr)
+
+
+def _presolve_mask(lower, upper):
+    # variables which are fixed to zero are substituted
+    return ~((lower == 0) & (upper == 0))
+
+
+@profiled(counters=_lp_size,
+          info=lambda n, c, attr, *args, **kwargs: dict(component=c, attr=attr))
+def define_nominal_for_extendable_variables(n, c, attr, presolve=False):
     """
     Initializes variables for nominal capacities for a given component and a
     given attribute.
@@ -54,15 +75,19 @@ def define_nominal_for_extendable_variables(n, c, attr):
         network component of which the nominal capacity should be defined
     attr : str
         name of the variable, e.g. 'p_nom'
+    presolve : bool, default False
+        Whether to substitute capacities which are fixed to zero
 
     """
     ext_i = get_extendable_i(n, c)
     if ext_i.empty: return
     lower = n.df(c)[attr+'_min'][ext_i]
     upper = n.df(c)[attr+'_max'][ext_i]
-    define_variables(n, lower, upper, c, attr)
+    mask = _presolve_mask(lower, upper) if presolve else None
+    define_variables(n, lower, upper, c, attr, mask=mask)
 
 
+@profiled(counters=_lp_size, info=_component_info)
 def define_dispatch_for_extendable_and_committable_variables(n, sns, c, attr):
     """
     Initializes variables for power dispatch for a given component and a
@@ -84,7 +109,9 @@ def define_dispatch_for_extendable_and_committable_variables(n, sns, c, attr):
     define_variables(n, -np.inf, np.inf, c, attr, axes=[sns, ext_i], spec='extendables')
 
 
-def define_dispatch_for_non_extendable_variables(n, sns, c, attr):
+@profiled(counters=_lp_size, info=_component_info)
+def define_dispatch_for_non_extendable_variables(n, sns, c, attr,
+                                                 presolve=False):
     """
     Initializes variables for power dispatch for a given component and a
     given attribute.
@@ -96,6 +123,9 @@ def define_dispatch_for_non_extendable_variables(n, sns, c, attr):
         name of the network component
     attr : str
         name of the attribute, e.g. 'p'
+    presolve : bool, default False
+        Whether to substitute dispatch variables which are fixed to zero, e.g.
+        for components with zero capacity or zero availability
 
     """
     fix_i = get_non_extendable_i(n, c)
@@ -106,9 +136,11 @@ def define_dispatch_for_non_extendable_variables(n, sns, c, attr):
     min_pu, max_pu = get_bounds_pu(n, c, sns, fix_i, attr)
     lower = min_pu.mul(nominal_fix)
     upper = max_pu.mul(nominal_fix)
-    define_variables(n, lower, upper, c, attr, spec='nonextendables')
+    mask = _presolve_mask(lower, upper) if presolve else None
+    define_variables(n, lower, upper, c, attr, spec='nonextendables', mask=mask)
 
 
+@profiled(counters=_lp_size, info=_component_info)
 def define_dispatch_for_extendable_constraints(n, sns, c, attr):
     """
     Sets power dispatch constraints for extendable devices for a given
@@ -139,6 +171,7 @@ def define_dispatch_for_extendable_constraints(n, sns, c, attr):
     define_constraints(n, lhs, '<=', rhs, c, 'mu_lower', axes=axes, spec=attr)
 
 
+@profiled(counters=_lp_size, info=_component_info)
 def define_fixed_variable_constraints(n, sns, c, attr, pnl=True):
     """
     Sets constraints for fixing variables of a given component and attribute
@@ -172,6 +205,7 @@ def define_fixed_variable_constraints(n, sns, c, attr, pnl=True):
     set_conref(n, constraints, c, f'mu_{attr}_set')
 
 
+@profiled(counters=_lp_size)
 def define_generator_status_variables(n, snapshots):
     com_i = n.generators.query('committable').index
     ext_i = get_extendable_i(n, 'Generator')
@@ -185,6 +219,7 @@ def define_generator_status_variables(n, snapshots):
     define_binaries(n, (snapshots, com_i), 'Generator', 'status')
 
 
+@profiled(counters=_lp_size)
 def define_committable_generator_constraints(n, snapshots):
     c, attr = 'Generator', 'status'
     com_i = n.df(c).query('committable and not p_nom_extendable').index
@@ -204,10 +239,139 @@ def define_committable_generator_constraints(n, snapshots):
     define_constraints(n, lhs, '>=', 0, 'Generators', 'committable_ub')
 
 
+def _time_before(n, sns, gens_i, status, min_time, time_before):
+    # Number of snapshots, at most min_time, the generators have had the given
+    # status directly before sns. If this holds for all previous snapshots,
+    # the attribute time_before extends the count.
+    start_i = n.snapshots.get_loc(sns[0])
+    previous = (n.pnl('Generator').status
+                .reindex(index=n.snapshots[:start_i][::-1], columns=gens_i)
+                .fillna(1).values == status)
+    within = np.arange(start_i)[:, None] < min_time
+    count = (np.cumprod(previous, axis=0) * within).sum(0)
+    return np.where(count == start_i,
+                    np.minimum(min_time, start_i + time_before), count)
+
+
+def _previous_status(n, sns, gens_i, initial):
+    # status directly before sns, `initial` is used for the first snapshot
+    start_i = n.snapshots.get_loc(sns[0])
+    if start_i == 0:
+        return initial
+    return (n.pnl('Generator').status.reindex(columns=gens_i).fillna(1)
+            .iloc[start_i - 1].values)
+
+
+@profiled(counters=_lp_size)
+def define_minimum_up_down_time_constraints(n, sns):
+    """
+    Defines minimum up and down time constraints for committable generators.
+    For a generator with min_up_time L, which starts up at snapshot i, the
+    status has to be one for the window of the next L snapshots
+
+        sum_{j=i}^{i+L-1} status_j >= L * (status_i - status_{i-1})
+
+    and is forced to one for the first snapshots if the generator has been
+    up for less than L snapshots before. The minimum down time is the same
+    for the complement 1 - status. The windows of all snapshots and
+    generators are built at once as a 3-dimensional array of references.
+    """
+    c = 'Generator'
+    com_i = n.df(c).query('committable and not p_nom_extendable').index
+    if com_i.empty: return
+    df = n.df(c).loc[com_i]
+
+    bad_uc_gens = df.index[(df.min_up_time > 0) & (df.min_down_time > 0) &
+                           (df.up_time_before > 0) & (df.down_time_before > 0)]
+    if not bad_uc_gens.empty:
+        logger.warning("The following committable generators were both up and "
+                       f"down before the simulation: {', '.join(bad_uc_gens)}. "
+                       "This will cause an infeasibility.")
+
+    T = len(sns)
+    i = np.arange(T)[:, None]
+    for status, attr in [(1, 'up'), (0, 'down')]:
+        min_time = df[f'min_{attr}_time']
+        gens_i = min_time.index[min_time > 0]
+        if gens_i.empty: continue
+        L = min_time[gens_i].values.astype(int)
+        time_before = _time_before(n, sns, gens_i, status, L,
+                                   df.loc[gens_i, f'{attr}_time_before'].values)
+        initial = np.where(time_before > 0, status, 1 - status)
+        must_stay = np.where(time_before > 0, L - time_before, 0)
+        # the constraint is written for y = a + b * status, with y = status
+        # for the up time and y = 1 - status for the down time
+        a, b = 1 - status, 2 * status - 1
+
+        s = get_var(n, c, 'status').loc[sns, gens_i].values
+        s_prev = np.vstack([np.full((1, len(gens_i)), -1), s[:-1]])
+        period = np.minimum(L, T - i)
+        force = i < must_stay
+        window = (i >= must_stay) & (i < T - 1)
+
+        k = np.arange(L.max())
+        j = np.minimum(i[..., None] + k, T - 1)
+        in_window = window[..., None] & (k < period[..., None])
+        s_window = np.where(in_window, s[j, np.arange(len(gens_i))[:, None]], -1)
+
+        coeffs = np.concatenate([np.full(s_window.shape, b),
+                                 np.stack([np.where(force, b, - b * period),
+                                           b * period], -1)], -1)
+        variables = np.concatenate([s_window,
+                                    np.stack([np.where(force | window, s, -1),
+                                              np.where(window, s_prev, -1)],
+                                             -1)], -1)
+        lhs = LinearExpression.from_arrays(coeffs, variables, [sns, gens_i])
+        rhs = np.where(window, - a * period, 0.)
+        rhs[0] -= np.where(window[0], b * period[0] * initial, 0)
+        rhs = np.where(force, 1 - a, rhs)
+        define_constraints(n, lhs, '>=', rhs, c, f'min_{attr}_time')
+
+
+@profiled(counters=_lp_size)
+def define_start_up_shut_down_constraints(n, sns):
+    """
+    Defines variables and constraints for the start up and shut down costs of
+    committable generators, i.e.
+
+        start_up_cost_t >= start_up_cost * (status_t - status_{t-1})
+        shut_down_cost_t >= shut_down_cost * (status_{t-1} - status_t)
+
+    where the status before the first snapshot is derived from the status
+    of the previous snapshot or the attributes up_time_before and
+    down_time_before.
+    """
+    c = 'Generator'
+    com_i = n.df(c).query('committable and not p_nom_extendable').index
+    if com_i.empty: return
+    df = n.df(c).loc[com_i]
+
+    for attr, sign in [('start_up_cost', 1), ('shut_down_cost', -1)]:
+        gens_i = df.index[df[attr] > 0]
+        if gens_i.empty: continue
+        cost = df.loc[gens_i, attr].values
+        if sign == 1:
+            initial = (df.loc[gens_i, 'up_time_before'] > 0).values
+        else:
+            initial = ~(df.loc[gens_i, 'down_time_before'] > 0).values
+        initial = _previous_status(n, sns, gens_i, initial.astype(float))
+
+        define_variables(n, 0, np.inf, c, attr, axes=[sns, gens_i])
+        s = get_var(n, c, 'status').loc[sns, gens_i]
+        lhs = LinearExpression((1, get_var(n, c, attr)), (- sign * cost, s),
+                               (sign * cost, s.shift()))
+        rhs = np.zeros(s.shape)
+        rhs[0] = - sign * cost * initial
+        define_constraints(n, lhs, '>=', rhs, c, attr)
+
 
-def define_ramp_limit_constraints(n, sns):
+
+@profiled(counters=_lp_size)
+def define_ramp_limit_constraints(n, sns, presolve=False):
     """
-    Defines ramp limits for generators wiht valid ramplimit
+    Defines ramp limits for generators wiht valid ramplimit. If presolve is
+    True, ramp limits of non-committable generators which can never be
+    reached given the per unit dispatch bounds are not written out.
 
     """
     c = 'Generator'
@@ -221,9 +385,19 @@ def define_ramp_limit_constraints(n, sns):
     p = get_var(n, c, 'p').loc[sns[1:]]
     p_prev = get_var(n, c, 'p').shift(1).loc[sns[1:]]
 
+    # maximal per unit ramps allowed by the dispatch bounds
+    min_pu, max_pu = get_bounds_pu(n, c, sns, attr='p')
+    max_ramp_up = (max_pu - min_pu.shift(1)).loc[sns[1:]]
+    max_ramp_down = (max_pu.shift(1) - min_pu).loc[sns[1:]]
+
+    def drop_slack(lhs, max_ramp, limit_pu):
+        if not presolve: return lhs
+        return lhs.where(max_ramp[lhs.columns] > limit_pu[lhs.columns], '')
+
     # fix up
     gens_i = rup_i & fix_i
     lhs = linexpr((1, p[gens_i]), (-1, p_prev[gens_i]))
+    lhs = drop_slack(lhs, max_ramp_up, n.df(c).ramp_limit_up)
     rhs = n.df(c).loc[gens_i].eval('ramp_limit_up * p_nom')
     define_constraints(n, lhs, '<=', rhs,  c, 'mu_ramp_limit_up', spec='nonext.')
 
@@ -232,6 +406,7 @@ def define_ramp_limit_constraints(n, sns):
     limit_pu = n.df(c)['ramp_limit_up'][gens_i]
     p_nom = get_var(n, c, 'p_nom')[gens_i]
     lhs = linexpr((1, p[gens_i]), (-1, p_prev[gens_i]), (-limit_pu, p_nom))
+    lhs = drop_slack(lhs, max_ramp_up, n.df(c).ramp_limit_up)
     define_constraints(n, lhs, '<=', 0, c, 'mu_ramp_limit_up', spec='ext.')
 
     # com up
@@ -248,6 +423,7 @@ def define_ramp_limit_constraints(n, sns):
     # fix down
     gens_i = rdown_i & fix_i
     lhs = linexpr((1, p[gens_i]), (-1, p_prev[gens_i]))
+    lhs = drop_slack(lhs, max_ramp_down, n.df(c).ramp_limit_down)
     rhs = n.df(c).loc[gens_i].eval('-1 * ramp_limit_down * p_nom')
     define_constraints(n, lhs, '>=', rhs, c, 'mu_ramp_limit_down', spec='nonext.')
 
@@ -256,6 +432,7 @@ def define_ramp_limit_constraints(n, sns):
     limit_pu = n.df(c)['ramp_limit_down'][gens_i]
     p_nom = get_var(n, c, 'p_nom')[gens_i]
     lhs = linexpr((1, p[gens_i]), (-1, p_prev[gens_i]), (limit_pu, p_nom))
+    lhs = drop_slack(lhs, max_ramp_down, n.df(c).ramp_limit_down)
     define_constraints(n, lhs, '>=', 0, c, 'mu_ramp_limit_down', spec='ext.')
 
     # com down
@@ -269,51 +446,215 @@ def define_ramp_limit_constraints(n, sns):
                       (limit_down - limit_shut, status), (limit_shut, status_prev))
         define_constraints(n, lhs, '>=', 0, c, 'mu_ramp_limit_down', spec='com.')
 
-def define_nodal_balance_constraints(n, sns):
-    """
-    Defines nodal balance constraint.
-
-    """
+def _bus_injection(n, c, attr, groupcol='bus', sign=1):
+    # additional sign only necessary for branches in reverse direction
+    if 'sign' in n.df(c):
+        sign = sign * n.df(c).sign
+    expr = linexpr((sign, get_var(n, c, attr))).rename(columns=n.df(c)[groupcol])
+    # drop empty bus2, bus3 if multiline link
+    if c == 'Link':
+        expr.drop(columns='', errors='ignore', inplace=True)
+    return expr
 
-    def bus_injection(c, attr, groupcol='bus', sign=1):
-        # additional sign only necessary for branches in reverse direction
-        if 'sign' in n.df(c):
-            sign = sign * n.df(c).sign
-        expr = linexpr((sign, get_var(n, c, attr))).rename(columns=n.df(c)[groupcol])
-        # drop empty bus2, bus3 if multiline link
-        if c == 'Link':
-            expr.drop(columns='', errors='ignore', inplace=True)
-        return expr
 
+def _nodal_injection_args(n, sns, passive_branches=True):
+    """
+    Returns the list of arguments [component, attribute, bus column, sign] of
+    all terms which inject power into the buses. Passive branch flows are only
+    included if `passive_branches` is True.
+    """
     # one might reduce this a bit by using n.branches and lookup
     args = [['Generator', 'p'], ['Store', 'p'], ['StorageUnit', 'p_dispatch'],
-            ['StorageUnit', 'p_store', 'bus', -1], ['Line', 's', 'bus0', -1],
-            ['Line', 's', 'bus1', 1], ['Transformer', 's', 'bus0', -1],
-            ['Transformer', 's', 'bus1', 1], ['Link', 'p', 'bus0', -1],
-            ['Link', 'p', 'bus1', get_as_dense(n, 'Link', 'efficiency', sns)]]
+            ['StorageUnit', 'p_store', 'bus', -1]]
+    if passive_branches:
+        args += [['Line', 's', 'bus0', -1], ['Line', 's', 'bus1', 1],
+                 ['Transformer', 's', 'bus0', -1], ['Transformer', 's', 'bus1', 1]]
+    args += [['Link', 'p', 'bus0', -1],
+             ['Link', 'p', 'bus1', get_as_dense(n, 'Link', 'efficiency', sns)]]
     args = [arg for arg in args if not n.df(arg[0]).empty]
 
     for i in additional_linkports(n):
         eff = get_as_dense(n, 'Link', f'efficiency{i}', sns)
         args.append(['Link', 'p', f'bus{i}', eff])
+    return args
+
+
+def _nodal_load(n, sns):
+    return ((- get_as_dense(n, 'Load', 'p_set', sns) * n.loads.sign)
+            .groupby(n.loads.bus, axis=1).sum()
+            .reindex(columns=n.buses.index, fill_value=0))
 
-    lhs = (pd.concat([bus_injection(*arg) for arg in args], axis=1)
+
+@profiled(counters=_lp_size)
+def define_nodal_balance_constraints(n, sns):
+    """
+    Defines nodal balance constraint.
+
+    """
+    args = _nodal_injection_args(n, sns)
+    lhs = (pd.concat([_bus_injection(n, *arg) for arg in args], axis=1)
            .groupby(axis=1, level=0)
            .agg(lambda x: ''.join(x.values))
            .reindex(columns=n.buses.index, fill_value=''))
     sense = '='
-    rhs = ((- get_as_dense(n, 'Load', 'p_set', sns) * n.loads.sign)
-           .groupby(n.loads.bus, axis=1).sum()
-           .reindex(columns=n.buses.index, fill_value=0))
+    rhs = _nodal_load(n, sns)
     define_constraints(n, lhs, sense, rhs, 'Bus', 'marginal_price')
 
 
+@profiled(counters=_lp_size)
+def define_sub_network_balance_constraints(n, sns):
+    """
+    Defines the power balance constraint of each sub-network. This replaces
+    the nodal balance constraints if the flows of the passive branches are
+    described by the PTDF.
+
+    """
+    sub = n.buses.sub_network
+    args = _nodal_injection_args(n, sns, passive_branches=False)
+    lhs = (pd.concat([_bus_injection(n, *arg).rename(columns=sub)
+                      for arg in args], axis=1)
+           .groupby(axis=1, level=0)
+           .agg(lambda x: ''.join(x.values))
+           .reindex(columns=n.sub_networks.index, fill_value=''))
+    sense = '='
+    rhs = (_nodal_load(n, sns).groupby(sub, axis=1).sum()
+           .reindex(columns=n.sub_networks.index, fill_value=0))
+    define_constraints(n, lhs, sense, rhs, 'SubNetwork', 'marginal_price')
+
+
+@profiled(counters=_lp_size)
+def define_passive_branch_flows(n, sns, formulation='kirchhoff',
+                                ptdf_tolerance=0.):
+    """
+    Defines the linear power flow equations for the passive branches using
+    the given formulation, one of "angles", "kirchhoff" or "ptdf".
+
+    """
+    if formulation == 'angles':
+        define_passive_branch_flows_with_angles(n, sns)
+    elif formulation == 'ptdf':
+        define_passive_branch_flows_with_PTDF(n, sns, ptdf_tolerance)
+    elif formulation == 'kirchhoff':
+        define_kirchhoff_constraints(n, sns)
+
+
+@profiled(counters=_lp_size)
+def define_passive_branch_flows_with_angles(n, sns):
+    """
+    Defines voltage angle variables for all buses in sub-networks with
+    passive branches and relates the branch flows to the angle differences
+
+        s = (v_ang_bus0 - v_ang_bus1 - phase_shift) / x_pu_eff
+
+    where the effective resistance r_pu_eff is used for DC sub-networks. The
+    angle of the slack bus of each sub-network is fixed to zero.
+
+    """
+    comps = n.passive_branch_components & n.vars.components
+    if len(comps) == 0: return
+    branches = n.passive_branches()
+    subs = n.sub_networks.loc[branches.sub_network.unique()]
+    buses_i = n.buses.index[n.buses.sub_network.isin(subs.index)]
+
+    lower = pd.DataFrame(-np.inf, sns, buses_i)
+    lower[subs.slack_bus] = 0
+    upper = lower.where(lower == 0, np.inf)
+    define_variables(n, lower, upper, 'Bus', 'v_ang')
+    v_ang = get_var(n, 'Bus', 'v_ang')
+
+    for c in comps:
+        df = branches.loc[c]
+        carrier = df.sub_network.map(n.sub_networks.carrier)
+        y = 1 / df.x_pu_eff.where(carrier != 'DC', df.r_pu_eff)
+        shift = df.phase_shift * np.pi / 180 if c == 'Transformer' else 0
+        s = get_var(n, c, 's')[df.index]
+        lhs = linexpr((1, s), (-y, v_ang[df.bus0].values),
+                      (y, v_ang[df.bus1].values))
+        rhs = expand_series(-y * shift, sns).T
+        define_constraints(n, lhs, '=', rhs, c, 'mu_flow_definition')
+
+
+@profiled(counters=_lp_size)
+def define_passive_branch_flows_with_PTDF(n, sns, ptdf_tolerance=0.):
+    """
+    Defines the flows of the passive branches as the product of the
+    power transfer distribution factors (PTDF) of each sub-network and the
+    nodal power injections. PTDF entries with an absolute value smaller than
+    `ptdf_tolerance` are neglected, which keeps the constraint matrix sparse.
+    The nodal balance is then replaced by one power balance per sub-network,
+    see :func:`define_sub_network_balance_constraints`.
+
+    """
+    comps = n.passive_branch_components & n.vars.components
+    if len(comps) == 0: return
+    branch_vars = pd.concat({c: get_var(n, c, 's') for c in comps}, axis=1)
+
+    def injection(c, attr, groupcol='bus', sign=1):
+        if 'sign' in n.df(c):
+            sign = sign * n.df(c).sign
+        var = get_var(n, c, attr)
+        coeff = (pd.DataFrame(1., sns, var.columns) * sign)[var.columns]
+        return n.df(c)[groupcol][var.columns], coeff.values, var.values
+
+    args = _nodal_injection_args(n, sns, passive_branches=False)
+    injections = [injection(*arg) for arg in args]
+    load = _nodal_load(n, sns)
+
+    lhs, rhs = [], []
+    for sub in n.sub_networks.obj:
+        branches_i = sub.branches_i()
+        if branches_i.empty:
+            continue
+        sub.calculate_B_H(skip_pre=True)
+        sub.calculate_PTDF(skip_pre=True)
+        ptdf = sub.PTDF
+        ptdf[abs(ptdf) < ptdf_tolerance] = 0
+        ptdf = csr_matrix(ptdf)
+        bus_pos = pd.Series(np.arange(len(sub.buses_o)), sub.buses_o)
+
+        # for each injection, pair up the branches and the injecting
+        # elements with non-zero PTDF entries
+        rows, terms = [], []
+        for bus, coeff, var in injections:
+            el_i = np.flatnonzero(bus.isin(bus_pos.index).values)
+            if not len(el_i): continue
+            incidence = csr_matrix((np.ones(len(el_i)),
+                                    (bus_pos[bus.iloc[el_i]].values,
+                                     np.arange(len(el_i)))),
+                                   shape=(len(bus_pos), len(el_i)))
+            weights = (ptdf * incidence).tocoo()
+            if not weights.nnz: continue
+            cols = el_i[weights.col]
+            terms.append(linexpr((- weights.data * coeff[:, cols], var[:, cols]),
+                                 as_pandas=False))
+            rows.append(weights.row)
+
+        flows = linexpr((1, branch_vars[branches_i]), as_pandas=False)
+        if rows:
+            rows = np.concatenate(rows)
+            order = np.argsort(rows, kind='stable')
+            rows = rows[order]
+            terms = np.hstack(terms)[:, order]
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            flows[:, rows[starts]] += np.add.reduceat(terms, starts, axis=1)
+        lhs.append(pd.DataFrame(flows, sns, branches_i))
+        rhs.append(pd.DataFrame(- ptdf.dot(load[sub.buses_o].values.T).T,
+                                sns, branches_i))
+
+    if not lhs: return
+    lhs, rhs = pd.concat(lhs, axis=1), pd.concat(rhs, axis=1)
+    for c in comps:
+        if c not in lhs: continue
+        define_constraints(n, lhs[c], '=', rhs[c], c, 'mu_flow_definition')
+
+
+@profiled(counters=_lp_size)
 def define_kirchhoff_constraints(n, sns):
     """
     Defines Kirchhoff voltage constraints
 
     """
-    comps = n.passive_branch_components & set(n.variables.index.levels[0])
+    comps = n.passive_branch_components & n.vars.components
     if len(comps) == 0: return
     branch_vars = pd.concat({c:get_var(n, c, 's') for c in comps}, axis=1)
 
@@ -339,6 +680,7 @@ def define_kirchhoff_constraints(n, sns):
     set_conref(n, constraints, 'SubNetwork', 'mu_kirchhoff_voltage_law')
 
 
+@profiled(counters=_lp_size)
 def define_storage_unit_constraints(n, sns):
     """
     Defines state of charge (soc) constraints for storage units. In principal
@@ -377,7 +719,7 @@ def define_storage_unit_constraints(n, sns):
         return linexpr((coeff[cols], var[cols]))\
                .reindex(index=axes[0], columns=axes[1], fill_value='').values
 
-    if ('StorageUnit', 'spill') in n.variables.index:
+    if ('StorageUnit', 'spill') in n.vars:
         lhs += masked_term(-eh, get_var(n, c, 'spill'), spill.columns)
     lhs += masked_term(eff_stand, prev_soc_cyclic, cyclic_i)
     lhs += masked_term(eff_stand.loc[sns[1:]], soc.shift().loc[sns[1:]], noncyclic_i)
@@ -388,6 +730,7 @@ def define_storage_unit_constraints(n, sns):
     define_constraints(n, lhs, '==', rhs, c, 'mu_state_of_charge')
 
 
+@profiled(counters=_lp_size)
 def define_store_constraints(n, sns):
     """
     Defines energy balance constraints for stores. In principal this states:
@@ -427,6 +770,7 @@ def define_store_constraints(n, sns):
     define_constraints(n, lhs, '==', rhs, c, 'mu_state_of_charge')
 
 
+@profiled(counters=_lp_size)
 def define_global_constraints(n, sns):
     """
     Defines global constraints for the optimization. Possible types are
@@ -455,7 +799,7 @@ def define_global_constraints(n, sns):
         gens = n.generators.query('carrier in @emissions.index')
         if not gens.empty:
             em_pu = gens.carrier.map(emissions)/gens.efficiency
-            em_pu = n.snapshot_weightings.to_frame() @ em_pu.to_frame('weightings').T
+            em_pu = n.snapshot_weightings[sns].to_frame() @ em_pu.to_frame('weightings').T
             vals = linexpr((em_pu, get_var(n, 'Generator', 'p')[gens.index]),
                            as_pandas=False)
             lhs += join_exprs(vals)
@@ -525,6 +869,7 @@ def define_global_constraints(n, sns):
         set_conref(n, con, 'GlobalConstraint', 'mu', name)
 
 
+@profiled(counters=_lp_size)
 def define_objective(n, sns):
     """
     Defines and writes out the objective function
@@ -546,6 +891,11 @@ def define_objective(n, sns):
         if cost.empty: continue
         terms = linexpr((cost, get_var(n, c, attr).loc[sns, cost.columns]))
         n.objective_f.write(join_exprs(terms))
+    # start up and shut down costs of committable generators
+    for attr in ['start_up_cost', 'shut_down_cost']:
+        if ('Generator', attr) not in n.vars: continue
+        n.objective_f.write(join_exprs(linexpr((1, get_var(n, 'Generator',
+                                                           attr)))))
     # investment
     for c, attr in nominal_attrs.items():
         cost = n.df(c)['capital_cost'][get_extendable_i(n, c)]
@@ -554,10 +904,15 @@ def define_objective(n, sns):
         n.objective_f.write(join_exprs(terms))
 
 
+@profiled(size=_lp_size)
 def prepare_lopf(n, snapshots=None, keep_files=False,
-                 extra_functionality=None, solver_dir=None):
+                 extra_functionality=None, solver_dir=None,
+                 formulation='kirchhoff', ptdf_tolerance=0., presolve=False):
     """
-    Sets up the linear problem and writes it out to a lp file
+    Sets up the linear problem and writes it out to a lp file. If presolve
+    is True, variables which are fixed to zero by the component data are
+    substituted, and constraints which are empty or always slack are
+    dropped.
 
     Returns
     -------
@@ -566,11 +921,8 @@ def prepare_lopf(n, snapshots=None, keep_files=False,
 
     """
     n._xCounter, n._cCounter = 1, 1
-    n.vars, n.cons = Dict(), Dict()
-
-    cols = ['component', 'name', 'pnl', 'specification']
-    n.variables = pd.DataFrame(columns=cols).set_index(cols[:2])
-    n.constraints = pd.DataFrame(columns=cols).set_index(cols[:2])
+    n.vars, n.cons = References(), References()
+    n.variables, n.constraints = n.vars.to_frame(), n.cons.to_frame()
 
     snapshots = n.snapshots if snapshots is None else snapshots
     start = time.time()
@@ -594,10 +946,11 @@ def prepare_lopf(n, snapshots=None, keep_files=False,
     n.binaries_f.write("\nbinary\n")
 
     for c, attr in lookup.query('nominal and not handle_separately').index:
-        define_nominal_for_extendable_variables(n, c, attr)
+        define_nominal_for_extendable_variables(n, c, attr, presolve)
         # define_fixed_variable_constraints(n, snapshots, c, attr, pnl=False)
     for c, attr in lookup.query('not nominal and not handle_separately').index:
-        define_dispatch_for_non_extendable_variables(n, snapshots, c, attr)
+        define_dispatch_for_non_extendable_variables(n, snapshots, c, attr,
+                                                     presolve)
         define_dispatch_for_extendable_and_committable_variables(n, snapshots, c, attr)
         align_with_static_component(n, c, attr)
         define_dispatch_for_extendable_constraints(n, snapshots, c, attr)
@@ -609,11 +962,16 @@ def prepare_lopf(n, snapshots=None, keep_files=False,
     define_fixed_variable_constraints(n, snapshots, 'Store', 'e')
 
     define_committable_generator_constraints(n, snapshots)
-    define_ramp_limit_constraints(n, snapshots)
+    define_minimum_up_down_time_constraints(n, snapshots)
+    define_start_up_shut_down_constraints(n, snapshots)
+    define_ramp_limit_constraints(n, snapshots, presolve)
     define_storage_unit_constraints(n, snapshots)
     define_store_constraints(n, snapshots)
-    define_kirchhoff_constraints(n, snapshots)
-    define_nodal_balance_constraints(n, snapshots)
+    define_passive_branch_flows(n, snapshots, formulation, ptdf_tolerance)
+    if formulation == 'ptdf':
+        define_sub_network_balance_constraints(n, snapshots)
+    else:
+        define_nodal_balance_constraints(n, snapshots)
     define_global_constraints(n, snapshots)
     define_objective(n, snapshots)
 
@@ -628,7 +986,7 @@ def prepare_lopf(n, snapshots=None, keep_files=False,
         getattr(n, f).close(); delattr(n, f); os.close(fd)
 
     # concate files
-    with open(problem_fn, 'wb') as wfd:
+    with stage('concatenate_lp_file'), open(problem_fn, 'wb') as wfd:
         for f in [objective_fn, constraints_fn, bounds_fn, binaries_fn]:
             with open(f,'rb') as fd:
                 shutil.copyfileobj(fd, wfd)
@@ -639,11 +997,14 @@ def prepare_lopf(n, snapshots=None, keep_files=False,
     return fdp, problem_fn
 
 
+@profiled
 def assign_solution(n, sns, variables_sol, constraints_dual,
-                    keep_references=False, keep_shadowprices=None):
+                    keep_references=False, keep_shadowprices=None,
+                    calculate_angles=True):
     """
     Helper function. Assigns the solution of a succesful optimization to the
-    network.
+    network. If calculate_angles is True and the angles were no variables, the
+    voltage angles are recovered from the bus injections.
 
     """
 
@@ -653,21 +1014,41 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
         elif pnl[attr].empty:
             pnl[attr] = df.reindex(n.snapshots)
         else:
-            pnl[attr].loc[sns, :] = df.reindex(columns=pnl[attr].columns)
+            # write by position into the preallocated frame, this avoids
+            # aligning the frames on the labels
+            frame = pnl[attr]
+            values = df.reindex(index=sns, columns=frame.columns).values
+            if frame.index.equals(sns):
+                pnl[attr] = pd.DataFrame(values, frame.index, frame.columns)
+            else:
+                frame.iloc[frame.index.get_indexer(sns)] = values
+
+    def to_dense(ser, size, fill):
+        # array indexed by the references, the last entry is used for the
+        # reference -1
+        values = np.full(size + 1, np.nan)
+        values[ser.index.values] = ser.values
+        values[-1] = fill
+        return values
+
+    # variables substituted by the presolve have the reference -1 and are zero
+    variables_sol = to_dense(variables_sol, n._xCounter, 0.)
+    constraints_dual = to_dense(constraints_dual, n._cCounter, np.nan)
+    constraints_dual = {1: constraints_dual, -1: - constraints_dual}
+    angles = ('Bus', 'v_ang') in n.vars
 
     pop = not keep_references
     def map_solution(c, attr):
-        variables = get_var(n, c, attr, pop=pop)
+        values = n.vars.values(c, attr, variables_sol, pop=pop)
         predefined = True
         if (c, attr) not in lookup.index:
             predefined = False
             n.sols[c] = n.sols[c] if c in n.sols else Dict(df=pd.DataFrame(), pnl={})
         n.solutions.at[(c, attr), 'in_comp'] = predefined
-        if isinstance(variables, pd.DataFrame):
+        if isinstance(values, pd.DataFrame):
             # case that variables are timedependent
             n.solutions.at[(c, attr), 'pnl'] = True
             pnl = n.pnl(c) if predefined else n.sols[c].pnl
-            values = variables.stack().map(variables_sol).unstack()
             if c in n.passive_branch_components:
                 set_from_frame(pnl, 'p0', values)
                 set_from_frame(pnl, 'p1', - values)
@@ -682,7 +1063,7 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
         else:
             # case that variables are static
             n.solutions.at[(c, attr), 'pnl'] = False
-            sol = variables.map(variables_sol)
+            sol = values
             if predefined:
                 non_ext = n.df(c)[attr]
                 n.df(c)[attr + '_opt'] = sol.reindex(non_ext.index).fillna(non_ext)
@@ -690,12 +1071,12 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
                 n.sols[c].df[attr] = sol
 
     n.sols = Dict()
-    n.solutions = pd.DataFrame(index=n.variables.index, columns=['in_comp', 'pnl'])
-    for c, attr in n.variables.index:
+    n.solutions = pd.DataFrame(index=n.vars.index, columns=['in_comp', 'pnl'])
+    for c, attr in n.solutions.index:
         map_solution(c, attr)
 
     # if nominal capcity was no variable set optimal value to nominal
-    for c, attr in lookup.query('nominal').index.difference(n.variables.index):
+    for c, attr in lookup.query('nominal').index.difference(n.solutions.index):
         n.df(c)[attr+'_opt'] = n.df(c)[attr]
 
     # recalculate storageunit net dispatch
@@ -707,7 +1088,7 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
     if keep_shadowprices == False:
         keep_shadowprices = []
 
-    sp = n.constraints.index
+    sp = n.cons.index
     if isinstance(keep_shadowprices, list):
         sp = sp[sp.isin(keep_shadowprices, level=0)]
 
@@ -716,22 +1097,20 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
         # or n.df(c). For the second case the index of the constraints have to
         # be a subset of n.df(c).index otherwise the dual is stored at
         # n.duals[c].df
-        constraints = get_con(n, c, attr, pop=pop)
-        is_pnl = isinstance(constraints, pd.DataFrame)
         # TODO: setting the sign is not very clear
         sign = 1 if 'upper' in attr or attr == 'marginal_price' else -1
+        duals = n.cons.values(c, attr, constraints_dual[sign], pop=pop)
+        is_pnl = isinstance(duals, pd.DataFrame)
         n.dualvalues.at[(c, attr), 'pnl'] = is_pnl
         to_component = c in n.all_components
         if is_pnl:
             n.dualvalues.at[(c, attr), 'in_comp'] = to_component
-            duals = constraints.stack().map(sign * constraints_dual).unstack()
             if c not in n.duals and not to_component:
                 n.duals[c] = Dict(df=pd.DataFrame(), pnl={})
             pnl = n.pnl(c) if to_component else n.duals[c].pnl
             set_from_frame(pnl, attr, duals)
         else:
             # here to_component can change
-            duals = constraints.map(sign * constraints_dual)
             if to_component:
                 to_component = (duals.index.isin(n.df(c).index).all())
             n.dualvalues.at[(c, attr), 'in_comp'] = to_component
@@ -751,19 +1130,13 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
 
     # discard remaining if wanted
     if not keep_references:
-        for c, attr in n.constraints.index.difference(sp):
-            get_con(n, c, attr, pop)
+        for c, attr in n.cons.index.difference(sp):
+            n.cons.pop(c, attr)
 
     #load
     if len(n.loads):
         set_from_frame(n.pnl('Load'), 'p', get_as_dense(n, 'Load', 'p_set', sns))
 
-    #clean up vars and cons
-    for c in list(n.vars):
-        if n.vars[c].df.empty and n.vars[c].pnl == {}: n.vars.pop(c)
-    for c in list(n.cons):
-        if n.cons[c].df.empty and n.cons[c].pnl == {}: n.cons.pop(c)
-
     # recalculate injection
     ca = [('Generator', 'p', 'bus' ), ('Store', 'p', 'bus'),
           ('Load', 'p', 'bus'), ('StorageUnit', 'p', 'bus'),
@@ -771,32 +1144,252 @@ def assign_solution(n, sns, variables_sol, constraints_dual,
     for i in additional_linkports(n):
         ca.append(('Link', f'p{i}', f'bus{i}'))
 
-    sign = lambda c: n.df(c).sign if 'sign' in n.df(c) else -1 #sign for 'Link'
-    n.buses_t.p = pd.concat(
-            [n.pnl(c)[attr].mul(sign(c)).rename(columns=n.df(c)[group])
-             for c, attr, group in ca], axis=1).groupby(level=0, axis=1).sum()\
-            .reindex(columns=n.buses.index, fill_value=0)
+    def injection(c, attr, group):
+        # sum the injections per bus with one sparse product, empty buses of
+        # multiport links are dropped
+        p = n.pnl(c)[attr].reindex(n.snapshots)
+        df = n.df(c).reindex(p.columns)
+        sign = df.sign.values if 'sign' in df else -np.ones(len(df)) #for Link
+        bus = n.buses.index.get_indexer(df[group])
+        valid = bus != -1
+        M = csr_matrix((sign[valid], (np.flatnonzero(valid), bus[valid])),
+                       shape=(len(df), len(n.buses)))
+        return M.T.dot(np.nan_to_num(p.values).T).T
+
+    n.buses_t.p = pd.DataFrame(sum(injection(*args) for args in ca),
+                               index=n.snapshots, columns=n.buses.index)
 
     def v_ang_for_(sub):
         buses_i = sub.buses_o
-        if len(buses_i) == 1:
-            return pd.DataFrame(0, index=sns, columns=buses_i)
-        sub.calculate_B_H(skip_pre=True)
-        Z = pd.DataFrame(np.linalg.pinv((sub.B).todense()), buses_i, buses_i)
-        Z -= Z[sub.slack_bus]
-        return n.buses_t.p.reindex(columns=buses_i) @ Z
-    n.buses_t.v_ang = (pd.concat([v_ang_for_(sub) for sub in n.sub_networks.obj],
-                                  axis=1)
-                      .reindex(columns=n.buses.index, fill_value=0))
+        p = n.buses_t.p.reindex(columns=buses_i)
+        v_ang = np.zeros(p.shape)
+        if len(buses_i) > 1:
+            # slack bus is the first bus in buses_o and has angle zero
+            sub.calculate_B_H(skip_pre=True)
+            v_ang[:, 1:] = solve_B(sub, p.values[:, 1:].T).T
+        return pd.DataFrame(v_ang, index=p.index, columns=buses_i)
+    if angles:
+        n.buses_t.v_ang = (n.buses_t.v_ang.reindex(columns=n.buses.index)
+                          .fillna(0))
+    elif calculate_angles:
+        n.buses_t.v_ang = (pd.concat([v_ang_for_(sub) for sub in
+                                      n.sub_networks.obj], axis=1)
+                          .reindex(columns=n.buses.index, fill_value=0))
+
+
+# approximate bytes in the lp file per variable, constraint and nonzero, and
+# bytes of memory needed by prepare_lopf per variable and constraint and per
+# nonzero of the largest block, which is built in memory at once
+_lp_bytes = dict(variables=42, constraints=11, nonzeros=16)
+_memory_bytes = dict(references=40, nonzeros=80)
+
+
+@profiled
+def estimate_lopf_size(n, snapshots=None, formulation='kirchhoff'):
+    """
+    Estimates the size of the linear problem which :func:`prepare_lopf` builds
+    for the network, without writing anything out. The blocks of variables
+    and constraints are counted from the numbers of components and snapshots
+    and the extendable and committable flags, following the same steps as
+    :func:`prepare_lopf`. The counts are exact for the kirchhoff and angles
+    formulation without presolve, except for the minimum up and down time
+    constraints of committable generators, where duplicate terms are not
+    merged. For the ptdf formulation a dense PTDF is assumed. The problem
+    of the extra_functionality is not included.
+
+    The network topology has to be determined before, as done by
+    :func:`network_lopf`.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    snapshots : list or index slice
+        Snapshots to optimise, defaults to n.snapshots
+    formulation : string
+        One of ["angles", "kirchhoff", "ptdf"]
+
+    Returns
+    -------
+    Dict with
+        blocks : pd.DataFrame
+            Numbers of variables, constraints and nonzeros of the constraint
+            matrix, indexed by component and name as in n.vars and n.cons
+        variables, constraints, nonzeros : int
+            Totals of the blocks
+        lp_file_size : int
+            Estimated size of the lp file in bytes
+        memory : int
+            Rough estimate of the peak memory needed by :func:`prepare_lopf`
+            in bytes, the solver typically needs considerably more
+
+    Example
+    -------
+    >>> size = estimate_lopf_size(n)
+    >>> size.blocks.groupby(level=0).sum()
+    """
+    sns = _as_snapshots(n, snapshots)
+    T = len(sns)
+    blocks = {}
 
+    def add(c, attr, variables=0, constraints=0, nonzeros=0):
+        counts = blocks.setdefault((c, attr), np.zeros(3, dtype=int))
+        counts += [variables, constraints, nonzeros]
 
+    # variables and their bounds
+    for c, attr in lookup.query('nominal and not handle_separately').index:
+        add(c, attr, variables=len(get_extendable_i(n, c)))
+    com_i = n.generators.query('committable').index
+    for c, attr in lookup.query('not nominal and not handle_separately').index:
+        ext_i, fix_i = get_extendable_i(n, c), get_non_extendable_i(n, c)
+        dispatch_i = ext_i
+        if c == 'Generator':
+            dispatch_i = ext_i | com_i
+            fix_i = fix_i.difference(com_i)
+        add(c, attr, variables=T * (len(fix_i) + len(dispatch_i)))
+        for name in ['mu_upper', 'mu_lower']:
+            add(c, name, constraints=T * len(ext_i), nonzeros=2 * T * len(ext_i))
+    ext_i = get_extendable_i(n, 'Generator')
+    status_i = com_i.difference(ext_i)
+    add('Generator', 'status', variables=T * len(status_i))
+
+    for c, attr in [('StorageUnit', 'state_of_charge'), ('Store', 'e')]:
+        fix = n.pnl(c).get(attr + '_set', pd.DataFrame())
+        fix = fix.reindex(index=sns, columns=fix.columns & n.df(c).index)
+        count = int(fix.notnull().values.sum())
+        add(c, f'mu_{attr}_set', constraints=count, nonzeros=count)
+
+    # unit commitment
+    uc_i = n.generators.query('committable and not p_nom_extendable').index
+    for name in ['committable_lb', 'committable_ub']:
+        add('Generators', name, constraints=T * len(uc_i),
+            nonzeros=2 * T * len(uc_i))
+    df = n.generators.loc[uc_i]
+    i = np.arange(T)[:, None]
+    for status, attr in [(1, 'up'), (0, 'down')]:
+        gens_i = df.index[df[f'min_{attr}_time'] > 0]
+        if gens_i.empty: continue
+        L = df.loc[gens_i, f'min_{attr}_time'].values.astype(int)
+        time_before = _time_before(n, sns, gens_i, status, L,
+                                   df.loc[gens_i, f'{attr}_time_before'].values)
+        must_stay = np.where(time_before > 0, L - time_before, 0)
+        force = i < must_stay
+        window = (i >= must_stay) & (i < T - 1)
+        terms = np.where(window, np.minimum(L, T - i) + (i > 0), force)
+        add('Generator', f'min_{attr}_time',
+            constraints=int((force | window).sum()), nonzeros=int(terms.sum()))
+    for attr in ['start_up_cost', 'shut_down_cost']:
+        k = int((df[attr] > 0).sum())
+        add('Generator', attr, variables=T * k, constraints=T * k,
+            nonzeros=k * (3 * T - 1))
+
+    # ramp limits
+    gens = n.generators
+    fix_i = get_non_extendable_i(n, 'Generator')
+    ramp_com_i = com_i.difference(ext_i)
+    for attr in ['up', 'down']:
+        ramp_i = gens.index[gens[f'ramp_limit_{attr}'].notnull()]
+        for gens_i, terms in [(fix_i, 2), (ext_i, 3), (ramp_com_i, 4)]:
+            k = (T - 1) * len(ramp_i & gens_i)
+            add('Generator', f'mu_ramp_limit_{attr}', constraints=k,
+                nonzeros=terms * k)
+
+    # storage
+    c = 'StorageUnit'
+    sus = n.storage_units
+    if not sus.empty:
+        spill = get_as_dense(n, c, 'inflow', sns).max() > 0
+        add(c, 'spill', variables=T * int(spill.sum()))
+        terms = (3 * T * len(sus) + T * spill.sum()
+                 + T * sus.cyclic_state_of_charge.sum()
+                 + (T - 1) * (~sus.cyclic_state_of_charge).sum())
+        add(c, 'mu_state_of_charge', constraints=T * len(sus),
+            nonzeros=int(terms))
+    stores = n.stores
+    if not stores.empty:
+        add('Store', 'p', variables=T * len(stores))
+        terms = (2 * T * len(stores) + T * stores.e_cyclic.sum()
+                 + (T - 1) * (~stores.e_cyclic).sum())
+        add('Store', 'mu_state_of_charge', constraints=T * len(stores),
+            nonzeros=int(terms))
+
+    # passive branch flows and power balances
+    branches = n.passive_branches()
+    injections = pd.concat([n.df(arg[0])[arg[2] if len(arg) > 2 else 'bus']
+                            for arg in _nodal_injection_args(n, sns, False)])
+    injections = injections[injections != '']
+    if formulation == 'ptdf':
+        per_sub = injections.map(n.buses.sub_network).value_counts()
+        sizes = branches.groupby([branches.index.get_level_values(0),
+                                  branches.sub_network]).size()
+        for (c, sub), m in sizes.items():
+            add(c, 'mu_flow_definition', constraints=T * m,
+                nonzeros=T * m * (1 + per_sub.get(sub, 0)))
+        add('SubNetwork', 'marginal_price', constraints=T * len(per_sub),
+            nonzeros=T * int(per_sub.sum()))
+    else:
+        if formulation == 'angles' and not branches.empty:
+            v_ang_i = n.buses.sub_network.isin(branches.sub_network.unique())
+            add('Bus', 'v_ang', variables=T * int(v_ang_i.sum()))
+            for c in branches.index.unique(0):
+                m = len(branches.loc[c])
+                add(c, 'mu_flow_definition', constraints=T * m,
+                    nonzeros=3 * T * m)
+        elif formulation == 'kirchhoff':
+            for sub in n.sub_networks.obj:
+                C = getattr(sub, 'C', None)
+                if C is None or not C.shape[1]: continue
+                add('SubNetwork', 'mu_kirchhoff_voltage_law',
+                    constraints=T * C.shape[1], nonzeros=T * C.nnz)
+        injections = pd.concat([injections, branches.bus0, branches.bus1])
+        per_bus = injections.value_counts()
+        add('Bus', 'marginal_price', constraints=T * len(per_bus),
+            nonzeros=T * int(per_bus.sum()))
+
+    # global constraints
+    for name, glc in n.global_constraints.iterrows():
+        if glc.type == 'primary_energy':
+            carattr = glc.carrier_attribute
+            emissions = n.carriers.index[n.carriers[carattr] != 0]
+            terms = (T * n.generators.carrier.isin(emissions).sum()
+                     + (sus.carrier.isin(emissions) &
+                        ~sus.cyclic_state_of_charge).sum()
+                     + (stores.bus.map(n.buses.carrier).isin(emissions) &
+                        ~stores.e_cyclic).sum())
+            if not len(emissions): terms = 0
+        else:
+            car = [re.sub('[\[\]\(\)]', '', c.strip())
+                   for c in glc.carrier_attribute.split(',')]
+            terms = ((n.lines.bus0.map(n.buses.carrier).isin(car)
+                      & n.lines.s_nom_extendable).sum()
+                     + (n.links.carrier.isin(car) & n.links.p_nom_extendable).sum())
+        add('GlobalConstraint', 'mu', constraints=int(terms > 0),
+            nonzeros=int(terms))
+
+    # constant of the objective
+    add('Network', 'objective_constant', variables=1)
+
+    blocks = pd.DataFrame.from_dict(blocks, orient='index',
+                                    columns=['variables', 'constraints', 'nonzeros'])
+    blocks = blocks[blocks.any(axis=1)]
+    blocks.index = pd.MultiIndex.from_tuples(blocks.index,
+                                             names=['component', 'name'])
+    totals = blocks.sum()
+    lp_file_size = sum(totals[k] * b for k, b in _lp_bytes.items())
+    memory = (_memory_bytes['references'] * (totals.variables + totals.constraints)
+              + _memory_bytes['nonzeros'] * blocks.nonzeros.max())
+    return Dict(blocks=blocks, lp_file_size=int(lp_file_size),
+                memory=int(memory), **totals.astype(int).to_dict())
+
+
+@profiled
 def network_lopf(n, snapshots=None, solver_name="cbc",
          solver_logfile=None, extra_functionality=None,
          extra_postprocessing=None, formulation="kirchhoff",
          keep_references=False, keep_files=False,
          keep_shadowprices=['Bus', 'Line', 'Transformer', 'Link', 'GlobalConstraint'],
          solver_options=None, warmstart=False, store_basis=False,
-         solver_dir=None):
+         solver_dir=None, ptdf_tolerance=0., presolve=False,
+         calculate_angles=True, free_memory={}, dry_run=False):
     """
     Linear optimal power flow for a group of snapshots.
 
@@ -824,7 +1417,16 @@ def network_lopf(n, snapshots=None, solver_name="cbc",
         construction, e.g. .lp file - useful for debugging
     formulation : string
         Formulation of the linear power flow equations to use; must be
-        one of ["angles","cycles","kirchhoff","ptdf"]
+        one of ["angles","kirchhoff","ptdf"]
+    ptdf_tolerance : float
+        Value below which PTDF entries are ignored, only used for the
+        "ptdf" formulation.
+    presolve : bool, default False
+        Substitute variables which are fixed to zero by the component data
+        (e.g. zero capacity or p_min_pu == p_max_pu == 0) and drop constraints
+        which are empty or always slack before writing the lp file. The
+        references of substituted variables and dropped constraints are set
+        to -1; their solution is zero and their shadow price NaN.
     extra_functionality : callable function
         This function must take two arguments
         `extra_functionality(network,snapshots)` and is called after
@@ -840,12 +1442,18 @@ def network_lopf(n, snapshots=None, solver_name="cbc",
     warmstart : bool or string, default False
         Use this to warmstart the optimization. Pass a string which gives
         the path to the basis file. If set to True, a path to
-        a basis file must be given in network.basis_fn.
+        a basis file must be given in network.basis_fn. For cbc and gurobi,
+        the basis stored in network.basis is used instead if present, which
+        is translated onto the current problem and therefore remains valid
+        when the problem was rebuilt with e.g. other snapshots.
     store_basis : bool, default False
         Whether to store the basis of the optimization results. If True,
         the path to the basis file is saved in network.basis_fn. Note that
         a basis can only be stored if simplex, dual-simplex, or barrier
-        *with* crossover is used for solving.
+        *with* crossover is used for solving. For cbc and gurobi, the basis
+        is further stored in network.basis with variables and constraints
+        labelled by component, attribute, name and snapshot, see
+        :func:`pypsa.linopt.read_basis`.
     keep_references : bool, default False
         Keep the references of variable and constraint names withing the
         network. These can be looked up in `n.vars` and `n.cons` after solving.
@@ -855,6 +1463,20 @@ def network_lopf(n, snapshots=None, solver_name="cbc",
         names. Defaults to ['Bus', 'Line', 'GlobalConstraint'].
         After solving, the shadow prices can be retrieved using
         :func:`pypsa.linopt.get_dual` with corresponding name
+    calculate_angles : bool, default True
+        Recover the voltage angles n.buses_t.v_ang from the optimised bus
+        injections. Set to False to skip this for large networks if the
+        angles are not needed. With the "angles" formulation the angles are
+        variables and always assigned.
+    free_memory : set, default {}
+        Any subset of {'pypsa'}. Allows to stash the `pypsa` time-series
+        away while the solver runs; they are written to a temporary file and
+        memory-mapped back afterwards, see
+        :func:`pypsa.descriptors.empty_network`.
+    dry_run : bool, default False
+        Do not build and solve the problem, but return the estimated numbers
+        of variables, constraints and nonzeros per block and the estimated
+        memory, see :func:`estimate_lopf_size`.
 
     """
     supported_solvers = ["cbc", "gurobi", 'glpk', 'scs']
@@ -862,39 +1484,58 @@ def network_lopf(n, snapshots=None, solver_name="cbc",
         raise NotImplementedError(f"Solver {solver_name} not in "
                                   f"supported solvers: {supported_solvers}")
 
-    if formulation != "kirchhoff":
-        raise NotImplementedError("Only the kirchhoff formulation is supported")
-
-    if n.generators.committable.any():
-        logger.warn("Unit commitment is not yet completely implemented for "
-        "optimising without pyomo. Thus minimum up time, minimum down time, "
-        "start up costs, shut down costs will be ignored.")
+    supported_formulations = ["angles", "kirchhoff", "ptdf"]
+    if formulation not in supported_formulations:
+        raise NotImplementedError(f"Formulation {formulation} not in "
+                                  f"supported formulations: {supported_formulations}")
 
     #disable logging because multiple slack bus calculations, keep output clean
     snapshots = _as_snapshots(n, snapshots)
     n.calculate_dependent_values()
     n.determine_network_topology()
 
+    if dry_run:
+        return estimate_lopf_size(n, snapshots, formulation)
+
     logger.info("Prepare linear problem")
     fdp, problem_fn = prepare_lopf(n, snapshots, keep_files,
-                                   extra_functionality, solver_dir)
+                                   extra_functionality, solver_dir,
+                                   formulation, ptdf_tolerance, presolve)
     fds, solution_fn = mkstemp(prefix='pypsa-solve', suffix='.sol', dir=solver_dir)
 
+    # translate a stored basis by labels, as references change between builds
+    translate_basis = solver_name in ['cbc', 'gurobi']
+    warmstart_fn = None
     if warmstart == True:
-        warmstart = n.basis_fn
+        if translate_basis and getattr(n, 'basis', None) is not None:
+            warmstart_fn = solution_fn.replace('.sol', '.warmstart.bas')
+            warmstart = write_basis(n, n.basis, warmstart_fn)
+        else:
+            warmstart = n.basis_fn
         logger.info("Solve linear problem using warmstart")
     else:
         logger.info(f"Solve linear problem using {solver_name.title()} solver")
 
+    if isinstance(free_memory, str):
+        free_memory = {free_memory}
+
     solve = eval(f'run_and_read_{solver_name}')
-    res = solve(n, problem_fn, solution_fn, solver_logfile,
-                solver_options, keep_files, warmstart, store_basis)
+    args = (n, problem_fn, solution_fn, solver_logfile, solver_options,
+            keep_files, warmstart, store_basis)
+    with stage('solve', solver=solver_name):
+        if 'pypsa' in free_memory:
+            with empty_network(n):
+                res = solve(*args)
+        else:
+            res = solve(*args)
 
     status, termination_condition, variables_sol, constraints_dual, obj = res
 
     if not keep_files:
         os.close(fdp); os.remove(problem_fn)
         os.close(fds); os.remove(solution_fn)
+        if warmstart_fn is not None:
+            os.remove(warmstart_fn)
 
     if status == "ok" and termination_condition == "optimal":
         logger.info('Optimization successful. Objective value: {:.2e}'.format(obj))
@@ -905,9 +1546,13 @@ def network_lopf(n, snapshots=None, solver_name="cbc",
         return status, termination_condition
 
     n.objective = obj
+    if store_basis:
+        has_basis = translate_basis and os.path.isfile(getattr(n, 'basis_fn', ''))
+        n.basis = read_basis(n, n.basis_fn) if has_basis else None
     assign_solution(n, snapshots, variables_sol, constraints_dual,
                     keep_references=keep_references,
-                    keep_shadowprices=keep_shadowprices)
+                    keep_shadowprices=keep_shadowprices,
+                    calculate_angles=calculate_angles)
     gc.collect()
 
     return status,termination_condition
@@ -14,10 +14,10 @@ pyomo (see module linopt.py)
 """
 
 from .descriptors import Dict
+from .profiling import profiled, stage
 import pandas as pd
 import os, logging, re, io, subprocess
 import numpy as np
-from pandas import IndexSlice as idx
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +25,8 @@ logger = logging.getLogger(__name__)
 # Front end functions
 # =============================================================================
 
-def define_variables(n, lower, upper, name, attr='', axes=None, spec=''):
+def define_variables(n, lower, upper, name, attr='', axes=None, spec='',
+                     mask=None):
     """
     Defines variable(s) for pypsa-network with given lower bound(s) and upper
     bound(s). The variables are stored in the network object under n.vars with
@@ -54,6 +55,10 @@ def define_variables(n, lower, upper, name, attr='', axes=None, spec=''):
         Specifies the axes and therefore the shape of the variables if bounds
         are single strings or floats. This is helpful when mutliple variables
         have the same upper and lower bound.
+    mask : pd.DataFrame/np.array, default None
+        Boolean mask of the same shape as the variables. Only variables where
+        mask is True are written out, all others get the reference -1 and are
+        treated as being fixed to zero.
 
 
     Example
@@ -74,7 +79,7 @@ def define_variables(n, lower, upper, name, attr='', axes=None, spec=''):
 
     Note that this is usefull for the `extra_functionality` argument.
     """
-    var = write_bound(n, lower, upper, axes)
+    var = write_bound(n, lower, upper, axes, mask)
     set_varref(n, var, name, attr, spec=spec)
 
 
@@ -122,9 +127,10 @@ def define_constraints(n, lhs, sense, rhs, name, attr='', axes=None, spec=''):
     Parameters
     ----------
     n: pypsa.Network
-    lhs: pd.Series/pd.DataFrame/np.array/str/float
+    lhs: pd.Series/pd.DataFrame/np.array/str/float/LinearExpression
         left hand side of the constraint(s), created with
-        :func:`pypsa.linot.linexpr`.
+        :func:`pypsa.linot.linexpr` or :class:`pypsa.linopt.LinearExpression`.
+        For a LinearExpression the axes are taken from the expression.
     sense: pd.Series/pd.DataFrame/np.array/str/float
         sense(s) of the constraint(s)
     rhs: pd.Series/pd.DataFrame/np.array/str/float
@@ -187,20 +193,40 @@ def _get_handlers(axes, *maybearrays):
     return axes, shape, length
 
 
-def write_bound(n, lower, upper, axes=None):
+def _masked_references(n, counter, shape, mask):
+    # references for all entries where mask is True, -1 for all others
+    length = int(mask.sum())
+    start = getattr(n, counter)
+    setattr(n, counter, start + length)
+    refs = np.full(shape, -1, dtype=int)
+    refs[mask] = np.arange(start, start + length)
+    return refs
+
+
+def write_bound(n, lower, upper, axes=None, mask=None):
     """
     Writer function for writing out mutliple variables at a time. If lower and
     upper are floats it demands to give pass axes, a tuple of (index, columns)
     or (index), for creating the variable of same upper and lower bounds.
-    Return a series or frame with variable references.
+    Return a series or frame with variable references. If a boolean mask is
+    given, only variables where the mask is True are written out, the others
+    get the reference -1.
     """
     axes, shape, length = _get_handlers(axes, lower, upper)
     if not length: return pd.Series()
-    n._xCounter += length
-    variables = np.arange(n._xCounter - length, n._xCounter).reshape(shape)
+    if mask is None:
+        n._xCounter += length
+        variables = np.arange(n._xCounter - length, n._xCounter).reshape(shape)
+        mask = slice(None)
+    else:
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), shape)
+        variables = _masked_references(n, '_xCounter', shape, mask)
     lower, upper = _str_array(lower), _str_array(upper)
-    n.bounds_f.write(join_exprs(lower + ' <= x' + _str_array(variables, True)
-                                + ' <= '+ upper + '\n'))
+    x = 'x' + _str_array(variables, True)
+    bounds = np.where(lower == upper, x + ' = ' + upper,
+                      lower + ' <= ' + x + ' <= ' + upper)
+    bounds = np.where((lower == '-inf') & (upper == '+inf'), x + ' free', bounds)
+    n.bounds_f.write(join_exprs(np.broadcast_to(bounds, shape)[mask] + '\n'))
     return to_pandas(variables, *axes)
 
 def write_constraint(n, lhs, sense, rhs, axes=None):
@@ -208,19 +234,46 @@ def write_constraint(n, lhs, sense, rhs, axes=None):
     Writer function for writing out mutliple constraints to the corresponding
     constraints file. If lower and upper are numpy.ndarrays it axes must not be
     None but a tuple of (index, columns) or (index).
-    Return a series or frame with constraint references.
+    Return a series or frame with constraint references. Constraints with an
+    empty left hand side, e.g. when all variables were substituted, are not
+    written out and get the reference -1.
     """
+    if isinstance(lhs, LinearExpression):
+        axes = lhs.axes if axes is None and lhs.ndim else axes
+        lhs = lhs.to_strings()
     axes, shape, length = _get_handlers(axes, lhs, sense, rhs)
     if not length: return pd.Series()
-    n._cCounter += length
-    cons = np.arange(n._cCounter - length, n._cCounter).reshape(shape)
     if isinstance(sense, str):
         sense = '=' if sense == '==' else sense
+    empty = np.broadcast_to(np.asarray(lhs) == '', shape)
+    if empty.any():
+        _check_empty_constraints(sense, rhs, shape, empty)
+        mask = ~empty
+        cons = _masked_references(n, '_cCounter', shape, mask)
+    else:
+        n._cCounter += length
+        cons = np.arange(n._cCounter - length, n._cCounter).reshape(shape)
+        mask = slice(None)
     lhs, sense, rhs = _str_array(lhs), _str_array(sense), _str_array(rhs)
-    n.constraints_f.write(join_exprs('c' + _str_array(cons, True) + ':\n' +
-                                     lhs + sense + ' ' + rhs + '\n\n'))
+    exprs = ('c' + _str_array(cons, True) + ':\n' + lhs + sense + ' ' + rhs
+             + '\n\n')
+    n.constraints_f.write(join_exprs(np.broadcast_to(exprs, shape)[mask]))
     return to_pandas(cons, *axes)
 
+def _check_empty_constraints(sense, rhs, shape, empty):
+    # constraints without variables are dropped, warn if they are violated
+    try:
+        rhs = np.broadcast_to(np.asarray(rhs, dtype=float), shape)[empty]
+    except (TypeError, ValueError):
+        return
+    sense = np.broadcast_to(np.asarray(sense), shape)[empty]
+    violated = (((sense == '=') & (rhs != 0)) | ((sense == '<=') & (rhs < 0)) |
+                ((sense == '>=') & (rhs > 0)))
+    if violated.any():
+        logger.warning(f'{violated.sum()} constraint(s) without any variables '
+                       'are violated and were dropped, the problem is '
+                       'infeasible.')
+
 def write_binary(n, axes):
     """
     Writer function for writing out mutliple binary-variables at a time.
@@ -272,10 +325,10 @@ def align_with_static_component(n, c, attr):
     pypsa.component name, it will sort the columns of the variable according
     to the statid component.
     """
-    if c in n.all_components and (c, attr) in n.variables.index:
-        if not n.variables.pnl[c, attr]: return
-        if len(n.vars[c].pnl[attr].columns) != len(n.df(c).index): return
-        n.vars[c].pnl[attr] = n.vars[c].pnl[attr].reindex(columns=n.df(c).index)
+    if c in n.all_components and (c, attr) in n.vars:
+        if not n.vars.is_pnl(c, attr): return
+        if len(get_var(n, c, attr).columns) != len(n.df(c).index): return
+        n.vars.align(c, attr, n.df(c).index)
 
 
 def linexpr(*tuples, as_pandas=True, return_axes=False):
@@ -329,7 +382,12 @@ def linexpr(*tuples, as_pandas=True, return_axes=False):
     expr = np.repeat('', np.prod(shape)).reshape(shape).astype(object)
     if np.prod(shape):
         for coeff, var in tuples:
-            expr = expr + _str_array(coeff) + ' x' + _str_array(var, True) + '\n'
+            term = _str_array(coeff) + ' x' + _str_array(var, True) + '\n'
+            # variables with reference -1 are fixed to zero, drop their terms
+            var = np.asarray(var)
+            if var.dtype.kind in 'if' and (var == -1).any():
+                term = np.where(var == -1, '', term)
+            expr = expr + term
     if return_axes:
         return (expr, *axes)
     if as_pandas:
@@ -337,6 +395,216 @@ def linexpr(*tuples, as_pandas=True, return_axes=False):
     return expr
 
 
+class LinearExpression(object):
+    """
+    Array-backed linear expression. Coefficients and variable references are
+    stored as numpy arrays of shape (*shape, n_terms), where shape is the shape
+    of the expression (e.g. snapshots x components) and the last dimension
+    holds the terms of each entry. Terms with variable reference -1 are
+    ignored. In contrast to :func:`linexpr`, no strings are created before the
+    expression is written out, which makes sums and groupings over large sets
+    of variables cheap.
+
+    Parameters
+    ----------
+    tuples: tuple of tuples
+        Each tuple must of the form (coeff, var), where
+
+        * coeff is a numerical value, or a numerical array, series, frame
+        * var is an integer array, series or frame of variable references,
+          as returned by :func:`get_var`
+
+    Example
+    -------
+    Limit the gas generation per bus summed over all snapshots
+
+    >>> gas_i = n.generators.query('carrier == "gas"').index
+    >>> gas = get_var(n, 'Generator', 'p')[gas_i]
+    >>> weightings = n.snapshot_weightings
+    >>> lhs = (LinearExpression((weightings.values[:, None], gas))
+    ...        .sum(0).groupby(n.generators.bus))
+    >>> define_constraints(n, lhs, '<=', 1000, 'Bus', 'gas_limit')
+
+    """
+
+    def __init__(self, *tuples):
+        axes, shape = broadcasted_axes(*tuples)
+        shape = tuple(shape)
+        coeffs, variables = [], []
+        for coeff, var in tuples:
+            var = np.asarray(var, dtype=float)
+            var = np.where(np.isnan(var), -1, var).astype(int)
+            coeffs.append(np.broadcast_to(np.asarray(coeff, dtype=float), shape))
+            variables.append(np.broadcast_to(var, shape))
+        if len(axes) != len(shape):
+            axes = [pd.RangeIndex(l) for l in shape]
+        self.coeffs = np.stack(coeffs, -1) if coeffs else np.empty(shape + (0,))
+        self.vars = (np.stack(variables, -1) if variables else
+                     np.empty(shape + (0,), dtype=int))
+        self.axes = list(axes)
+
+    @classmethod
+    def from_arrays(cls, coeffs, variables, axes=None):
+        """
+        Create a linear expression directly from coefficient and variable
+        arrays of shape (*shape, n_terms).
+        """
+        expr = cls.__new__(cls)
+        expr.coeffs = np.asarray(coeffs, dtype=float)
+        expr.vars = np.asarray(variables, dtype=int)
+        shape = expr.coeffs.shape[:-1]
+        expr.axes = (list(axes) if axes is not None else
+                     [pd.RangeIndex(l) for l in shape])
+        return expr
+
+    @property
+    def shape(self):
+        return self.coeffs.shape[:-1]
+
+    @property
+    def ndim(self):
+        return self.coeffs.ndim - 1
+
+    @property
+    def n_terms(self):
+        return self.coeffs.shape[-1]
+
+    def __repr__(self):
+        return (f'LinearExpression with shape {self.shape} and '
+                f'{self.n_terms} term(s) per entry')
+
+    def _broadcast_terms(self, shape):
+        shape = tuple(shape) + (self.n_terms,)
+        return (np.broadcast_to(self.coeffs, shape),
+                np.broadcast_to(self.vars, shape))
+
+    def __add__(self, other):
+        if not isinstance(other, LinearExpression):
+            return NotImplemented
+        shape = np.broadcast(np.empty(self.shape), np.empty(other.shape)).shape
+        axes = self.axes if self.ndim >= other.ndim else other.axes
+        for ax, oax in zip(self.axes[::-1], other.axes[::-1]):
+            assert len(ax) == 1 or len(oax) == 1 or ax.equals(oax), (
+                'Axes of linear expressions are not aligned.')
+        coeffs, variables = zip(self._broadcast_terms(shape),
+                                other._broadcast_terms(shape))
+        return LinearExpression.from_arrays(np.concatenate(coeffs, -1),
+                                            np.concatenate(variables, -1), axes)
+
+    def __neg__(self):
+        return LinearExpression.from_arrays(-self.coeffs, self.vars, self.axes)
+
+    def __sub__(self, other):
+        return self + (- other)
+
+    def __mul__(self, other):
+        other = np.broadcast_to(np.asarray(other, dtype=float), self.shape)
+        return LinearExpression.from_arrays(self.coeffs * other[..., None],
+                                            self.vars, self.axes)
+
+    __rmul__ = __mul__
+
+    def sum(self, axis=None):
+        """
+        Sum the expression over the given axis or over all axes if axis is
+        None. The terms of the summed entries are concatenated.
+        """
+        if axis is None:
+            return LinearExpression.from_arrays(self.coeffs.reshape(-1),
+                                                self.vars.reshape(-1), [])
+        axis = axis % self.ndim
+        shape = self.shape[:axis] + self.shape[axis+1:] + (-1,)
+        coeffs = np.moveaxis(self.coeffs, axis, -2).reshape(shape)
+        variables = np.moveaxis(self.vars, axis, -2).reshape(shape)
+        axes = self.axes[:axis] + self.axes[axis+1:]
+        return LinearExpression.from_arrays(coeffs, variables, axes)
+
+    def groupby(self, by, axis=-1):
+        """
+        Sum the expression over groups along an axis, by default the last one
+        (e.g. components). `by` gives the group of each entry along the axis,
+        it can be a series indexed by the labels of the axis, like
+        `n.generators.bus`, or an array of the same length as the axis. The
+        axis of the resulting expression holds the sorted unique groups.
+        """
+        axis = axis % self.ndim
+        if isinstance(by, pd.Series):
+            by = by.reindex(self.axes[axis])
+        groups, codes = np.unique(np.asarray(by), return_inverse=True)
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=len(groups))
+        width = counts.max() if len(counts) else 0
+        # matrix of positions along the axis for each group, padded with -1
+        pos = np.full((len(groups), width), -1)
+        rank = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pos[codes[order], rank] = order
+
+        coeffs = np.take(self.coeffs, pos.clip(0), axis=axis)
+        variables = np.take(self.vars, pos.clip(0), axis=axis)
+        pad = np.expand_dims(pos == -1, tuple(range(axis)))
+        pad = np.expand_dims(pad, tuple(range(axis + 2, coeffs.ndim)))
+        coeffs = np.where(pad, 0., coeffs)
+        variables = np.where(pad, -1, variables)
+
+        shape = self.shape[:axis] + (len(groups),) + self.shape[axis+1:] + (-1,)
+        coeffs = np.moveaxis(coeffs, axis + 1, -2).reshape(shape)
+        variables = np.moveaxis(variables, axis + 1, -2).reshape(shape)
+        axes = list(self.axes)
+        axes[axis] = pd.Index(groups, name=axes[axis].name)
+        return LinearExpression.from_arrays(coeffs, variables, axes)
+
+    def to_strings(self):
+        """
+        Returns the expression as a numpy array of lp-format strings.
+        """
+        coeffs = self.coeffs.reshape(-1, self.n_terms)
+        variables = self.vars.reshape(-1, self.n_terms)
+        coeffs, variables = _merge_duplicate_terms(coeffs, variables)
+        valid = variables != -1
+        counts = valid.sum(1)
+        exprs = np.empty(len(counts), dtype=object)
+        for k in np.unique(counts):
+            rows = counts == k
+            c, v = coeffs[rows], variables[rows]
+            if not valid[rows].all():
+                order = np.argsort(~valid[rows], axis=1, kind='stable')[:, :k]
+                c = np.take_along_axis(c, order, 1)
+                v = np.take_along_axis(v, order, 1)
+            terms = np.empty((rows.sum(), 2 * k), dtype=object)
+            terms[:, ::2], terms[:, 1::2] = c, v
+            fmt = '%+f x%d\n' * k
+            exprs[rows] = [fmt % tuple(t) for t in terms]
+        return exprs.reshape(self.shape)
+
+    def to_pandas(self):
+        """
+        Returns the expression as pandas.Series or pandas.DataFrame of
+        lp-format strings, as returned by :func:`linexpr`.
+        """
+        strings = self.to_strings()
+        if strings.ndim == 0:
+            return strings.item()
+        return to_pandas(strings, *self.axes)
+
+
+def _merge_duplicate_terms(coeffs, variables):
+    # lp readers reject constraints containing a variable twice, sum them up
+    order = np.argsort(variables, axis=1, kind='stable')
+    variables = np.take_along_axis(variables, order, 1)
+    coeffs = np.take_along_axis(coeffs, order, 1)
+    dup = np.zeros(variables.shape, dtype=bool)
+    dup[:, 1:] = (variables[:, 1:] == variables[:, :-1]) & (variables[:, 1:] != -1)
+    if not dup.any():
+        return coeffs, variables
+    rows = np.broadcast_to(np.arange(len(variables))[:, None], variables.shape)
+    term = np.cumsum(~dup, axis=1) - 1
+    merged_coeffs = np.zeros(coeffs.shape)
+    np.add.at(merged_coeffs, (rows, term), coeffs)
+    merged_vars = np.full(variables.shape, -1)
+    merged_vars[rows[~dup], term[~dup]] = variables[~dup]
+    return merged_coeffs, merged_vars
+
+
 def to_pandas(array, *axes):
     """
     Convert a numpy array to pandas.Series if 1-dimensional or to a
@@ -371,67 +639,221 @@ def join_exprs(df):
     return ''.join(np.asarray(df).flatten())
 
 # =============================================================================
-#  references to vars and cons, rewrite this part to not store every reference
+#  references to vars and cons
 # =============================================================================
 
-def _add_reference(ref_dict, df, attr, pnl=True):
-    if pnl:
-        if attr in ref_dict.pnl:
-            ref_dict.pnl[attr][df.columns] = df
+class _Block(object):
+    """
+    Block of references written at once. Consecutive references are only
+    stored by their offset, the shape and the axes labels. References with a
+    gap, e.g. due to substituted variables, additionally keep a boolean mask.
+    Only non-consecutive references are stored explicitly.
+    """
+    __slots__ = ('offset', 'shape', 'axes', 'mask', 'array')
+
+    def __init__(self, refs):
+        values = np.asarray(refs.values)
+        self.shape, self.axes = values.shape, list(refs.axes)
+        self.offset, self.mask, self.array = 0, None, None
+        flat = values.ravel()
+        valid = flat != -1
+        ids = flat[valid]
+        if not len(ids) or (ids[-1] - ids[0] == len(ids) - 1 and
+                            (np.diff(ids) == 1).all()):
+            self.offset = int(ids[0]) if len(ids) else 0
+            if not valid.all():
+                self.mask = valid.reshape(self.shape)
+        else:
+            self.array = values.astype(int)
+
+    def refs(self):
+        if self.array is not None:
+            return self.array
+        ids = np.arange(self.offset, self.offset + self.size)
+        if self.mask is None:
+            return ids.reshape(self.shape)
+        refs = np.full(self.shape, -1, dtype=int)
+        refs[self.mask] = ids
+        return refs
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape)) if self.mask is None else \
+               int(self.mask.sum())
+
+    def take(self, values):
+        """
+        Values of the references, where `values` is an array indexed by the
+        reference and values[-1] is used for the reference -1.
+        """
+        if self.array is not None:
+            return values[self.array]
+        data = values[self.offset:self.offset + self.size]
+        if self.mask is None:
+            return data.reshape(self.shape)
+        out = np.full(self.shape, values[-1], dtype=values.dtype)
+        out[self.mask] = data
+        return out
+
+
+class References(object):
+    """
+    Registry for variable or constraint references, stored in n.vars and
+    n.cons. For each (component, attribute) pair it keeps the blocks of
+    references as written by :func:`write_bound` or :func:`write_constraint`,
+    i.e. offset, shape and axes, instead of an integer frame per reference.
+    The references are accessed with :func:`get_var` and :func:`get_con`, which
+    build the series or frame on the fly.
+
+    For backwards compatibility, `n.vars[c]` and `n.vars.c` return a Dict
+    with the static references in `df` and the time-dependent ones in `pnl`.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+        self._order = {}
+        self._spec = {}
+
+    def add(self, refs, c, attr, spec=''):
+        key = (c, attr)
+        if key in self._blocks and spec != '':
+            self._spec[key] += ', ' + spec
         else:
-            ref_dict.pnl[attr] = df
-    else:
-        if ref_dict.df.empty:
-            ref_dict.df[attr] = df
+            self._spec[key] = spec
+        self._blocks.setdefault(key, []).append(_Block(refs))
+
+    def align(self, c, attr, order):
+        """Sort time-dependent references according to `order`."""
+        self._order[(c, attr)] = order
+
+    def __contains__(self, key):
+        return key in self._blocks
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def is_pnl(self, c, attr):
+        return len(self._blocks[(c, attr)][0].shape) == 2
+
+    @property
+    def index(self):
+        return pd.MultiIndex.from_tuples(list(self._blocks),
+                                         names=['component', 'name']) \
+               if self._blocks else \
+               pd.MultiIndex.from_arrays([[], []], names=['component', 'name'])
+
+    @property
+    def components(self):
+        return set(c for c, attr in self._blocks)
+
+    def to_frame(self):
+        """Summary of all references with columns 'pnl' and 'specification'."""
+        return pd.DataFrame({'pnl': [self.is_pnl(*k) for k in self._blocks],
+                             'specification': list(self._spec.values())},
+                            index=self.index, columns=['pnl', 'specification'])
+
+    def _combine(self, key, arrays):
+        blocks = self._blocks[key]
+        objs = [to_pandas(a, *b.axes) for a, b in zip(arrays, blocks)]
+        pnl = objs[0].ndim == 2
+        if len(objs) == 1:
+            obj = objs[0]
+        elif pnl:
+            obj = pd.concat(objs, axis=1, sort=False)
+            obj = obj.loc[:, ~obj.columns.duplicated(keep='last')]
         else:
-            ref_dict.df = pd.concat([ref_dict.df, df.to_frame(attr)])
+            obj = pd.concat(objs, sort=False)
+            obj = obj[~obj.index.duplicated(keep='last')]
+        order = self._order.get(key)
+        if pnl and order is not None and not obj.columns.equals(order):
+            obj = obj.reindex(columns=order)
+        return obj
+
+    def get(self, c, attr, pop=False):
+        key = (c, attr)
+        obj = self._combine(key, [b.refs() for b in self._blocks[key]])
+        if pop:
+            self.pop(c, attr)
+        return obj
+
+    def values(self, c, attr, values, pop=False):
+        """
+        Map an array `values`, indexed by the references, onto the references
+        of (c, attr) by slicing the blocks. values[-1] is used for references
+        equal to -1.
+        """
+        key = (c, attr)
+        obj = self._combine(key, [b.take(values) for b in self._blocks[key]])
+        if pop:
+            self.pop(c, attr)
+        return obj
+
+    def pop(self, c, attr):
+        key = (c, attr)
+        self._order.pop(key, None)
+        self._spec.pop(key, None)
+        return self._blocks.pop(key)
+
+    def __getitem__(self, c):
+        attrs = [attr for comp, attr in self._blocks if comp == c]
+        if not attrs:
+            raise KeyError(c)
+        pnl = Dict({a: self.get(c, a) for a in attrs if self.is_pnl(c, a)})
+        df = pd.concat({a: self.get(c, a) for a in attrs
+                        if not self.is_pnl(c, a)}, axis=1, sort=False) \
+             if len(pnl) < len(attrs) else pd.DataFrame()
+        return Dict(df=df, pnl=pnl)
+
+    def __getattr__(self, c):
+        if c.startswith('_'):
+            raise AttributeError(c)
+        try:
+            return self[c]
+        except KeyError:
+            raise AttributeError(c)
+
+    def __iter__(self):
+        return iter(sorted(self.components))
+
+    def __repr__(self):
+        return (f'References for {len(self)} attributes of the components '
+                f'{", ".join(self)}')
+
 
 def set_varref(n, variables, c, attr, spec=''):
     """
     Sets variable references to the network.
-    One-dimensional variable references will be collected at n.vars[c].df,
-    two-dimensional varaibles in n.vars[c].pnl
-    For example:
+    The references are registered in n.vars, see
+    :class:`pypsa.linopt.References`, and summarised in n.variables. For
+    example:
     * nominal capacity variables for generators are stored in
       `n.vars.Generator.df.p_nom`
     * operational variables for generators are stored in
       `n.vars.Generator.pnl.p`
     """
     if not variables.empty:
-        pnl = variables.ndim == 2
-        if c not in n.variables.index:
-            n.vars[c] = Dict(df=pd.DataFrame(), pnl=Dict())
-        if ((c, attr) in n.variables.index) and (spec != ''):
-            n.variables.at[idx[c, attr], 'specification'] += ', ' + spec
-        else:
-            n.variables.loc[idx[c, attr], :] = [pnl, spec]
-        _add_reference(n.vars[c], variables, attr, pnl=pnl)
+        n.vars.add(variables, c, attr, spec=spec)
+        n.variables = n.vars.to_frame()
 
 def set_conref(n, constraints, c, attr, spec=''):
     """
     Sets variable references to the network.
-    One-dimensional constraint references will be collected at n.cons[c].df,
-    two-dimensional in n.cons[c].pnl
-    For example:
+    The references are registered in n.cons, see
+    :class:`pypsa.linopt.References`, and summarised in n.constraints. For
+    example:
     * constraints for nominal capacity variables for generators are stored in
       `n.cons.Generator.df.mu_upper`
     * operational capacity limits for generators are stored in
       `n.cons.Generator.pnl.mu_upper`
     """
     if not constraints.empty:
-        pnl = constraints.ndim == 2
-        if c not in n.constraints.index:
-            n.cons[c] = Dict(df=pd.DataFrame(), pnl=Dict())
-        if ((c, attr) in n.constraints.index) and (spec != ''):
-            n.constraints.at[idx[c, attr], 'specification'] += ', ' + spec
-        else:
-            n.constraints.loc[idx[c, attr], :] = [pnl, spec]
-        _add_reference(n.cons[c], constraints, attr, pnl=pnl)
+        n.cons.add(constraints, c, attr, spec=spec)
+        n.constraints = n.cons.to_frame()
 
 def get_var(n, c, attr, pop=False):
     '''
     Retrieves variable references for a given static or time-depending
-    attribute of a given component. The function looks into n.variables to
+    attribute of a given component. The function looks into n.vars to
     detect whether the variable is a time-dependent or static.
 
     Parameters
@@ -447,8 +869,7 @@ def get_var(n, c, attr, pop=False):
     >>> get_var(n, 'Generator', 'p')
 
     '''
-    vvars = n.vars[c].pnl if n.variables.pnl[c, attr] else n.vars[c].df
-    return vvars.pop(attr) if pop else vvars[attr]
+    return n.vars.get(c, attr, pop=pop)
 
 
 def get_con(n, c, attr, pop=False):
@@ -468,8 +889,7 @@ def get_con(n, c, attr, pop=False):
     -------
     get_con(n, 'Generator', 'mu_upper')
     """
-    cons = n.cons[c].pnl if n.constraints.pnl[c, attr] else n.cons[c].df
-    return cons.pop(attr) if pop else cons[attr]
+    return n.cons.get(c, attr, pop=pop)
 
 
 def get_sol(n, name, attr=''):
@@ -524,6 +944,100 @@ def get_dual(n, name, attr=''):
         return n.duals[name].pnl[attr] if pnl else n.duals[name].df[attr]
 
 
+# =============================================================================
+# basis handling
+# =============================================================================
+
+def reference_labels(n, kind='x'):
+    """
+    Returns a series which maps the integer references of all variables
+    (kind='x') or all constraints (kind='c') to labels of the form
+    'component|attr|name|snapshot'. In contrast to the integer references, the
+    labels do not depend on the order in which the problem was built and
+    therefore stay valid when the problem is rebuilt with e.g. a different
+    snapshot window or additional components.
+
+    """
+    index = n.vars.index if kind == 'x' else n.cons.index
+    get = get_var if kind == 'x' else get_con
+    labels = []
+    for c, attr in index:
+        refs = get(n, c, attr)
+        if isinstance(refs, pd.DataFrame):
+            refs = refs.stack()
+            sns = refs.index.get_level_values(0).astype(str)
+            names = refs.index.get_level_values(1).astype(str)
+            keys = f'{c}|{attr}|' + names + '|' + sns
+        else:
+            keys = f'{c}|{attr}|' + refs.index.astype(str) + '|'
+        labels.append(pd.Series(keys, refs.values.astype(int)))
+    if not labels: return pd.Series(dtype=object)
+    labels = pd.concat(labels)
+    return labels[labels.index != -1]
+
+
+def read_basis(n, basis_fn):
+    """
+    Reads a basis file in MPS format, as written by cbc and gurobi, and
+    translates the variable and constraint names into the labels of
+    :func:`reference_labels`. Entries which cannot be labelled, e.g. the
+    constant of the objective, are dropped. The returned frame can be
+    written out for a rebuilt problem using :func:`write_basis`.
+
+    """
+    entries = []
+    with open(basis_fn) as f:
+        for line in f:
+            if not line.startswith(' '):
+                continue
+            fields = line.split()
+            # XU and XL entries give a variable and a constraint, UL and LL
+            # entries only a variable, both optionally followed by values
+            if fields[0] in ['XU', 'XL']:
+                entries.append(fields[:3] + [' '.join(fields[3:])])
+            elif fields[0] in ['UL', 'LL']:
+                entries.append(fields[:2] + ['', ' '.join(fields[2:])])
+    basis = pd.DataFrame(entries, columns=['status', 'name1', 'name2', 'values'])
+    paired = basis.status.isin(['XU', 'XL'])
+
+    xlabels, clabels = reference_labels(n, 'x'), reference_labels(n, 'c')
+    def translate(names, labels):
+        ref = pd.to_numeric(names.str[1:], errors='coerce')
+        return ref.map(labels)
+    basis['name1'] = translate(basis.name1, xlabels)
+    basis['name2'] = translate(basis.name2, clabels).where(paired, '')
+    return basis.dropna().reset_index(drop=True)
+
+
+def write_basis(n, basis, basis_fn):
+    """
+    Writes out a basis, read by :func:`read_basis`, for the current problem in
+    MPS format. Labels which do not exist in the current problem are skipped,
+    the solver completes the basis for new variables and constraints.
+
+    """
+    xrefs = reference_labels(n, 'x')
+    crefs = reference_labels(n, 'c')
+    xrefs = pd.Series('x' + xrefs.index.astype(str), xrefs.values)
+    crefs = pd.Series('c' + crefs.index.astype(str), crefs.values)
+    paired = basis.status.isin(['XU', 'XL'])
+    name1 = basis.name1.map(xrefs)
+    name2 = basis.name2.map(crefs).where(paired, '')
+    valid = name1.notna() & name2.notna()
+    logger.info(f'Translated {valid.sum()} of {len(basis)} basis entries to the '
+                'current problem')
+    fields = pd.concat([basis.status, name1, name2, basis['values']], axis=1)[valid]
+    lines = [' ' + ' '.join(f for f in row if f) + '\n' for row in fields.values]
+    # the header announces values following the names as written by cbc
+    header = 'NAME          PYPSA'
+    if (basis['values'][valid] != '').any():
+        header += '      VALUES'
+    with open(basis_fn, 'w') as f:
+        f.write(header + '\n')
+        f.write(''.join(lines))
+        f.write('ENDATA\n')
+    return basis_fn
+
 # =============================================================================
 # solvers
 # =============================================================================
@@ -532,6 +1046,90 @@ def set_int_index(ser):
     ser.index = ser.index.str[1:].astype(int)
     return ser
 
+
+_cbc_names = bytes.maketrans(b'xc', b'- ')
+
+@profiled
+def read_cbc_solution(solution_fn, n_variables, n_constraints,
+                      chunksize=2**24):
+    """
+    Read the primal and dual values from a cbc solution file, written with
+    '-printingOptions all', into arrays indexed by the integer references.
+
+    The file is read in chunks of about `chunksize` bytes. In each chunk the
+    names 'x<id>' and 'c<id>' are translated to '-<id>' and ' <id>', so that
+    the whole chunk is tokenized by numpy at once. Ids which are not in the
+    file are NaN.
+
+    Returns
+    -------
+    objective line, primal values (length n_variables), duals (length
+    n_constraints)
+    """
+    variables_sol = np.full(n_variables, np.nan)
+    constraints_dual = np.full(n_constraints, np.nan)
+    with open(solution_fn, 'rb') as f:
+        header = f.readline().decode()
+        while True:
+            lines = f.readlines(chunksize)
+            if not lines:
+                break
+            # columns: number, id (negative for variables), value, dual
+            data = b''.join(lines).translate(_cbc_names, b'*')
+            data = np.fromstring(data, sep=' ')
+            if data.size != 4 * len(lines):
+                raise ValueError(f"Could not parse cbc solution {solution_fn}")
+            data = data.reshape(-1, 4)
+            ids = data[:, 1].astype(int)
+            is_var = ids < 0
+            variables_sol[- ids[is_var]] = data[is_var, 2]
+            constraints_dual[ids[~is_var]] = data[~is_var, 3]
+    return header, variables_sol, constraints_dual
+
+
+def read_glpk_section(f, values, column, chunksize=2**16):
+    """
+    Read one section (rows or columns) of a glpk solution report from the
+    open file `f` and write `column` (e.g. 'Activity' or 'Marginal') into the
+    array `values` at the integer references. The field positions are taken
+    from the dashed line under the header, entries with long names span two
+    lines. The entries are converted in chunks of `chunksize`.
+
+    Returns False if the section has no such column.
+    """
+    header = f.readline()
+    spans = [m.span() for m in re.finditer('-+', f.readline())]
+    names = [header[start:end].strip() for start, end in spans]
+    found = column in names
+    if found:
+        start, end = spans[names.index(column)]
+    name_start, name_end = spans[1]
+
+    def flush(ids, strings):
+        if found and ids:
+            parsed = pd.to_numeric(np.array(strings, dtype=object),
+                                   errors='coerce')
+            # blank or '< eps' entries are zero
+            values[np.array(ids, dtype=int)] = np.nan_to_num(parsed)
+        return [], []
+
+    ids, strings = [], []
+    for line in f:
+        if line == '\n':
+            break
+        tokens = line.split()
+        if len(tokens) == 2:
+            name = tokens[1]
+            line = f.readline()
+        else:
+            name = line[name_start:name_end].strip()
+        ids.append(name[1:])
+        strings.append(line[start:end].strip() if found else '')
+        if len(ids) >= chunksize:
+            ids, strings = flush(ids, strings)
+    flush(ids, strings)
+    return found
+
 def run_and_read_cbc(n, problem_fn, solution_fn, solver_logfile,
                      solver_options, keep_files, warmstart=None,
                      store_basis=True):
@@ -553,13 +1151,14 @@ def run_and_read_cbc(n, problem_fn, solution_fn, solver_logfile,
         n.basis_fn = solution_fn.replace('.sol', '.bas')
         command += f'-basisO {n.basis_fn} '
 
-    result = subprocess.run(command.split(' '), stdout=subprocess.PIPE)
+    with stage('run_cbc'):
+        result = subprocess.run(command.split(' '), stdout=subprocess.PIPE)
     if solver_logfile is not None:
         print(result.stdout.decode('utf-8'), file=open(solver_logfile, 'w'))
 
-    f = open(solution_fn,"r")
-    data = f.readline()
-    f.close()
+    # the status is in the first line, the values are only read if optimal
+    with open(solution_fn) as f:
+        data = f.readline()
 
     if data.startswith("Optimal - objective value"):
         status = "ok"
@@ -575,11 +1174,11 @@ def run_and_read_cbc(n, problem_fn, solution_fn, solver_logfile,
     if termination_condition != "optimal":
         return status, termination_condition, None, None, None
 
-    sol = pd.read_csv(solution_fn, header=None, skiprows=[0],
-                      sep=r'\s+', usecols=[1,2,3], index_col=0)
-    variables_b = sol.index.str[0] == 'x'
-    variables_sol = sol[variables_b][2].pipe(set_int_index)
-    constraints_dual = sol[~variables_b][3].pipe(set_int_index)
+    # series indexed by the references
+    _, variables_sol, constraints_dual = read_cbc_solution(
+            solution_fn, n._xCounter, n._cCounter)
+    variables_sol = pd.Series(variables_sol)
+    constraints_dual = pd.Series(constraints_dual)
 
     return (status, termination_condition, variables_sol,
             constraints_dual, objective)
@@ -608,7 +1207,8 @@ def run_and_read_glpk(n, problem_fn, solution_fn, solver_logfile,
     if (solver_options is not None) and (solver_options != {}):
         command += solver_options
 
-    subprocess.run(command.split(' '), stdout=subprocess.PIPE)
+    with stage('run_glpk'):
+        subprocess.run(command.split(' '), stdout=subprocess.PIPE)
 
     f = open(solution_fn)
     def read_until_break(f):
@@ -635,18 +1235,16 @@ def run_and_read_glpk(n, problem_fn, solution_fn, solver_logfile,
     if termination_condition != 'optimal':
         return status, termination_condition, None, None, None
 
-    duals = io.StringIO(''.join(read_until_break(f))[:-2])
-    duals = pd.read_fwf(duals)[1:].set_index('Row name')
-    if 'Marginal' in duals:
-        constraints_dual = pd.to_numeric(duals['Marginal'], 'coerce')\
-                              .fillna(0).pipe(set_int_index)
-    else:
-        logger.warning("Shadow prices of MILP couldn't be parsed")
-        constraints_dual = pd.Series(index=duals.index)
+    # series indexed by the references
+    with stage('read_glpk_solution'):
+        constraints_dual = np.full(n._cCounter, np.nan)
+        if not read_glpk_section(f, constraints_dual, 'Marginal'):
+            logger.warning("Shadow prices of MILP couldn't be parsed")
+        constraints_dual = pd.Series(constraints_dual)
 
-    sol = io.StringIO(''.join(read_until_break(f))[:-2])
-    variables_sol = (pd.read_fwf(sol)[1:].set_index('Column name')
-                     ['Activity'].astype(float).pipe(set_int_index))
+        variables_sol = np.full(n._xCounter, np.nan)
+        read_glpk_section(f, variables_sol, 'Activity')
+        variables_sol = pd.Series(variables_sol)
     f.close()
 
     return (status, termination_condition, variables_sol,
@@ -677,7 +1275,8 @@ def run_and_read_gurobi(n, problem_fn, solution_fn, solver_logfile,
 
     if warmstart:
         m.read(warmstart)
-    m.optimize()
+    with stage('run_gurobi'):
+        m.optimize()
     logging.disable(1)
 
     if store_basis:
@@ -708,14 +1307,15 @@ def run_and_read_gurobi(n, problem_fn, solution_fn, solver_logfile,
     if termination_condition not in ["optimal","suboptimal"]:
         return status, termination_condition, None, None, None
 
-    variables_sol = pd.Series({v.VarName: v.x for v
-                               in m.getVars()}).pipe(set_int_index)
-    try:
-        constraints_dual = pd.Series({c.ConstrName: c.Pi for c in
-                                      m.getConstrs()}).pipe(set_int_index)
-    except AttributeError:
-        logger.warning("Shadow prices of MILP couldn't be parsed")
-        constraints_dual = pd.Series(index=[c.ConstrName for c in m.getConstrs()])
+    with stage('read_gurobi_solution'):
+        variables_sol = pd.Series({v.VarName: v.x for v
+                                   in m.getVars()}).pipe(set_int_index)
+        try:
+            constraints_dual = pd.Series({c.ConstrName: c.Pi for c in
+                                          m.getConstrs()}).pipe(set_int_index)
+        except AttributeError:
+            logger.warning("Shadow prices of MILP couldn't be parsed")
+            constraints_dual = pd.Series(index=[c.ConstrName for c in m.getConstrs()])
     objective = m.ObjVal
     del m
     return (status, termination_condition, variables_sol,
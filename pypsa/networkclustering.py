@@ -34,6 +34,7 @@ logger = logging.getLogger(__name__)
 
 from .components import Network
 from .geo import haversine_pts
+from .profiling import profiled
 
 from . import io
 
@@ -59,6 +60,7 @@ def _make_consense(component, attr):
         return v
     return consense
 
+@profiled
 def aggregategenerators(network, busmap, with_time=True, carriers=None, custom_strategies=dict()):
     if carriers is None:
         carriers = network.generators.carrier.unique()
@@ -103,6 +105,8 @@ def aggregategenerators(network, busmap, with_time=True, carriers=None, custom_s
 
     return new_df, new_pnl
 
+@profiled(info=lambda network, busmap, component, *args, **kwargs:
+          dict(component=component))
 def aggregateoneport(network, busmap, component, with_time=True, custom_strategies=dict()):
     attrs = network.components[component]["attrs"]
     old_df = getattr(network, network.components[component]["list_name"]).assign(bus=lambda df: df.bus.map(busmap))
@@ -135,6 +139,7 @@ def aggregateoneport(network, busmap, component, with_time=True, custom_strategi
 
     return new_df, new_pnl
 
+@profiled
 def aggregatebuses(network, busmap, custom_strategies=dict()):
     attrs = network.components["Bus"]["attrs"]
     columns = set(attrs.index[attrs.static & attrs.status.str.startswith('Input')]) & set(network.buses.columns)
@@ -152,6 +157,7 @@ def aggregatebuses(network, busmap, custom_strategies=dict()):
                               for f in network.buses.columns
                               if f in columns or f in custom_strategies])
 
+@profiled
 def aggregatelines(network, buses, interlines, line_length_factor=1.0):
 
     #make sure all lines have same bus ordering
@@ -210,6 +216,7 @@ def aggregatelines(network, buses, interlines, line_length_factor=1.0):
 
     return lines, linemap_p, linemap_n, linemap
 
+@profiled
 def get_buses_linemap_and_lines(network, busmap, line_length_factor=1.0, bus_strategies=dict()):
     # compute new buses
     buses = aggregatebuses(network, busmap, bus_strategies)
@@ -231,6 +238,7 @@ def get_buses_linemap_and_lines(network, busmap, line_length_factor=1.0, bus_str
 Clustering = namedtuple('Clustering', ['network', 'busmap', 'linemap',
                                        'linemap_positive', 'linemap_negative'])
 
+@profiled
 def get_clustering_from_busmap(network, busmap, with_time=True, line_length_factor=1.0,
                                aggregate_generators_weighted=False, aggregate_one_ports={},
                                aggregate_generators_carriers=None,
@@ -319,6 +327,7 @@ def get_clustering_from_busmap(network, busmap, with_time=True, line_length_fact
 ################
 # Length
 
+@profiled
 def busmap_by_linemask(network, mask):
     mask = network.lines.loc[:,['bus0', 'bus1']].assign(mask=mask).set_index(['bus0','bus1'])['mask']
     G = nx.OrderedGraph()
@@ -343,6 +352,7 @@ try:
     # available using pip as scikit-learn
     from sklearn.cluster import spectral_clustering as sk_spectral_clustering
 
+    @profiled
     def busmap_by_spectral_clustering(network, n_clusters, **kwds):
         lines = network.lines.loc[:,['bus0', 'bus1']].assign(weight=network.lines.num_parallel).set_index(['bus0','bus1'])
         lines.weight+=0.1
@@ -366,6 +376,7 @@ try:
     # available using pip as python-louvain
     import community
 
+    @profiled
     def busmap_by_louvain(network):
         lines = network.lines.loc[:,['bus0', 'bus1']].assign(weight=network.lines.num_parallel).set_index(['bus0','bus1'])
         lines.weight+=0.1
@@ -393,6 +404,7 @@ try:
     # available using pip as scikit-learn
     from sklearn.cluster import KMeans
 
+    @profiled
     def busmap_by_kmeans(network, bus_weightings, n_clusters, buses_i=None, ** kwargs):
         """
         Create a bus map from the clustering of buses in space with a
@@ -484,6 +496,7 @@ except ImportError:
 # Rectangular grid clustering
 
 
+@profiled
 def busmap_by_rectangular_grid(buses, divisions=10):
     busmap = pd.Series(0, index=buses.index)
     if isinstance(divisions, tuple):
@@ -506,6 +519,7 @@ def rectangular_grid_clustering(network, divisions):
 ################
 # Reduce stubs/dead-ends, i.e. nodes with valency 1, iteratively to remove tree-like structures
 
+@profiled
 def busmap_by_stubs(network, matching_attrs=None):
     """Create a busmap by reducing stubs and stubby trees
     (i.e. sequentially reducing dead-ends).
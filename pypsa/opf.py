@@ -22,7 +22,7 @@
 
 # make the code as Python 3 compatible as possible
 from __future__ import division, absolute_import
-from six import iteritems, itervalues, string_types
+from six import string_types
 
 
 __author__ = "Tom Brown (FIAS), Jonas Hoersch (FIAS), David Schlachtberger (FIAS)"
@@ -30,7 +30,7 @@ __copyright__ = "Copyright 2015-2017 Tom Brown (FIAS), Jonas Hoersch (FIAS), Dav
 
 import numpy as np
 import pandas as pd
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import csr_matrix
 from pyomo.environ import (ConcreteModel, Var, NonNegativeReals, Constraint,
                            Reals, Suffix, Binary, SolverFactory)
 
@@ -52,16 +52,36 @@ except ValueError:
 
 from .pf import (calculate_dependent_values, find_slack_bus,
                  find_bus_controls, calculate_B_H, calculate_PTDF, find_tree,
-                 find_cycles, _as_snapshots)
-from .opt import (l_constraint, l_objective, LExpression, LConstraint,
+                 find_cycles, solve_B, _as_snapshots)
+from .opt import (l_constraint, l_constraint_array, l_variables, l_objective,
+                  l_values, l_duals, LExpression, LConstraint,
                   patch_optsolver_record_memusage_before_solving,
                   empty_network, free_pyomo_initializers)
+from .profiling import profiled, stage
 from .descriptors import (get_switchable_as_dense, get_switchable_as_iter,
                           allocate_series_dataframes, zsum)
 
 pd.Series.zsum = zsum
 
 
+def _model_size(network, *args, **kwargs):
+    # number of variables and constraints of the pyomo model for profiling
+    model = network.model
+    return dict(variables=sum(len(v) for v in model.component_objects(Var)),
+                constraints=sum(len(c) for c in model.component_objects(Constraint)))
+
+def _stack_terms(*terms):
+    """Stack terms (coefficients, variables) of broadcastable shapes to the
+    arrays `coeffs` and `variables` of l_constraint_array."""
+    shape = np.broadcast(*[np.empty(np.shape(x)) for term in terms
+                           for x in term]).shape
+    coeffs = np.stack([np.broadcast_to(np.asarray(c, dtype=float), shape)
+                       for c, v in terms], -1)
+    variables = np.stack([np.broadcast_to(np.asarray(v, dtype=object), shape)
+                          for c, v in terms], -1)
+    return coeffs, variables
+
+
 
 def network_opf(network,snapshots=None):
     """Optimal power flow for snapshots."""
@@ -70,6 +90,7 @@ def network_opf(network,snapshots=None):
 
 
 
+@profiled(counters=_model_size)
 def define_generator_variables_constraints(network,snapshots):
 
     extendable_gens_i = network.generators.index[network.generators.p_nom_extendable]
@@ -122,21 +143,18 @@ def define_generator_variables_constraints(network,snapshots):
 
     ## Define generator dispatch constraints for extendable generators ##
 
-    gen_p_lower = {(gen,sn) :
-                   [[(1,network.model.generator_p[gen,sn]),
-                     (-p_min_pu.at[sn, gen],
-                      network.model.generator_p_nom[gen])],">=",0.]
-                   for gen in extendable_gens_i for sn in snapshots}
-    l_constraint(network.model, "generator_p_lower", gen_p_lower,
-                 list(extendable_gens_i), snapshots)
+    gen_p = l_variables(network.model.generator_p, extendable_gens_i, snapshots)
+    gen_p_nom = l_variables(network.model.generator_p_nom, extendable_gens_i)[:,None]
 
-    gen_p_upper = {(gen,sn) :
-                   [[(1,network.model.generator_p[gen,sn]),
-                     (-p_max_pu.at[sn, gen],
-                      network.model.generator_p_nom[gen])],"<=",0.]
-                   for gen in extendable_gens_i for sn in snapshots}
-    l_constraint(network.model, "generator_p_upper", gen_p_upper,
-                 list(extendable_gens_i), snapshots)
+    l_constraint_array(network.model, "generator_p_lower",
+                       *_stack_terms((1, gen_p),
+                                     (-p_min_pu.loc[snapshots, extendable_gens_i].values.T, gen_p_nom)),
+                       ">=", 0., list(extendable_gens_i), snapshots)
+
+    l_constraint_array(network.model, "generator_p_upper",
+                       *_stack_terms((1, gen_p),
+                                     (-p_max_pu.loc[snapshots, extendable_gens_i].values.T, gen_p_nom)),
+                       "<=", 0., list(extendable_gens_i), snapshots)
 
 
 
@@ -148,17 +166,21 @@ def define_generator_variables_constraints(network,snapshots):
     var_lower = p_min_pu.loc[:,fixed_committable_gens_i].multiply(network.generators.loc[fixed_committable_gens_i, 'p_nom'])
     var_upper = p_max_pu.loc[:,fixed_committable_gens_i].multiply(network.generators.loc[fixed_committable_gens_i, 'p_nom'])
 
+    gen_p = l_variables(network.model.generator_p, fixed_committable_gens_i, snapshots)
+    gen_status = l_variables(network.model.generator_status, fixed_committable_gens_i, snapshots)
 
-    committable_gen_p_lower = {(gen,sn) : LConstraint(LExpression([(var_lower[gen][sn],network.model.generator_status[gen,sn]),(-1.,network.model.generator_p[gen,sn])]),"<=") for gen in fixed_committable_gens_i for sn in snapshots}
-
-    l_constraint(network.model, "committable_gen_p_lower", committable_gen_p_lower,
-                 list(fixed_committable_gens_i), snapshots)
+    l_constraint_array(network.model, "committable_gen_p_lower",
+                       *_stack_terms((var_lower.values.T, gen_status), (-1, gen_p)),
+                       "<=", 0., list(fixed_committable_gens_i), snapshots)
 
+    l_constraint_array(network.model, "committable_gen_p_upper",
+                       *_stack_terms((var_upper.values.T, gen_status), (-1, gen_p)),
+                       ">=", 0., list(fixed_committable_gens_i), snapshots)
 
-    committable_gen_p_upper = {(gen,sn) : LConstraint(LExpression([(var_upper[gen][sn],network.model.generator_status[gen,sn]),(-1.,network.model.generator_p[gen,sn])]),">=") for gen in fixed_committable_gens_i for sn in snapshots}
-
-    l_constraint(network.model, "committable_gen_p_upper", committable_gen_p_upper,
-                 list(fixed_committable_gens_i), snapshots)
+    #status of the previous snapshot, None for the first snapshot
+    gen_status_prev = np.empty_like(gen_status)
+    gen_status_prev[:,1:] = gen_status[:,:-1]
+    first = np.arange(len(snapshots)) == 0
 
 
     ## Deal with minimum up time ##
@@ -187,21 +209,26 @@ def define_generator_variables_constraints(network,snapshots):
             initial_status = 1
             must_stay_up = min_up_time - up_time_before
 
+        status = gen_status[fixed_committable_gens_i.get_loc(gen)]
 
-        def force_up(model,i):
-            return model.generator_status[gen,snapshots[i]] == 1
-        network.model.add_component("gen_up_time_force_{}".format(gen_i),Constraint(range(must_stay_up),rule=force_up))
+        force = range(min(must_stay_up, len(snapshots)))
+        l_constraint_array(network.model, "gen_up_time_force_{}".format(gen_i),
+                           1, status[list(force),None], "==", 1., force)
 
+        #sum of the status over the next period snapshots
+        #>= period*status[i] - period*status[i-1]
         blocks = range(must_stay_up,len(snapshots)-1)
-        def gen_rule(model,i):
-            period = min(min_up_time,len(snapshots)-i)
-            lhs = sum(network.model.generator_status[gen,snapshots[j]] for j in range(i,i+period))
-            if i == 0:
-                rhs = period*network.model.generator_status[gen,snapshots[i]] - period*initial_status
-            else:
-                rhs = period*network.model.generator_status[gen,snapshots[i]] - period*network.model.generator_status[gen,snapshots[i-1]]
-            return lhs >= rhs
-        network.model.add_component("gen_up_time_{}".format(gen_i),Constraint(blocks,rule=gen_rule))
+        i = np.array(blocks, dtype=int)
+        period = np.minimum(min_up_time, len(snapshots) - i)
+        window = i[:,None] + np.arange(min_up_time)
+        in_window = window < (i + period)[:,None]
+        coeffs, variables = _stack_terms((-period, status[i]),
+                                         (np.where(i > 0, period, np.nan),
+                                          status[np.maximum(i - 1, 0)]))
+        l_constraint_array(network.model, "gen_up_time_{}".format(gen_i),
+                           np.hstack([np.where(in_window, 1., np.nan), coeffs]),
+                           np.hstack([status[np.minimum(window, len(snapshots) - 1)], variables]),
+                           ">=", np.where(i == 0, -period*initial_status, 0.), blocks)
 
 
     ## Deal with minimum down time ##
@@ -230,21 +257,26 @@ def define_generator_variables_constraints(network,snapshots):
             initial_status = 0
             must_stay_down = min_down_time - down_time_before
 
+        status = gen_status[fixed_committable_gens_i.get_loc(gen)]
 
-        def force_down(model,i):
-            return model.generator_status[gen,snapshots[i]] == 0
-        network.model.add_component("gen_down_time_force_{}".format(gen_i),Constraint(range(must_stay_down),rule=force_down))
+        force = range(min(must_stay_down, len(snapshots)))
+        l_constraint_array(network.model, "gen_down_time_force_{}".format(gen_i),
+                           1, status[list(force),None], "==", 0., force)
 
+        #period - sum of the status over the next period snapshots
+        #>= -period*status[i] + period*status[i-1]
         blocks = range(must_stay_down,len(snapshots)-1)
-        def gen_rule(model,i):
-            period = min(min_down_time,len(snapshots)-i)
-            lhs = period - sum(network.model.generator_status[gen,snapshots[j]] for j in range(i,i+period))
-            if i == 0:
-                rhs = -period*network.model.generator_status[gen,snapshots[i]] + period*initial_status
-            else:
-                rhs = -period*network.model.generator_status[gen,snapshots[i]] + period*network.model.generator_status[gen,snapshots[i-1]]
-            return lhs >= rhs
-        network.model.add_component("gen_down_time_{}".format(gen_i),Constraint(blocks,rule=gen_rule))
+        i = np.array(blocks, dtype=int)
+        period = np.minimum(min_down_time, len(snapshots) - i)
+        window = i[:,None] + np.arange(min_down_time)
+        in_window = window < (i + period)[:,None]
+        coeffs, variables = _stack_terms((period, status[i]),
+                                         (np.where(i > 0, -period, np.nan),
+                                          status[np.maximum(i - 1, 0)]))
+        l_constraint_array(network.model, "gen_down_time_{}".format(gen_i),
+                           np.hstack([np.where(in_window, -1., np.nan), coeffs]),
+                           np.hstack([status[np.minimum(window, len(snapshots) - 1)], variables]),
+                           ">=", np.where(i == 0, -period + period*initial_status, -period), blocks)
 
 
     ## Deal with start up costs ##
@@ -254,31 +286,22 @@ def define_generator_variables_constraints(network,snapshots):
     network.model.generator_start_up_cost = Var(list(suc_gens),snapshots,
                                                 domain=NonNegativeReals)
 
-    sucs = {}
-
-    for gen in suc_gens:
-        suc = network.generators.at[gen,"start_up_cost"]
-
-        if start_i == 0:
-            if network.generators.at[gen,"up_time_before"] > 0:
-                initial_status = 1
-            else:
-                initial_status = 0
-        else:
-            initial_status = network.generators_t.status.at[network.snapshots[start_i-1],gen]
-
-        for i,sn in enumerate(snapshots):
-
-            if i == 0:
-                rhs = LExpression([(suc, network.model.generator_status[gen,sn])],-suc*initial_status)
-            else:
-                rhs = LExpression([(suc, network.model.generator_status[gen,sn]),(-suc,network.model.generator_status[gen,snapshots[i-1]])])
-
-            lhs = LExpression([(1,network.model.generator_start_up_cost[gen,sn])])
+    if start_i == 0:
+        initial_status = (network.generators.loc[suc_gens,"up_time_before"] > 0).astype(float).values
+    else:
+        initial_status = network.generators_t.status.loc[network.snapshots[start_i-1],suc_gens].values
 
-            sucs[gen,sn] = LConstraint(lhs,">=",rhs)
+    #start_up_cost >= suc*status[i] - suc*status[i-1]
+    suc = network.generators.loc[suc_gens,"start_up_cost"].values[:,None]
+    suc_i = fixed_committable_gens_i.get_indexer(suc_gens)
 
-    l_constraint(network.model, "generator_start_up", sucs, list(suc_gens), snapshots)
+    l_constraint_array(network.model, "generator_start_up",
+                       *_stack_terms((1, l_variables(network.model.generator_start_up_cost,
+                                                     suc_gens, snapshots)),
+                                     (-suc, gen_status[suc_i]),
+                                     (np.where(first, np.nan, suc), gen_status_prev[suc_i])),
+                       ">=", np.where(first, -suc*initial_status[:,None], 0.),
+                       list(suc_gens), snapshots)
 
 
 
@@ -289,33 +312,22 @@ def define_generator_variables_constraints(network,snapshots):
     network.model.generator_shut_down_cost = Var(list(sdc_gens),snapshots,
                                                 domain=NonNegativeReals)
 
-    sdcs = {}
-
-    for gen in sdc_gens:
-        sdc = network.generators.loc[gen,"shut_down_cost"]
-
-        if start_i == 0:
-            if network.generators.at[gen,"down_time_before"] > 0:
-                initial_status = 0
-            else:
-                initial_status = 1
-        else:
-            initial_status = network.generators_t.status.at[network.snapshots[start_i-1],gen]
-
-        for i,sn in enumerate(snapshots):
-
-            if i == 0:
-                rhs = LExpression([(-sdc, network.model.generator_status[gen,sn])],sdc*initial_status)
-            else:
-                rhs = LExpression([(-sdc, network.model.generator_status[gen,sn]),(sdc,network.model.generator_status[gen,snapshots[i-1]])])
-
-            lhs = LExpression([(1,network.model.generator_shut_down_cost[gen,sn])])
-
-            sdcs[gen,sn] = LConstraint(lhs,">=",rhs)
-
-    l_constraint(network.model, "generator_shut_down", sdcs, list(sdc_gens), snapshots)
+    if start_i == 0:
+        initial_status = (network.generators.loc[sdc_gens,"down_time_before"] <= 0).astype(float).values
+    else:
+        initial_status = network.generators_t.status.loc[network.snapshots[start_i-1],sdc_gens].values
 
+    #shut_down_cost >= -sdc*status[i] + sdc*status[i-1]
+    sdc = network.generators.loc[sdc_gens,"shut_down_cost"].values[:,None]
+    sdc_i = fixed_committable_gens_i.get_indexer(sdc_gens)
 
+    l_constraint_array(network.model, "generator_shut_down",
+                       *_stack_terms((1, l_variables(network.model.generator_shut_down_cost,
+                                                     sdc_gens, snapshots)),
+                                     (sdc, gen_status[sdc_i]),
+                                     (np.where(first, np.nan, -sdc), gen_status_prev[sdc_i])),
+                       ">=", np.where(first, sdc*initial_status[:,None], 0.),
+                       list(sdc_gens), snapshots)
 
     ## Deal with ramp limits without unit commitment ##
 
@@ -428,6 +440,7 @@ def define_generator_variables_constraints(network,snapshots):
 
 
 
+@profiled(counters=_model_size)
 def define_storage_variables_constraints(network,snapshots):
 
     sus = network.storage_units
@@ -499,19 +512,17 @@ def define_storage_variables_constraints(network,snapshots):
 
     ## Define generator dispatch constraints for extendable generators ##
 
-    def su_p_upper(model,su_name,snapshot):
-        return (model.storage_p_dispatch[su_name,snapshot] <=
-                model.storage_p_nom[su_name]*p_max_pu.at[snapshot, su_name])
+    p_nom = l_variables(model.storage_p_nom, ext_sus_i)[:,None]
 
-    network.model.storage_p_upper = Constraint(list(ext_sus_i),snapshots,rule=su_p_upper)
-    free_pyomo_initializers(network.model.storage_p_upper)
+    l_constraint_array(model, "storage_p_upper",
+                       *_stack_terms((1, l_variables(model.storage_p_dispatch, ext_sus_i, snapshots)),
+                                     (-p_max_pu.loc[snapshots, ext_sus_i].values.T, p_nom)),
+                       "<=", 0., list(ext_sus_i), snapshots)
 
-    def su_p_lower(model,su_name,snapshot):
-        return (model.storage_p_store[su_name,snapshot] <=
-                -model.storage_p_nom[su_name]*p_min_pu.at[snapshot, su_name])
-
-    network.model.storage_p_lower = Constraint(list(ext_sus_i),snapshots,rule=su_p_lower)
-    free_pyomo_initializers(network.model.storage_p_lower)
+    l_constraint_array(model, "storage_p_lower",
+                       *_stack_terms((1, l_variables(model.storage_p_store, ext_sus_i, snapshots)),
+                                     (p_min_pu.loc[snapshots, ext_sus_i].values.T, p_nom)),
+                       "<=", 0., list(ext_sus_i), snapshots)
 
 
     ## Now define state of charge constraints ##
@@ -519,71 +530,56 @@ def define_storage_variables_constraints(network,snapshots):
     network.model.state_of_charge = Var(list(network.storage_units.index), snapshots,
                                         domain=NonNegativeReals, bounds=(0,None))
 
-    upper = {(su,sn) : [[(1,model.state_of_charge[su,sn]),
-                         (-sus.at[su,"max_hours"],model.storage_p_nom[su])],"<=",0.]
-             for su in ext_sus_i for sn in snapshots}
-    upper.update({(su,sn) : [[(1,model.state_of_charge[su,sn])],"<=",
-                             sus.at[su,"max_hours"]*sus.at[su,"p_nom"]]
-                  for su in fix_sus_i for sn in snapshots})
+    state_of_charge = l_variables(model.state_of_charge, sus.index, snapshots)
+    extendable = sus.p_nom_extendable.values[:,None]
 
-    l_constraint(model, "state_of_charge_upper", upper,
-                 list(network.storage_units.index), snapshots)
+    l_constraint_array(model, "state_of_charge_upper",
+                       *_stack_terms((1, state_of_charge),
+                                     (-sus.max_hours.values[:,None],
+                                      l_variables(model.storage_p_nom, sus.index)[:,None])),
+                       "<=", np.where(extendable, 0., (sus.max_hours*sus.p_nom).values[:,None]),
+                       list(network.storage_units.index), snapshots)
 
 
     #this builds the constraint previous_soc + p_store - p_dispatch + inflow - spill == soc
     #it is complicated by the fact that sometimes previous_soc and soc are floats, not variables
-    soc = {}
-
-    #store the combinations with a fixed soc
-    fixed_soc = {}
+    elapsed_hours = network.snapshot_weightings.loc[snapshots].values
+    standing = (1-sus.standing_loss.values[:,None])**elapsed_hours
+    initial = ((np.arange(len(snapshots)) == 0)
+               & ~sus.cyclic_state_of_charge.values.astype(bool)[:,None])
 
     state_of_charge_set = get_switchable_as_dense(network, 'StorageUnit', 'state_of_charge_set', snapshots)
+    state_of_charge_set = state_of_charge_set.loc[snapshots, sus.index].values.T
+    fixed = ~np.isnan(state_of_charge_set)
 
-    for su in sus.index:
-        for i,sn in enumerate(snapshots):
-
-            soc[su,sn] =  [[],"==",0.]
-
-            elapsed_hours = network.snapshot_weightings[sn]
-
-            if i == 0 and not sus.at[su,"cyclic_state_of_charge"]:
-                previous_state_of_charge = sus.at[su,"state_of_charge_initial"]
-                soc[su,sn][2] -= ((1-sus.at[su,"standing_loss"])**elapsed_hours
-                                  * previous_state_of_charge)
-            else:
-                previous_state_of_charge = model.state_of_charge[su,snapshots[i-1]]
-                soc[su,sn][0].append(((1-sus.at[su,"standing_loss"])**elapsed_hours,
-                                      previous_state_of_charge))
-
-
-            state_of_charge = state_of_charge_set.at[sn,su]
-            if pd.isnull(state_of_charge):
-                state_of_charge = model.state_of_charge[su,sn]
-                soc[su,sn][0].append((-1,state_of_charge))
-            else:
-                soc[su,sn][2] += state_of_charge
-                #make sure the variable is also set to the fixed state of charge
-                fixed_soc[su,sn] = [[(1,model.state_of_charge[su,sn])],"==",state_of_charge]
-
-            soc[su,sn][0].append((sus.at[su,"efficiency_store"]
-                                  * elapsed_hours,model.storage_p_store[su,sn]))
-            soc[su,sn][0].append((-(1/sus.at[su,"efficiency_dispatch"]) * elapsed_hours,
-                                  model.storage_p_dispatch[su,sn]))
-            soc[su,sn][2] -= inflow.at[sn,su] * elapsed_hours
+    #the state of charge before the first snapshot is the one of the last
+    #snapshot, if not initial
+    coeffs, variables = _stack_terms(
+        (np.where(initial, np.nan, standing), np.roll(state_of_charge, 1, axis=1)),
+        (np.where(fixed, np.nan, -1), state_of_charge),
+        (sus.efficiency_store.values[:,None] * elapsed_hours,
+         l_variables(model.storage_p_store, sus.index, snapshots)),
+        (-(1/sus.efficiency_dispatch.values[:,None]) * elapsed_hours,
+         l_variables(model.storage_p_dispatch, sus.index, snapshots)),
+        (-1.*elapsed_hours, l_variables(model.storage_p_spill, sus.index, snapshots)))
 
-    for su,sn in spill_index:
-        elapsed_hours = network.snapshot_weightings.at[sn]
-        storage_p_spill = model.storage_p_spill[su,sn]
-        soc[su,sn][0].append((-1.*elapsed_hours,storage_p_spill))
+    constant = (np.where(initial, -standing*sus.state_of_charge_initial.values[:,None], 0.)
+                + np.where(fixed, state_of_charge_set, 0.)
+                - inflow.loc[snapshots, sus.index].values.T * elapsed_hours)
 
-    l_constraint(model,"state_of_charge_constraint",
-                 soc,list(network.storage_units.index), snapshots)
+    l_constraint_array(model,"state_of_charge_constraint",
+                       coeffs, variables, "==", constant,
+                       list(network.storage_units.index), snapshots)
 
-    l_constraint(model, "state_of_charge_constraint_fixed",
-                 fixed_soc, list(fixed_soc.keys()))
+    #make sure the variable is also set to the fixed state of charge
+    fixed_soc = [(sus.index[i],snapshots[j]) for i, j in zip(*np.nonzero(fixed))]
+    l_constraint_array(model, "state_of_charge_constraint_fixed",
+                       1, state_of_charge[fixed][:,None], "==",
+                       state_of_charge_set[fixed], fixed_soc)
 
 
 
+@profiled(counters=_model_size)
 def define_store_variables_constraints(network,snapshots):
 
     stores = network.stores
@@ -670,6 +666,7 @@ def define_store_variables_constraints(network,snapshots):
 
 
 
+@profiled(counters=_model_size)
 def define_branch_extension_variables(network,snapshots):
 
     passive_branches = network.passive_branches()
@@ -701,6 +698,7 @@ def define_branch_extension_variables(network,snapshots):
     free_pyomo_initializers(network.model.link_p_nom)
 
 
+@profiled(counters=_model_size)
 def define_link_flows(network,snapshots):
 
     extendable_links_i = network.links.index[network.links.p_nom_extendable]
@@ -742,6 +740,7 @@ def define_link_flows(network,snapshots):
 
 
 
+@profiled(counters=_model_size)
 def define_passive_branch_flows(network,snapshots,formulation="angles",ptdf_tolerance=0.):
 
     if formulation == "angles":
@@ -755,6 +754,7 @@ def define_passive_branch_flows(network,snapshots,formulation="angles",ptdf_tole
 
 
 
+@profiled(counters=_model_size)
 def define_passive_branch_flows_with_angles(network,snapshots):
 
     network.model.voltage_angles = Var(list(network.buses.index), snapshots)
@@ -790,6 +790,7 @@ def define_passive_branch_flows_with_angles(network,snapshots):
                  list(passive_branches.index), snapshots)
 
 
+@profiled(counters=_model_size)
 def define_passive_branch_flows_with_PTDF(network,snapshots,ptdf_tolerance=0.):
 
     passive_branches = network.passive_branches()
@@ -797,6 +798,7 @@ def define_passive_branch_flows_with_PTDF(network,snapshots,ptdf_tolerance=0.):
     network.model.passive_branch_p = Var(list(passive_branches.index), snapshots)
 
     flows = {}
+    p_balance = _nodal_balance_arrays(network)
 
     for sub_network in network.sub_networks.obj:
         find_bus_controls(sub_network)
@@ -808,13 +810,15 @@ def define_passive_branch_flows_with_PTDF(network,snapshots,ptdf_tolerance=0.):
             #kill small PTDF values
             sub_network.PTDF[abs(sub_network.PTDF) < ptdf_tolerance] = 0
 
+        buses_i = network.buses.index.get_indexer(sub_network.buses_o)
+
         for i,branch in enumerate(branches_i):
             bt = branch[0]
             bn = branch[1]
 
-            for sn in snapshots:
-                lhs = sum(sub_network.PTDF[i,j]*network._p_balance[bus,sn]
-                          for j,bus in enumerate(sub_network.buses_o)
+            for k,sn in enumerate(snapshots):
+                lhs = sum(sub_network.PTDF[i,j]*_nodal_balance_expression(p_balance, bus_i, k)
+                          for j,bus_i in enumerate(buses_i)
                           if sub_network.PTDF[i,j] != 0)
                 rhs = LExpression([(1,network.model.passive_branch_p[bt,bn,sn])])
                 flows[bt,bn,sn] = LConstraint(lhs,"==",rhs)
@@ -824,6 +828,23 @@ def define_passive_branch_flows_with_PTDF(network,snapshots,ptdf_tolerance=0.):
                  list(passive_branches.index), snapshots)
 
 
+def _sub_network_cycles(subnetwork, attribute):
+    """Yields the column of each non-empty cycle of the subnetwork with the
+    weighted coefficients and the positions in subnetwork.branches() of its
+    branches.
+    """
+
+    weights = 1e5 * subnetwork.branches()[attribute].values
+
+    matrix = subnetwork.C.tocsc().sorted_indices()
+    for col_j in range(matrix.shape[1]):
+        column = slice(matrix.indptr[col_j], matrix.indptr[col_j+1])
+        nonzero = matrix.data[column] != 0
+        cycle_is = matrix.indices[column][nonzero]
+        if len(cycle_is) == 0: continue
+
+        yield col_j, weights[cycle_is] * matrix.data[column][nonzero], cycle_is
+
 def define_sub_network_cycle_constraints( subnetwork, snapshots, passive_branch_p, attribute):
     """ Constructs cycle_constraints for a particular subnetwork
     """
@@ -831,33 +852,52 @@ def define_sub_network_cycle_constraints( subnetwork, snapshots, passive_branch_
     sub_network_cycle_constraints = {}
     sub_network_cycle_index = []
 
-    matrix = subnetwork.C.tocsc()
     branches = subnetwork.branches()
 
-    for col_j in range( matrix.shape[1] ):
-        cycle_is = matrix.getcol(col_j).nonzero()[0]
+    for col_j, coeffs, cycle_is in _sub_network_cycles(subnetwork, attribute):
+        sub_network_cycle_index.append((subnetwork.name, col_j))
 
-        if len(cycle_is) == 0: continue
+        for snapshot in snapshots:
+            lhs = LExpression([(coeff, passive_branch_p[bt, bn, snapshot])
+                               for coeff, (bt, bn) in zip(coeffs, branches.index[cycle_is])])
+            sub_network_cycle_constraints[subnetwork.name,col_j,snapshot] = LConstraint(lhs,"==",LExpression())
 
-        sub_network_cycle_index.append((subnetwork.name, col_j))
+    return( sub_network_cycle_index, sub_network_cycle_constraints)
 
+@profiled(counters=_model_size)
+def define_cycle_constraints(network, snapshots):
+    """Constructs the cycle_constraints (Kirchhoff's voltage law) for the
+    cycles of all sub-networks at once and returns the cycle index.
+    """
 
-        branch_idx_attributes = []
+    passive_branches = network.passive_branches()
+    passive_branch_p = l_variables(network.model.passive_branch_p,
+                                   list(passive_branches.index), snapshots)
 
-        for cycle_i in cycle_is:
-            branch_idx = branches.index[cycle_i]
-            attribute_value = 1e5 * branches.at[ branch_idx, attribute] * subnetwork.C[ cycle_i, col_j]
-            branch_idx_attributes.append( (branch_idx, attribute_value))
+    cycle_index = []
+    cycles = []
 
-        for snapshot in snapshots:
-            expression_list = [ (attribute_value,
-                                 passive_branch_p[branch_idx[0], branch_idx[1], snapshot]) for (branch_idx, attribute_value) in branch_idx_attributes]
+    for subnetwork in network.sub_networks.obj:
+        attribute = "r_pu_eff" if network.sub_networks.at[subnetwork.name,"carrier"] == "DC" else "x_pu_eff"
+        branch_i = passive_branches.index.get_indexer(subnetwork.branches().index)
 
-            lhs = LExpression(expression_list)
-            sub_network_cycle_constraints[subnetwork.name,col_j,snapshot] = LConstraint(lhs,"==",LExpression())
+        for col_j, coeffs, cycle_is in _sub_network_cycles(subnetwork, attribute):
+            cycle_index.append((subnetwork.name, col_j))
+            cycles.append((coeffs, branch_i[cycle_is]))
 
-    return( sub_network_cycle_index, sub_network_cycle_constraints)
+    width = max([len(c) for c, i in cycles], default=0)
+    coeffs = np.full((len(cycles), len(snapshots), width), np.nan)
+    variables = np.empty((len(cycles), len(snapshots), width), dtype=object)
+    for k, (c, i) in enumerate(cycles):
+        coeffs[k,:,:len(c)] = c
+        variables[k,:,:len(c)] = passive_branch_p[i].T
+
+    l_constraint_array(network.model, "cycle_constraints", coeffs, variables,
+                       "==", 0., cycle_index, snapshots)
 
+    return cycle_index
+
+@profiled(counters=_model_size)
 def define_passive_branch_flows_with_cycles(network,snapshots):
 
     for sub_network in network.sub_networks.obj:
@@ -875,31 +915,17 @@ def define_passive_branch_flows_with_cycles(network,snapshots):
 
     network.model.passive_branch_p = Var(list(passive_branches.index), snapshots)
 
-    cycle_index = []
-    cycle_constraints = {}
-
-    for subnetwork in network.sub_networks.obj:
-        branches = subnetwork.branches()
-        attribute = "r_pu_eff" if network.sub_networks.at[subnetwork.name,"carrier"] == "DC" else "x_pu_eff"
-
-        sub_network_cycle_index, sub_network_cycle_constraints = define_sub_network_cycle_constraints( subnetwork,
-                                                                                                       snapshots,
-                                                                                                       network.model.passive_branch_p, attribute)
-
-        cycle_index.extend( sub_network_cycle_index)
-        cycle_constraints.update( sub_network_cycle_constraints)
-
-    l_constraint(network.model, "cycle_constraints", cycle_constraints,
-                 cycle_index, snapshots)
+    cycle_index = define_cycle_constraints(network, snapshots)
 
 
     network.model.cycles = Var(cycle_index, snapshots, domain=Reals, bounds=(None,None))
 
     flows = {}
+    p_balance = _nodal_balance_arrays(network)
 
     for subnetwork in network.sub_networks.obj:
         branches = subnetwork.branches()
-        buses = subnetwork.buses()
+        buses_i = network.buses.index.get_indexer(subnetwork.buses().index)
         for i,branch in enumerate(branches.index):
             bt = branch[0]
             bn = branch[1]
@@ -909,10 +935,10 @@ def define_passive_branch_flows_with_cycles(network,snapshots):
 
             if len(cycle_is) + len(tree_is) == 0: logger.error("The cycle formulation does not support infinite impedances, yet.")
 
-            for snapshot in snapshots:
+            for k,snapshot in enumerate(snapshots):
                 expr = LExpression([(subnetwork.C[i,j], network.model.cycles[subnetwork.name,j,snapshot])
                                     for j in cycle_is])
-                lhs = expr + sum(subnetwork.T[i,j]*network._p_balance[buses.index[j],snapshot]
+                lhs = expr + sum(subnetwork.T[i,j]*_nodal_balance_expression(p_balance, buses_i[j], k)
                                  for j in tree_is)
 
                 rhs = LExpression([(1,network.model.passive_branch_p[bt,bn,snapshot])])
@@ -924,6 +950,7 @@ def define_passive_branch_flows_with_cycles(network,snapshots):
 
 
 
+@profiled(counters=_model_size)
 def define_passive_branch_flows_with_kirchhoff(network,snapshots,skip_vars=False):
     """ define passive branch flows with the kirchoff method """
 
@@ -941,153 +968,162 @@ def define_passive_branch_flows_with_kirchhoff(network,snapshots,skip_vars=False
     if not skip_vars:
         network.model.passive_branch_p = Var(list(passive_branches.index), snapshots)
 
-    cycle_index = []
-    cycle_constraints = {}
-
-    for subnetwork in network.sub_networks.obj:
-
-        branches = subnetwork.branches()
-        attribute = "r_pu_eff" if network.sub_networks.at[subnetwork.name,"carrier"] == "DC" else "x_pu_eff"
-
-        sub_network_cycle_index, sub_network_cycle_constraints = define_sub_network_cycle_constraints( subnetwork,
-                                                                                                       snapshots,
-                                                                                                       network.model.passive_branch_p, attribute)
-
-        cycle_index.extend( sub_network_cycle_index)
-        cycle_constraints.update( sub_network_cycle_constraints)
-
-    l_constraint(network.model, "cycle_constraints", cycle_constraints,
-                 cycle_index, snapshots)
+    define_cycle_constraints(network, snapshots)
 
+@profiled(counters=_model_size)
 def define_passive_branch_constraints(network,snapshots):
 
     passive_branches = network.passive_branches()
-    extendable_branches = passive_branches[passive_branches.s_nom_extendable]
-    fixed_branches = passive_branches[~ passive_branches.s_nom_extendable]
-
 
     s_max_pu = pd.concat({c : get_switchable_as_dense(network, c, 's_max_pu', snapshots)
                           for c in network.passive_branch_components}, axis=1, sort=False)
 
-    flow_upper = {(b[0],b[1],sn) : [[(1,network.model.passive_branch_p[b[0],b[1],sn])],
-                                    "<=", s_max_pu.at[sn,b]*fixed_branches.at[b,"s_nom"]]
-                  for b in fixed_branches.index
-                  for sn in snapshots}
-
-    flow_upper.update({(b[0],b[1],sn) : [[(1,network.model.passive_branch_p[b[0],b[1],sn]),
-                                          (-s_max_pu.at[sn,b],network.model.passive_branch_s_nom[b[0],b[1]])],"<=",0]
-                       for b in extendable_branches.index
-                       for sn in snapshots})
-
-    l_constraint(network.model, "flow_upper", flow_upper,
-                 list(passive_branches.index), snapshots)
-
-    flow_lower = {(b[0],b[1],sn) : [[(1,network.model.passive_branch_p[b[0],b[1],sn])],
-                                    ">=", -s_max_pu.at[sn,b]*fixed_branches.at[b,"s_nom"]]
-                  for b in fixed_branches.index
-                  for sn in snapshots}
-
-    flow_lower.update({(b[0],b[1],sn): [[(1,network.model.passive_branch_p[b[0],b[1],sn]),
-                                         (s_max_pu.at[sn,b],network.model.passive_branch_s_nom[b[0],b[1]])],">=",0]
-                       for b in extendable_branches.index
-                       for sn in snapshots})
-
-    l_constraint(network.model, "flow_lower", flow_lower,
-                 list(passive_branches.index), snapshots)
-
+    passive_branch_p = l_variables(network.model.passive_branch_p,
+                                   list(passive_branches.index), snapshots)
+    s_nom = l_variables(network.model.passive_branch_s_nom,
+                        list(passive_branches.index))[:,None]
+    s_max_pu = s_max_pu.loc[snapshots, passive_branches.index].values.T
+    extendable = passive_branches.s_nom_extendable.values[:,None]
+    limit = s_max_pu*passive_branches.s_nom.values[:,None]
+
+    l_constraint_array(network.model, "flow_upper",
+                       *_stack_terms((1, passive_branch_p), (-s_max_pu, s_nom)),
+                       "<=", np.where(extendable, 0., limit),
+                       list(passive_branches.index), snapshots)
+
+    l_constraint_array(network.model, "flow_lower",
+                       *_stack_terms((1, passive_branch_p), (s_max_pu, s_nom)),
+                       ">=", np.where(extendable, 0., -limit),
+                       list(passive_branches.index), snapshots)
+
+def _add_nodal_terms(network, *terms):
+    """Add terms (bus, coeffs, variables) to the nodal balances in
+    network._p_balance, where `bus` gives the bus of each element and
+    `coeffs` and `variables` are broadcastable to (elements, snapshots).
+    The terms of several groups for the same elements are added element by
+    element, e.g. the terms at bus0 and bus1 of each link."""
+
+    balance, constant = network._p_balance
+    buses = network.buses.index
+    bus = np.stack([buses.get_indexer(b) for b, c, v in terms], 1).ravel()
+    coeffs = np.stack([np.broadcast_to(np.asarray(c, dtype=float), np.shape(v))
+                       for b, c, v in terms], 1)
+    variables = np.stack([np.asarray(v, dtype=object) for b, c, v in terms], 1)
+    balance.append((bus, coeffs.reshape(-1, constant.shape[1]),
+                    variables.reshape(-1, constant.shape[1])))
+
+def _nodal_balance_arrays(network):
+    """Return the nodal balances in network._p_balance as arrays (coeffs,
+    variables, constant) in the layout of l_constraint_array, i.e. the terms
+    of bus i at snapshot k are coeffs[i,k,:] and variables[i,k,:], padded
+    with NaN and None, and the constant is constant[i,k]."""
+
+    balance, constant = network._p_balance
+    bus = np.concatenate([b for b, c, v in balance]).astype(int)
+    slot = pd.Series(bus).groupby(bus).cumcount().values
+    shape = constant.shape + (max(slot.max() + 1 if len(slot) else 0, 1),)
+
+    coeffs = np.full(shape, np.nan)
+    variables = np.empty(shape, dtype=object)
+    coeffs[bus, :, slot] = np.concatenate([c for b, c, v in balance])
+    variables[bus, :, slot] = np.concatenate([v for b, c, v in balance])
+    return coeffs, variables, constant
+
+def _nodal_balance_expression(p_balance, i, k):
+    """LExpression of the nodal balance of the i-th bus at the k-th snapshot
+    from the arrays returned by _nodal_balance_arrays."""
+
+    coeffs, variables, constant = p_balance
+    return LExpression([(c, v) for c, v in zip(coeffs[i,k].tolist(),
+                                                variables[i,k].tolist())
+                        if v is not None], constant[i,k])
+
+@profiled(counters=_model_size)
 def define_nodal_balances(network,snapshots):
     """Construct the nodal balance for all elements except the passive
     branches.
 
-    Store the nodal balance expression in network._p_balance.
+    Store the nodal balance terms in network._p_balance, use
+    _nodal_balance_arrays to get them as arrays.
     """
 
-    #dictionary for constraints
-    network._p_balance = {(bus,sn) : LExpression()
-                          for bus in network.buses.index
-                          for sn in snapshots}
+    network._p_balance = ([], np.zeros((len(network.buses), len(snapshots))))
 
+    links = network.links
+    link_p = l_variables(network.model.link_p, list(links.index), snapshots)
     efficiency = get_switchable_as_dense(network, 'Link', 'efficiency', snapshots)
-
-    for cb in network.links.index:
-        bus0 = network.links.at[cb,"bus0"]
-        bus1 = network.links.at[cb,"bus1"]
-
-        for sn in snapshots:
-            network._p_balance[bus0,sn].variables.append((-1,network.model.link_p[cb,sn]))
-            network._p_balance[bus1,sn].variables.append((efficiency.at[sn,cb],network.model.link_p[cb,sn]))
+    _add_nodal_terms(network, (links.bus0, -1, link_p),
+                     (links.bus1, efficiency.loc[snapshots, links.index].values.T, link_p))
 
     #Add any other buses to which the links are attached
-    for i in [int(col[3:]) for col in network.links.columns if col[:3] == "bus" and col not in ["bus0","bus1"]]:
+    for i in [int(col[3:]) for col in links.columns if col[:3] == "bus" and col not in ["bus0","bus1"]]:
         efficiency = get_switchable_as_dense(network, 'Link', 'efficiency{}'.format(i), snapshots)
-        for cb in network.links.index[network.links["bus{}".format(i)] != ""]:
-            bus = network.links.at[cb, "bus{}".format(i)]
-            for sn in snapshots:
-                network._p_balance[bus,sn].variables.append((efficiency.at[sn,cb],network.model.link_p[cb,sn]))
-
+        attached = links["bus{}".format(i)] != ""
+        _add_nodal_terms(network, (links.loc[attached, "bus{}".format(i)],
+                                   efficiency.loc[snapshots, links.index[attached]].values.T,
+                                   link_p[attached.values]))
 
-    for gen in network.generators.index:
-        bus = network.generators.at[gen,"bus"]
-        sign = network.generators.at[gen,"sign"]
-        for sn in snapshots:
-            network._p_balance[bus,sn].variables.append((sign,network.model.generator_p[gen,sn]))
+    gens = network.generators
+    _add_nodal_terms(network, (gens.bus, gens.sign.values[:,None],
+                               l_variables(network.model.generator_p, list(gens.index), snapshots)))
 
+    loads = network.loads
     load_p_set = get_switchable_as_dense(network, 'Load', 'p_set', snapshots)
-    for load in network.loads.index:
-        bus = network.loads.at[load,"bus"]
-        sign = network.loads.at[load,"sign"]
-        for sn in snapshots:
-            network._p_balance[bus,sn].constant += sign*load_p_set.at[sn,load]
+    np.add.at(network._p_balance[1], network.buses.index.get_indexer(loads.bus),
+              loads.sign.values[:,None]*load_p_set.loc[snapshots, loads.index].values.T)
 
-    for su in network.storage_units.index:
-        bus = network.storage_units.at[su,"bus"]
-        sign = network.storage_units.at[su,"sign"]
-        for sn in snapshots:
-            network._p_balance[bus,sn].variables.append((sign,network.model.storage_p_dispatch[su,sn]))
-            network._p_balance[bus,sn].variables.append((-sign,network.model.storage_p_store[su,sn]))
+    sus = network.storage_units
+    _add_nodal_terms(network,
+                     (sus.bus, sus.sign.values[:,None],
+                      l_variables(network.model.storage_p_dispatch, list(sus.index), snapshots)),
+                     (sus.bus, -sus.sign.values[:,None],
+                      l_variables(network.model.storage_p_store, list(sus.index), snapshots)))
 
-    for store in network.stores.index:
-        bus = network.stores.at[store,"bus"]
-        sign = network.stores.at[store,"sign"]
-        for sn in snapshots:
-            network._p_balance[bus,sn].variables.append((sign,network.model.store_p[store,sn]))
+    stores = network.stores
+    _add_nodal_terms(network, (stores.bus, stores.sign.values[:,None],
+                               l_variables(network.model.store_p, list(stores.index), snapshots)))
 
 
+@profiled(counters=_model_size)
 def define_nodal_balance_constraints(network,snapshots):
 
     passive_branches = network.passive_branches()
+    passive_branch_p = l_variables(network.model.passive_branch_p,
+                                   list(passive_branches.index), snapshots)
 
+    _add_nodal_terms(network, (passive_branches.bus0, -1, passive_branch_p),
+                     (passive_branches.bus1, 1, passive_branch_p))
 
-    for branch in passive_branches.index:
-        bus0 = passive_branches.at[branch,"bus0"]
-        bus1 = passive_branches.at[branch,"bus1"]
-        bt = branch[0]
-        bn = branch[1]
-        for sn in snapshots:
-            network._p_balance[bus0,sn].variables.append((-1,network.model.passive_branch_p[bt,bn,sn]))
-            network._p_balance[bus1,sn].variables.append((1,network.model.passive_branch_p[bt,bn,sn]))
+    coeffs, variables, constant = _nodal_balance_arrays(network)
 
-    power_balance = {k: LConstraint(v,"==",LExpression()) for k,v in iteritems(network._p_balance)}
-
-    l_constraint(network.model, "power_balance", power_balance,
-                 list(network.buses.index), snapshots)
+    l_constraint_array(network.model, "power_balance", coeffs, variables,
+                       "==", 0. - constant, list(network.buses.index), snapshots)
 
 
+@profiled(counters=_model_size)
 def define_sub_network_balance_constraints(network,snapshots):
 
-    sn_balance = {}
+    coeffs, variables, constant = _nodal_balance_arrays(network)
 
-    for sub_network in network.sub_networks.obj:
-        for sn in snapshots:
-            sn_balance[sub_network.name,sn] = LConstraint(LExpression(),"==",LExpression())
-            for bus in sub_network.buses().index:
-                sn_balance[sub_network.name,sn].lhs.variables.extend(network._p_balance[bus,sn].variables)
-                sn_balance[sub_network.name,sn].lhs.constant += network._p_balance[bus,sn].constant
+    # the terms of all buses of a sub-network
+    buses_i = [network.buses.index.get_indexer(sub_network.buses().index)
+               for sub_network in network.sub_networks.obj]
+    width = max([len(i) for i in buses_i], default=0) * coeffs.shape[2]
+    shape = (len(buses_i), len(snapshots), width)
+    sn_coeffs = np.full(shape, np.nan)
+    sn_variables = np.empty(shape, dtype=object)
+    for k, i in enumerate(buses_i):
+        terms = slice(0, len(i) * coeffs.shape[2])
+        sn_coeffs[k,:,terms] = coeffs[i].transpose(1,0,2).reshape(len(snapshots), -1)
+        sn_variables[k,:,terms] = variables[i].transpose(1,0,2).reshape(len(snapshots), -1)
+    sn_constant = np.array([constant[i].sum(0) for i in buses_i]).reshape(shape[:2])
 
-    l_constraint(network.model,"sub_network_balance_constraint", sn_balance,
-                 list(network.sub_networks.index), snapshots)
+    l_constraint_array(network.model, "sub_network_balance_constraint",
+                       sn_coeffs, sn_variables, "==", 0. - sn_constant,
+                       list(network.sub_networks.index), snapshots)
 
 
+@profiled(counters=_model_size)
 def define_global_constraints(network,snapshots):
 
 
@@ -1141,6 +1177,7 @@ def define_global_constraints(network,snapshots):
 
 
 
+@profiled(counters=_model_size)
 def define_linear_objective(network,snapshots):
 
     model = network.model
@@ -1223,6 +1260,7 @@ def define_linear_objective(network,snapshots):
 
     l_objective(model,objective)
 
+@profiled
 def extract_optimisation_results(network, snapshots, formulation="angles", free_pyomo=True,
                                  extra_postprocessing=None):
 
@@ -1245,95 +1283,94 @@ def extract_optimisation_results(network, snapshots, formulation="angles", free_
 
     model = network.model
 
-    duals = pd.Series(list(model.dual.values()), index=pd.Index(list(model.dual.keys())))
-
-    if free_pyomo:
-        model.dual.clear()
+    # with free_pyomo the variable and constraint data is dropped from the
+    # model as soon as it is read, unless it is still needed by
+    # extra_postprocessing, which receives all duals
+    free = free_pyomo and extra_postprocessing is None
+    extracted = []
 
-    def clear_indexedvar(indexedvar):
-        for v in itervalues(indexedvar._data):
-            v.clear()
+    if extra_postprocessing is not None:
+        duals = pd.Series(list(model.dual.values()), index=pd.Index(list(model.dual.keys())))
 
-    def get_values(indexedvar, free=free_pyomo):
-        s = pd.Series(indexedvar.get_values())
-        if free:
-            clear_indexedvar(indexedvar)
-        return s
+    def get_values(indexedvar, *args):
+        if free_pyomo and not free:
+            extracted.append(indexedvar)
+        return l_values(indexedvar, free, *args)
 
-    def set_from_series(df, series):
-        df.loc[snapshots] = series.unstack(0).reindex(columns=df.columns)
+    def get_shadows(constraint, *args):
+        if free_pyomo and not free:
+            extracted.append(constraint)
+        return l_duals(constraint, model.dual, free, *args)
 
-    def get_shadows(constraint, multiind=True):
-        if len(constraint) == 0: return pd.Series()
+    def set_from_array(df, values):
+        # values has one row per snapshot and one column per column of df
+        df.iloc[df.index.get_indexer(snapshots)] = values
 
-        index = list(constraint.keys())
-        if multiind:
-            index = pd.MultiIndex.from_tuples(index)
-        cdata = pd.Series(list(constraint.values()), index=index)
-        return cdata.map(duals)
+    def set_from_var(df, indexedvar):
+        set_from_array(df, get_values(indexedvar, df.columns, snapshots).T)
 
     if len(network.generators):
-        set_from_series(network.generators_t.p, get_values(model.generator_p))
+        set_from_var(network.generators_t.p, model.generator_p)
 
     if len(network.storage_units):
-        set_from_series(network.storage_units_t.p,
-                        get_values(model.storage_p_dispatch)
-                        - get_values(model.storage_p_store))
+        sus_t = network.storage_units_t
+        set_from_array(sus_t.p,
+                       get_values(model.storage_p_dispatch, sus_t.p.columns, snapshots).T
+                       - get_values(model.storage_p_store, sus_t.p.columns, snapshots).T)
 
-        set_from_series(network.storage_units_t.state_of_charge,
-                        get_values(model.state_of_charge))
+        set_from_var(sus_t.state_of_charge, model.state_of_charge)
 
-        if (network.storage_units_t.inflow.max() > 0).any():
-            set_from_series(network.storage_units_t.spill,
-                            get_values(model.storage_p_spill))
-        network.storage_units_t.spill.fillna(0, inplace=True) #p_spill doesn't exist if inflow=0
+        if (sus_t.inflow.max() > 0).any():
+            set_from_var(sus_t.spill, model.storage_p_spill)
+        sus_t.spill.fillna(0, inplace=True) #p_spill doesn't exist if inflow=0
 
     if len(network.stores):
-        set_from_series(network.stores_t.p, get_values(model.store_p))
-        set_from_series(network.stores_t.e, get_values(model.store_e))
+        set_from_var(network.stores_t.p, model.store_p)
+        set_from_var(network.stores_t.e, model.store_e)
 
     if len(network.loads):
         load_p_set = get_switchable_as_dense(network, 'Load', 'p_set', snapshots)
         network.loads_t["p"].loc[snapshots] = load_p_set.loc[snapshots]
 
+    def bus_injection(p, bus, sign=1.):
+        # sum the columns of p per bus with one sparse product, columns which
+        # are not attached to a bus are dropped
+        buses = network.buses_t.p.columns.get_indexer(bus.reindex(p.columns))
+        valid = buses != -1
+        sign = np.broadcast_to(sign, valid.shape)
+        M = csr_matrix((sign[valid], (np.flatnonzero(valid), buses[valid])),
+                       shape=(len(p.columns), len(network.buses_t.p.columns)))
+        return M.T.dot(np.nan_to_num(p.values).T).T
+
     if len(network.buses):
-        network.buses_t.p.loc[snapshots] = \
-            pd.concat({c.name:
-                       c.pnl.p.loc[snapshots].multiply(c.df.sign, axis=1)
-                       .groupby(c.df.bus, axis=1).sum()
-                       for c in network.iterate_components(network.controllable_one_port_components)},
-                      sort=False) \
-              .sum(level=1) \
-              .reindex(columns=network.buses_t.p.columns, fill_value=0.)
+        bus_p = sum(bus_injection(c.pnl.p.loc[snapshots], c.df.bus,
+                                  c.df.sign.reindex(c.pnl.p.columns).values)
+                    for c in network.iterate_components(network.controllable_one_port_components))
+        set_from_array(network.buses_t.p, bus_p)
 
 
     # passive branches
-    passive_branches = get_values(model.passive_branch_p)
-    flow_lower = get_shadows(model.flow_lower)
-    flow_upper = get_shadows(model.flow_upper)
     for c in network.iterate_components(network.passive_branch_components):
-        set_from_series(c.pnl.p0, passive_branches.loc[c.name])
-        c.pnl.p1.loc[snapshots] = - c.pnl.p0.loc[snapshots]
+        branches = c.pnl.p0.columns
+        p0 = get_values(model.passive_branch_p, [c.name], branches, snapshots)[0].T
+        set_from_array(c.pnl.p0, p0)
+        set_from_array(c.pnl.p1, -p0)
 
-        set_from_series(c.pnl.mu_lower, flow_lower[c.name])
-        set_from_series(c.pnl.mu_upper, -flow_upper[c.name])
-    del flow_lower, flow_upper
+        set_from_array(c.pnl.mu_lower,
+                       get_shadows(model.flow_lower, [c.name], branches, snapshots)[0].T)
+        set_from_array(c.pnl.mu_upper,
+                       -get_shadows(model.flow_upper, [c.name], branches, snapshots)[0].T)
 
     # active branches
     if len(network.links):
-        set_from_series(network.links_t.p0, get_values(model.link_p))
+        set_from_var(network.links_t.p0, model.link_p)
 
         efficiency = get_switchable_as_dense(network, 'Link', 'efficiency', snapshots)
 
         network.links_t.p1.loc[snapshots] = - network.links_t.p0.loc[snapshots]*efficiency.loc[snapshots,:]
 
-        network.buses_t.p.loc[snapshots] -= (network.links_t.p0.loc[snapshots]
-                                             .groupby(network.links.bus0, axis=1).sum()
-                                             .reindex(columns=network.buses_t.p.columns, fill_value=0.))
-
-        network.buses_t.p.loc[snapshots] -= (network.links_t.p1.loc[snapshots]
-                                             .groupby(network.links.bus1, axis=1).sum()
-                                             .reindex(columns=network.buses_t.p.columns, fill_value=0.))
+        bus_p = (bus_injection(network.links_t.p0.loc[snapshots], network.links.bus0, -1.)
+                 + bus_injection(network.links_t.p1.loc[snapshots], network.links.bus1, -1.))
 
         #Add any other buses to which the links are attached
         for i in [int(col[3:]) for col in network.links.columns if col[:3] == "bus" and col not in ["bus0","bus1"]]:
@@ -1341,32 +1378,34 @@ def extract_optimisation_results(network, snapshots, formulation="angles", free_
             p_name = "p{}".format(i)
             links = network.links.index[network.links["bus{}".format(i)] != ""]
             network.links_t[p_name].loc[snapshots, links] = - network.links_t.p0.loc[snapshots, links]*efficiency.loc[snapshots, links]
-            network.buses_t.p.loc[snapshots] -= (network.links_t[p_name].loc[snapshots, links]
-                                                 .groupby(network.links["bus{}".format(i)], axis=1).sum()
-                                                 .reindex(columns=network.buses_t.p.columns, fill_value=0.))
+            bus_p += bus_injection(network.links_t[p_name].loc[snapshots, links],
+                                   network.links["bus{}".format(i)], -1.)
 
+        set_from_array(network.buses_t.p,
+                       network.buses_t.p.loc[snapshots].values + bus_p)
 
-        set_from_series(network.links_t.mu_lower, get_shadows(model.link_p_lower))
-        set_from_series(network.links_t.mu_upper, - get_shadows(model.link_p_upper))
+        links = network.links_t.mu_lower.columns
+        set_from_array(network.links_t.mu_lower,
+                       get_shadows(model.link_p_lower, links, snapshots).T)
+        set_from_array(network.links_t.mu_upper,
+                       - get_shadows(model.link_p_upper, links, snapshots).T)
 
     if len(network.buses):
         if formulation in {'angles', 'kirchhoff'}:
-            set_from_series(network.buses_t.marginal_price,
-                            pd.Series(list(model.power_balance.values()),
-                                      index=pd.MultiIndex.from_tuples(list(model.power_balance.keys())))
-                            .map(duals))
-
+            buses = network.buses_t.marginal_price.columns
             #correct for snapshot weightings
-            network.buses_t.marginal_price.loc[snapshots] = network.buses_t.marginal_price.loc[snapshots].divide(network.snapshot_weightings.loc[snapshots],axis=0)
+            weightings = network.snapshot_weightings.loc[snapshots].values
+            set_from_array(network.buses_t.marginal_price,
+                           get_shadows(model.power_balance, buses, snapshots).T
+                           / weightings[:, np.newaxis])
 
         if formulation == "angles":
-            set_from_series(network.buses_t.v_ang,
-                            get_values(model.voltage_angles))
+            set_from_var(network.buses_t.v_ang, model.voltage_angles)
         elif formulation in ["ptdf","cycles","kirchhoff"]:
             for sn in network.sub_networks.obj:
                 network.buses_t.v_ang.loc[snapshots,sn.slack_bus] = 0.
                 if len(sn.pvpqs) > 0:
-                    network.buses_t.v_ang.loc[snapshots,sn.pvpqs] = spsolve(sn.B[1:, 1:], network.buses_t.p.loc[snapshots,sn.pvpqs].T).T
+                    network.buses_t.v_ang.loc[snapshots,sn.pvpqs] = solve_B(sn, network.buses_t.p.loc[snapshots,sn.pvpqs].T).T
 
         network.buses_t.v_mag_pu.loc[snapshots,network.buses.carrier=="AC"] = 1.
         network.buses_t.v_mag_pu.loc[snapshots,network.buses.carrier=="DC"] = 1 + network.buses_t.v_ang.loc[snapshots,network.buses.carrier=="DC"]
@@ -1377,33 +1416,39 @@ def extract_optimisation_results(network, snapshots, formulation="angles", free_
 
     network.generators.p_nom_opt = network.generators.p_nom
 
-    network.generators.loc[network.generators.p_nom_extendable, 'p_nom_opt'] = \
-        get_values(network.model.generator_p_nom)
+    ext_i = network.generators.index[network.generators.p_nom_extendable]
+    network.generators.loc[ext_i, 'p_nom_opt'] = \
+        get_values(network.model.generator_p_nom, ext_i)
 
     network.storage_units.p_nom_opt = network.storage_units.p_nom
 
-    network.storage_units.loc[network.storage_units.p_nom_extendable, 'p_nom_opt'] = \
-        get_values(network.model.storage_p_nom)
+    ext_i = network.storage_units.index[network.storage_units.p_nom_extendable]
+    network.storage_units.loc[ext_i, 'p_nom_opt'] = \
+        get_values(network.model.storage_p_nom, ext_i)
 
     network.stores.e_nom_opt = network.stores.e_nom
 
-    network.stores.loc[network.stores.e_nom_extendable, 'e_nom_opt'] = \
-        get_values(network.model.store_e_nom)
+    ext_i = network.stores.index[network.stores.e_nom_extendable]
+    network.stores.loc[ext_i, 'e_nom_opt'] = \
+        get_values(network.model.store_e_nom, ext_i)
 
 
-    s_nom_extendable_passive_branches = get_values(model.passive_branch_s_nom)
     for c in network.iterate_components(network.passive_branch_components):
         c.df['s_nom_opt'] = c.df.s_nom
         if c.df.s_nom_extendable.any():
-            c.df.loc[c.df.s_nom_extendable, 's_nom_opt'] = s_nom_extendable_passive_branches.loc[c.name]
+            ext_i = c.df.index[c.df.s_nom_extendable]
+            c.df.loc[ext_i, 's_nom_opt'] = \
+                get_values(model.passive_branch_s_nom, [c.name], ext_i)[0]
 
     network.links.p_nom_opt = network.links.p_nom
 
-    network.links.loc[network.links.p_nom_extendable, "p_nom_opt"] = \
-        get_values(network.model.link_p_nom)
+    ext_i = network.links.index[network.links.p_nom_extendable]
+    network.links.loc[ext_i, "p_nom_opt"] = \
+        get_values(network.model.link_p_nom, ext_i)
 
     try:
-        network.global_constraints.loc[:,"mu"] = - get_shadows(model.global_constraints, multiind=False)
+        network.global_constraints.loc[:,"mu"] = \
+            - get_shadows(model.global_constraints, network.global_constraints.index)
     except (AttributeError, KeyError) as e:
         logger.warning("Could not read out global constraint shadow prices")
 
@@ -1415,12 +1460,18 @@ def extract_optimisation_results(network, snapshots, formulation="angles", free_
 
         if len(fixed_committable_gens_i) > 0:
             network.generators_t.status.loc[snapshots,fixed_committable_gens_i] = \
-                get_values(model.generator_status).unstack(0)
+                get_values(model.generator_status, fixed_committable_gens_i, snapshots).T
 
     if extra_postprocessing is not None:
         extra_postprocessing(network, snapshots, duals)
 
+    if free_pyomo:
+        for component in extracted:
+            component.clear()
+        model.dual.clear()
 
+
+@profiled(size=_model_size)
 def network_lopf_build_model(network, snapshots=None, skip_pre=False,
                              formulation="angles", ptdf_tolerance=0.):
     """
@@ -1492,6 +1543,7 @@ def network_lopf_build_model(network, snapshots=None, skip_pre=False,
 
     return network.model
 
+@profiled
 def network_lopf_prepare_solver(network, solver_name="glpk", solver_io=None):
     """
     Prepare solver for linear optimal power flow.
@@ -1520,6 +1572,7 @@ def network_lopf_prepare_solver(network, solver_name="glpk", solver_io=None):
     return network.opt
 
 
+@profiled
 def network_lopf_solve(network, snapshots=None, formulation="angles", solver_options={},solver_logfile=None,  keep_files=False,
                        free_memory={'pyomo'},extra_postprocessing=None):
     """
@@ -1544,8 +1597,10 @@ def network_lopf_solve(network, snapshots=None, formulation="angles", solver_opt
         construction, e.g. .lp file - useful for debugging
     free_memory : set, default {'pyomo'}
         Any subset of {'pypsa', 'pyomo'}. Allows to stash `pypsa` time-series
-        data away while the solver runs (as a pickle to disk) and/or free
-        `pyomo` data after the solution has been extracted.
+        data away while the solver runs (memory-mapped from disk afterwards)
+        and/or free `pyomo` data while the solution is extracted (the variables and
+        constraints read are dropped from the model one by one; with
+        `extra_postprocessing` only after it has run).
     extra_postprocessing : callable function
         This function must take three arguments
         `extra_postprocessing(network,snapshots,duals)` and is called after
@@ -1569,11 +1624,12 @@ def network_lopf_solve(network, snapshots=None, formulation="angles", solver_opt
     if isinstance(free_memory, string_types):
         free_memory = {free_memory}
 
-    if 'pypsa' in free_memory:
-        with empty_network(network):
+    with stage('solve', solver=network.opt.name):
+        if 'pypsa' in free_memory:
+            with empty_network(network):
+                network.results = network.opt.solve(*args, suffixes=["dual"], keepfiles=keep_files, logfile=solver_logfile, options=solver_options)
+        else:
             network.results = network.opt.solve(*args, suffixes=["dual"], keepfiles=keep_files, logfile=solver_logfile, options=solver_options)
-    else:
-        network.results = network.opt.solve(*args, suffixes=["dual"], keepfiles=keep_files, logfile=solver_logfile, options=solver_options)
 
     if logger.isEnabledFor(logging.INFO):
         network.results.write()
@@ -1597,6 +1653,7 @@ def network_lopf_solve(network, snapshots=None, formulation="angles", solver_opt
 
     return status, termination_condition
 
+@profiled
 def network_lopf(network, snapshots=None, solver_name="glpk", solver_io=None,
                  skip_pre=False, extra_functionality=None, solver_logfile=None, solver_options={},
                  keep_files=False, formulation="angles", ptdf_tolerance=0.,
@@ -1639,8 +1696,10 @@ def network_lopf(network, snapshots=None, solver_name="glpk", solver_io=None,
         Value below which PTDF entries are ignored
     free_memory : set, default {'pyomo'}
         Any subset of {'pypsa', 'pyomo'}. Allows to stash `pypsa` time-series
-        data away while the solver runs (as a pickle to disk) and/or free
-        `pyomo` data after the solution has been extracted.
+        data away while the solver runs (memory-mapped from disk afterwards)
+        and/or free `pyomo` data while the solution is extracted (the variables and
+        constraints read are dropped from the model one by one; with
+        `extra_postprocessing` only after it has run).
     extra_postprocessing : callable function
         This function must take three arguments
         `extra_postprocessing(network,snapshots,duals)` and is called after
@@ -46,7 +46,11 @@ from contextlib import contextmanager
 from six import iteritems
 from six.moves import cPickle as pickle
 import pandas as pd
+import numpy as np
 import gc, os, tempfile
+from itertools import product
+
+from .descriptors import empty_network
 
 __author__ = "Tom Brown (FIAS), Jonas Hoersch (FIAS)"
 __copyright__ = "Copyright 2015-2017 Tom Brown (FIAS), Jonas Hoersch (FIAS), GNU GPL 3"
@@ -165,6 +169,13 @@ try:
         expr.constant = constant
         return expr
 
+    def _build_linear_expression(coeffs, variables):
+        expr = LinearExpression()
+        expr.linear_vars = variables
+        expr.linear_coefs = coeffs
+        expr.constant = 0.
+        return expr
+
 except ImportError:
     # - 5.6)
     from pyomo.core.base import expr_coopr3
@@ -176,6 +187,9 @@ except ImportError:
         expr._const = constant
         return expr
 
+    def _build_linear_expression(coeffs, variables):
+        return _build_sum_expression(list(zip(coeffs, variables)))
+
 
 def l_constraint(model,name,constraints,*args):
     """A replacement for pyomo's Constraint that quickly builds linear
@@ -252,6 +266,165 @@ def l_constraint(model,name,constraints,*args):
             v._data[i]._upper = pyomo.core.base.numvalue.NumericConstant(constant[1])
         else: raise KeyError('`sense` must be one of "==","<=",">=","><"; got: {}'.format(sense))
 
+def _flatten_index(key):
+    # pyomo flattens tuples in the indices of its components
+    if not isinstance(key, tuple):
+        return key
+    key = tuple(k for part in key
+                for k in (part if isinstance(part, tuple) else (part,)))
+    return key[0] if len(key) == 1 else key
+
+_is_not_none = np.frompyfunc(lambda x: x is not None, 1, 1)
+
+def l_variables(var, *args):
+    """Get the data of an indexed pyomo variable as numpy object array.
+
+    The array has the shape (len(args[0]), len(args[1]), ...) and holds the
+    variable data for the product of the indices `args`, or None where the
+    variable is not defined. It can be used to build the `variables`
+    argument of :func:`l_constraint_array`.
+
+    Parameters
+    ----------
+    var : pyomo.environ.Var
+    *args :
+        Indices of the variable
+
+    """
+
+    keys = product(*args) if len(args) > 1 else args[0]
+    data = var._data
+    variables = np.empty(len(keys) if len(args) == 1 else
+                         int(np.prod([len(a) for a in args])), dtype=object)
+    variables[:] = [data.get(_flatten_index(k)) for k in keys]
+    return variables.reshape([len(a) for a in args])
+
+def l_values(var, free, *args):
+    """Get the values of an indexed pyomo variable as numpy float array.
+
+    The array has the shape (len(args[0]), len(args[1]), ...) and holds the
+    values for the product of the indices `args`, or NaN where the variable
+    is not defined or has no value.
+
+    Parameters
+    ----------
+    var : pyomo.environ.Var
+    free : bool
+        Remove the variable data from `var` while reading its values
+    *args :
+        Indices of the variable
+
+    """
+
+    keys = product(*args) if len(args) > 1 else args[0]
+    get = var._data.pop if free else var._data.get
+    values = np.array([getattr(get(_flatten_index(k), None), 'value', None)
+                       for k in keys], dtype=float)
+    return values.reshape([len(a) for a in args])
+
+def l_duals(constraint, dual, free, *args):
+    """Get the shadow prices of an indexed pyomo constraint as numpy float
+    array.
+
+    The array has the shape (len(args[0]), len(args[1]), ...) and holds the
+    duals for the product of the indices `args`, or NaN where the
+    constraint is not defined or has no dual value.
+
+    Parameters
+    ----------
+    constraint : pyomo.environ.Constraint
+    dual : pyomo.environ.Suffix
+        Suffix holding the duals imported from the solver
+    free : bool
+        Remove the constraint data from `constraint` and its dual from
+        `dual` while reading
+    *args :
+        Indices of the constraint
+
+    """
+
+    keys = product(*args) if len(args) > 1 else args[0]
+    get = constraint._data.pop if free else constraint._data.get
+    get_dual = dual.pop if free else dual.get
+    values = np.array([get_dual(get(_flatten_index(k), None), None)
+                       for k in keys], dtype=float)
+    return values.reshape([len(a) for a in args])
+
+def l_constraint_array(model,name,coeffs,variables,sense,constant,*args):
+    """A bulk version of l_constraint for constraints given as arrays.
+
+    Instead of building a dictionary of LConstraint objects, pass the
+    coefficients and variables of all constraints as arrays
+
+    l_constraint_array(model,name,coeffs,variables,sense,constant,index1,index2,...)
+
+    where coeffs and variables have the shape (len(index1), len(index2), ...,
+    number of terms), i.e. the constraints are ordered like the product of
+    the indices and the last dimension holds the terms. Terms with
+    coefficient NaN or variable None are left out, which allows constraints
+    with different numbers of terms. Use :func:`l_variables` to get the
+    variables of an indexed pyomo variable as array.
+
+    Parameters
+    ----------
+    model : pyomo.environ.ConcreteModel
+    name : string
+        Name of constraints to be constructed
+    coeffs : array_like
+        Coefficients of the terms
+    variables : array_like
+        Pyomo variables of the terms, of the same shape as `coeffs`
+    sense : string
+        One of "==","<=",">="
+    constant : float or array_like
+        Constant term of the constraints, broadcastable to (len(index1), ...)
+    *args :
+        Indices of the constraints
+
+    """
+
+    setattr(model,name,Constraint(*args,noruleinit=True))
+    v = getattr(model,name)
+    length = len(v._index)
+    if length == 0:
+        return
+
+    variables = np.asarray(variables, dtype=object)
+    coeffs = np.broadcast_to(np.asarray(coeffs, dtype=float), variables.shape)
+    constant = np.broadcast_to(np.asarray(constant, dtype=float),
+                               variables.shape[:-1]).reshape(length).tolist()
+    variables = variables.reshape(length, -1)
+    coeffs = coeffs.reshape(length, -1)
+    present = ~np.isnan(coeffs) & _is_not_none(variables).astype(bool)
+    complete = present.all(1).tolist()
+    coeffs, variables, present = coeffs.tolist(), variables.tolist(), present.tolist()
+
+    # constants are immutable and can be shared between the constraints
+    constants = {}
+    def numeric_constant(value):
+        if value not in constants:
+            constants[value] = pyomo.core.base.numvalue.NumericConstant(value)
+        return constants[value]
+
+    if sense not in ("==","<=",">="):
+        raise KeyError('`sense` must be one of "==","<=",">="; got: {}'.format(sense))
+
+    for k, i in enumerate(v._index):
+        if complete[k]:
+            c, var = coeffs[k], variables[k]
+        else:
+            c = [c for c, p in zip(coeffs[k], present[k]) if p]
+            var = [var for var, p in zip(variables[k], present[k]) if p]
+
+        data = pyomo.core.base.constraint._GeneralConstraintData(None,v)
+        data._body = _build_linear_expression(c, var)
+
+        value = numeric_constant(constant[k])
+        data._equality = sense == "=="
+        data._lower = None if sense == "<=" else value
+        data._upper = None if sense == ">=" else value
+        v._data[i] = data
+
 def l_objective(model,objective=None, sense=minimize):
     """
     A replacement for pyomo's Objective that quickly builds linear
@@ -340,32 +513,6 @@ def empty_model(model):
 
     logger.debug("Reloaded pyomo model")
 
-@contextmanager
-def empty_network(network):
-    logger.debug("Storing pypsa timeseries to disk")
-
-    panels = {}
-    for c in network.all_components:
-        attr = network.components[c]["list_name"] + "_t"
-        panels[attr] = getattr(network, attr)
-        setattr(network, attr, None)
-
-    fd, fn = tempfile.mkstemp()
-    with os.fdopen(fd, 'wb') as f:
-        pickle.dump(panels, f, -1)
-
-    del panels
-
-    gc.collect()
-    yield
-
-    logger.debug("Reloading pypsa timeseries from disk")
-    with open(fn, 'rb') as f:
-        panels = pickle.load(f)
-    os.remove(fn)
-    for attr, pnl in iteritems(panels):
-        setattr(network, attr, pnl)
-
 def patch_optsolver_free_model_before_solving(opt, model):
     orig_apply_solver = opt._apply_solver
     def wrapper():
@@ -19,7 +19,7 @@
 # make the code as Python 3 compatible as possible
 from __future__ import division, absolute_import
 from six.moves import range
-from six import iterkeys
+from six import iterkeys, iteritems
 from six.moves.collections_abc import Sequence
 
 
@@ -29,10 +29,10 @@ __copyright__ = "Copyright 2015-2017 Tom Brown (FIAS), Jonas Hoersch (FIAS), Cop
 import logging
 logger = logging.getLogger(__name__)
 
-from scipy.sparse import issparse, csr_matrix, csc_matrix, hstack as shstack, vstack as svstack, dok_matrix
+from scipy.sparse import issparse, csr_matrix, csc_matrix, dok_matrix
 
 from numpy import r_, ones
-from scipy.sparse.linalg import spsolve
+from scipy.sparse.linalg import spsolve, splu
 from numpy.linalg import norm
 
 import numpy as np
@@ -42,8 +42,10 @@ import networkx as nx
 import six
 from operator import itemgetter
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from .descriptors import get_switchable_as_dense, allocate_series_dataframes, Dict, zsum, degree
+from .profiling import profiled, _open_stages, _within
 
 pd.Series.zsum = zsum
 
@@ -53,6 +55,9 @@ def real(X): return np.real(X.to_numpy())
 
 def imag(X): return np.imag(X.to_numpy())
 
+def _sub_network_info(sub_network, *args, **kwargs):
+    return dict(sub_network=sub_network.name)
+
 def _as_snapshots(network, snapshots):
     if snapshots is None:
         snapshots = network.snapshots
@@ -63,27 +68,31 @@ def _as_snapshots(network, snapshots):
         return pd.Index(snapshots)
 
 
-def _allocate_pf_outputs(network, linear=False):
+def _pf_outputs(network, linear=False):
 
-    to_allocate = {'Generator': ['p'],
-                   'Load': ['p'],
-                   'StorageUnit': ['p'],
-                   'Store': ['p'],
-                   'ShuntImpedance': ['p'],
-                   'Bus': ['p', 'v_ang', 'v_mag_pu'],
-                   'Line': ['p0', 'p1'],
-                   'Transformer': ['p0', 'p1'],
-                   'Link': ["p"+col[3:] for col in network.links.columns if col[:3] == "bus"]}
+    outputs = {'Generator': ['p'],
+               'Load': ['p'],
+               'StorageUnit': ['p'],
+               'Store': ['p'],
+               'ShuntImpedance': ['p'],
+               'Bus': ['p', 'v_ang', 'v_mag_pu'],
+               'Line': ['p0', 'p1'],
+               'Transformer': ['p0', 'p1'],
+               'Link': ["p"+col[3:] for col in network.links.columns if col[:3] == "bus"]}
 
 
     if not linear:
-        for component, attrs in to_allocate.items():
+        for component, attrs in outputs.items():
             if "p" in attrs:
                 attrs.append("q")
             if "p0" in attrs and component != 'Link':
                 attrs.extend(["q0","q1"])
 
-    allocate_series_dataframes(network, to_allocate)
+    return outputs
+
+def _allocate_pf_outputs(network, linear=False):
+
+    allocate_series_dataframes(network, _pf_outputs(network, linear))
 
 def _calculate_controllable_nodal_power_balance(sub_network, network, snapshots, buses_o):
 
@@ -107,15 +116,54 @@ def _calculate_controllable_nodal_power_balance(sub_network, network, snapshots,
                  for c in network.iterate_components(network.controllable_branch_components)
                  for i in [int(col[3:]) for col in c.df.columns if col[:3] == "bus"]])
 
-def _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=False,
-                                distribute_slack=False, slack_weights='p_set', **kwargs):
+def _slack_shares(sub_network, slack_weights, snapshots):
+    """
+    Return the positions of the buses of the generators of `sub_network`
+    in `sub_network.buses_o`, the shares of the buses in the total slack
+    power and the shares of the generators in the slack power of their
+    bus. The shares are arrays with one row per snapshot for the weights
+    'p_set' and constant otherwise.
+    """
 
-    if linear:
-        sub_network_pf_fun = sub_network_lpf
-        sub_network_prepare_fun = calculate_B_H
+    network = sub_network.network
+    buses_o = sub_network.buses_o
+    generators_i = sub_network.generators_i()
+    gen_buses = buses_o.get_indexer(network.generators.bus.loc[generators_i])
+
+    # sparse bus x generator incidence matrix summing the generator weights of each bus
+    incidence = csr_matrix((ones(len(generators_i)), (gen_buses, r_[:len(generators_i)])),
+                           (len(buses_o), len(generators_i)))
+    def bus_sum(weights):
+        return (incidence * weights.T).T
+
+    if type(slack_weights) == str and slack_weights == 'p_set':
+        weights = get_switchable_as_dense(network, 'Generator', 'p_set', snapshots, generators_i).values
+        bus_weights = bus_sum(weights)
+    elif type(slack_weights) == str:
+        assert not (network.generators[slack_weights] == 0).all(), "Invalid slack weights! Generator attribute {} is always zero.".format(slack_weights)
+        weights = network.generators.loc[generators_i, slack_weights].values
+        bus_weights = bus_sum(weights)
+    elif slack_weights.index.isin(generators_i).all():
+        weights = slack_weights.reindex(generators_i).fillna(0.).values
+        bus_weights = bus_sum(weights)
     else:
-        sub_network_pf_fun = sub_network_pf
-        sub_network_prepare_fun = calculate_Y
+        bus_weights = slack_weights.reindex(buses_o).fillna(0.).values
+        weights = network.generators.p_nom.loc[generators_i].values
+        # distribute evenly at buses without nominal capacity
+        weights = np.where(bus_sum(weights)[gen_buses] == 0, 1., weights)
+
+    def shares(weights, total):
+        return np.divide(weights, total, out=np.zeros(np.broadcast(weights, total).shape),
+                         where=total != 0)
+
+    return (gen_buses,
+            shares(bus_weights, bus_weights.sum(axis=-1, keepdims=True)),
+            shares(weights, bus_sum(weights)[..., gen_buses]))
+
+
+def _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=False,
+                                distribute_slack=False, slack_weights='p_set',
+                                workers=1, executor='thread', **kwargs):
 
     if not skip_pre:
         network.determine_network_topology()
@@ -137,44 +185,243 @@ def _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=False,
     itdf = pd.DataFrame(index=snapshots, columns=network.sub_networks.index, dtype=int)
     difdf = pd.DataFrame(index=snapshots, columns=network.sub_networks.index)
     cnvdf = pd.DataFrame(index=snapshots, columns=network.sub_networks.index, dtype=bool)
-    for sub_network in network.sub_networks.obj:
+
+    if workers > 1:
+        results = _run_pf_parallel(network, snapshots, linear, workers, executor,
+                                   distribute_slack=distribute_slack,
+                                   slack_weights=slack_weights, **kwargs)
+    else:
         if not skip_pre:
-            find_bus_controls(sub_network)
+            _prepare_sub_networks(network, linear)
+        results = {sub_network.name: _run_sub_network_pf(sub_network, snapshots, linear,
+                                                          distribute_slack=distribute_slack,
+                                                          slack_weights=slack_weights, **kwargs)
+                   for sub_network in network.sub_networks.obj}
+
+    if not linear:
+        for name, (iters, diffs, convs) in iteritems(results):
+            itdf[name], difdf[name], cnvdf[name] = iters, diffs, convs
+        return Dict({ 'n_iter': itdf, 'error': difdf, 'converged': cnvdf })
 
-            branches_i = sub_network.branches_i()
-            if len(branches_i) > 0:
-                sub_network_prepare_fun(sub_network, skip_pre=True)
 
-        if type(slack_weights) == dict:
-            sn_slack_weights = slack_weights[sub_network.name]
-        else:
-            sn_slack_weights = slack_weights
-
-        if type(sn_slack_weights) == dict:
-            sn_slack_weights = pd.Series(sn_slack_weights)
-
-        if not linear:
-            # escape for single-bus sub-network
-            if len(sub_network.buses()) <= 1:
-                itdf[sub_network.name],\
-                difdf[sub_network.name],\
-                cnvdf[sub_network.name] = sub_network_pf_singlebus(sub_network, snapshots=snapshots, skip_pre=True,
-                                                                   distribute_slack=distribute_slack,
-                                                                   slack_weights=sn_slack_weights)
+def _prepare_sub_networks(network, linear=False):
+    for sub_network in network.sub_networks.obj:
+        find_bus_controls(sub_network)
+
+        branches_i = sub_network.branches_i()
+        if len(branches_i) > 0:
+            if linear:
+                calculate_B_H(sub_network, skip_pre=True)
             else:
-                itdf[sub_network.name],\
-                difdf[sub_network.name],\
-                cnvdf[sub_network.name] = sub_network_pf_fun(sub_network, snapshots=snapshots,
-                                                             skip_pre=True, distribute_slack=distribute_slack,
-                                                             slack_weights=sn_slack_weights, **kwargs)
-        else:
-            sub_network_pf_fun(sub_network, snapshots=snapshots, skip_pre=True, **kwargs)
+                calculate_Y(sub_network, skip_pre=True)
+
+
+def _run_sub_network_pf(sub_network, snapshots, linear=False, distribute_slack=False,
+                        slack_weights='p_set', **kwargs):
+
+    if type(slack_weights) == dict:
+        sn_slack_weights = slack_weights[sub_network.name]
+    else:
+        sn_slack_weights = slack_weights
+
+    if type(sn_slack_weights) == dict:
+        sn_slack_weights = pd.Series(sn_slack_weights)
+
+    if linear:
+        sub_network_lpf(sub_network, snapshots=snapshots, skip_pre=True, **kwargs)
+    # escape for single-bus sub-network
+    elif len(sub_network.buses()) <= 1:
+        return sub_network_pf_singlebus(sub_network, snapshots=snapshots, skip_pre=True,
+                                        distribute_slack=distribute_slack,
+                                        slack_weights=sn_slack_weights)
+    else:
+        return sub_network_pf(sub_network, snapshots=snapshots, skip_pre=True,
+                              distribute_slack=distribute_slack,
+                              slack_weights=sn_slack_weights, **kwargs)
+
+
+def _run_pf_parallel(network, snapshots, linear, workers, executor, **kwargs):
+    """
+    Run the power flows of the sub-networks on contiguous blocks of the
+    snapshots in a pool of `workers` threads or processes.
+
+    The tasks, one per sub-network and block, are distributed over one job
+    per worker, each of which gets its own copy of the network, so that
+    the workers never write to shared data. The results for the
+    components of the sub-networks are written back to `network`.
+    """
+
+    valid_executors = ['thread', 'process']
+    assert executor in valid_executors, "Value for 'executor' must be one of {}. Is {}.".format(valid_executors, executor)
+
+    blocks = [snapshots[b] for b in np.array_split(np.arange(len(snapshots)), min(workers, len(snapshots)))]
+    blocks = [b for b in blocks if len(b)]
+    tasks = [(sub_network.name, block)
+             for sub_network in network.sub_networks.obj
+             for block in blocks]
+
+    # assign the tasks, largest first, to the job with the least work
+    jobs = [[] for _ in range(min(workers, len(tasks)))]
+    load = np.zeros(len(jobs))
+    size = network.buses.groupby("sub_network").size()
+    for task in sorted(tasks, key=lambda t: -size.get(t[0], 0)*len(t[1])):
+        k = load.argmin()
+        jobs[k].append(task)
+        load[k] += size.get(task[0], 0)*len(task[1])
+
+    if executor == 'thread':
+        pool = ThreadPoolExecutor(len(jobs))
+        copies = [network.copy() for job in jobs]
+    else:
+        pool = ProcessPoolExecutor(len(jobs))
+        # SubNetwork objects hold a weak reference to their network and
+        # cannot be pickled, they are rebuilt by the workers
+        payload = network.copy()
+        payload.sub_networks["obj"] = None
+        copies = [payload for job in jobs]
+
+    # the stages of the workers are nested into the ones open here
+    stages = _open_stages()
+    with pool:
+        futures = [pool.submit(_run_pf_job, copy, job, linear, kwargs, stages)
+                   for copy, job in zip(copies, jobs)]
+        results = [f.result() for f in futures]
+
+    stats = {}
+    for job_results in results:
+        for name, block, values, stat in job_results:
+            for (component, attr), df in iteritems(values):
+                network.pnl(component)[attr].loc[block, df.columns] = df.values
+            stats.setdefault(name, []).append((block, stat))
 
     if not linear:
-        return Dict({ 'n_iter': itdf, 'error': difdf, 'converged': cnvdf })
+        merged = {}
+        for name, pieces in iteritems(stats):
+            pieces.sort(key=lambda p: snapshots.get_loc(p[0][0]))
+            # single-bus sub-networks return scalars for all snapshots
+            merged[name] = tuple(pd.concat([pd.Series(stat[i], index=block)
+                                            if np.isscalar(stat[i]) else stat[i]
+                                            for block, stat in pieces])
+                                 for i in range(3))
+        return merged
+
+
+def _run_pf_job(network, tasks, linear, kwargs, stages=()):
+    from .components import SubNetwork
+
+    with _within(stages):
+        network.sub_networks["obj"] = [SubNetwork(network, name) for name in network.sub_networks.index]
+        _prepare_sub_networks(network, linear)
+
+        outputs = _pf_outputs(network, linear)
+        results = []
+        for name, snapshots in tasks:
+            sub_network = network.sub_networks.at[name, "obj"]
+            stat = _run_sub_network_pf(sub_network, snapshots, linear, **kwargs)
+            values = {(c.name, attr): c.pnl[attr].loc[snapshots, c.ind]
+                      for c in sub_network.iterate_components(set(outputs) - {'Link'})
+                      for attr in outputs[c.name]}
+            results.append((name, snapshots, values, stat))
+    return results
+
+class _Jacobian(object):
+    """
+    Jacobian of the power flow equations of a sub-network with the bus
+    admittance matrix `Y` and buses ordered as slack, PV and PQ buses.
+
+    The sparsity pattern of the Jacobian only depends on `Y`, so the
+    positions of the entries of dS/dtheta and dS/d|V| (on the pattern of
+    `Y` plus the diagonal) in a fixed CSC structure are computed once and
+    the Jacobian is assembled in place. The fill-reducing column ordering
+    of the first factorisation is reused by all later ones.
+    """
+
+    def __init__(self, Y, n_pv, distribute_slack=False):
+        n = Y.shape[0]
+        n_pvpq = n - 1
+        n_pq = n - 1 - n_pv
+
+        self.Y = Y.tocsr()
+        pattern = (abs(self.Y) + csr_matrix((ones(n), (r_[:n], r_[:n])), (n, n))).tocoo()
+        self.row, self.col = pattern.row, pattern.col
+        self.Y_data = np.asarray(self.Y[self.row, self.col]).ravel()
+        self.diag = self.row == self.col
+
+        # with distributed slack there is an active power balance for the
+        # slack bus and a column for the total slack power
+        first_p = 0 if distribute_slack else 1
+        n_p = n - first_p
+        p_b, q_b = self.row >= first_p, self.row >= 1 + n_pv
+        va_b, vm_b = self.col >= 1, self.col >= 1 + n_pv
+        p_row, q_row = self.row - first_p, n_p + self.row - (1 + n_pv)
+        va_col, vm_col = self.col - 1, n_pvpq + self.col - (1 + n_pv)
+
+        # entries of the blocks dP/dtheta, dQ/dtheta, dP/d|V| and dQ/d|V|
+        # taken from the real and imaginary parts of dS/dtheta and dS/d|V|
+        nnz = len(self.row)
+        blocks = [(p_b & va_b, p_row, va_col), (q_b & va_b, q_row, va_col),
+                  (p_b & vm_b, p_row, vm_col), (q_b & vm_b, q_row, vm_col)]
+        rows = [row[b] for b, row, col in blocks]
+        cols = [col[b] for b, row, col in blocks]
+        source = [k*nnz + np.flatnonzero(b) for k, (b, row, col) in enumerate(blocks)]
+        shape = (n_p + n_pq, n_pvpq + n_pq)
 
+        if distribute_slack:
+            rows.append(r_[:n])
+            cols.append(np.repeat(n_pvpq + n_pq, n))
+            source.append(4*nnz + r_[:n])
+            shape = (shape[0], shape[1] + 1)
+
+        # the data of the matrix built from the triplets encodes the source
+        # of each entry in CSC order
+        rows, cols, source = (np.concatenate(a) for a in (rows, cols, source))
+        self.J = csc_matrix((source + 1., (rows, cols)), shape)
+        self.source = self.J.data.astype(int) - 1
+
+        self.perm_c = None
+
+    def __call__(self, V, slack_weights=None):
+        """Assemble the Jacobian at the complex voltages V."""
+
+        V_row, V_col = V[self.row], V[self.col]
+        I_row = (self.Y*V)[self.row]
+        YV = self.Y_data*V_col
+
+        dS_dVa = 1j*V_row*np.conj(np.where(self.diag, I_row, 0.) - YV)
+        dS_dVm = (np.where(self.diag, V_row/abs(V_row)*np.conj(I_row), 0.)
+                  + V_row*np.conj(YV/abs(V_col)))
+
+        values = [dS_dVa.real, dS_dVa.imag, dS_dVm.real, dS_dVm.imag]
+        if slack_weights is not None:
+            values.append(np.asarray(slack_weights, dtype=float))
+
+        self.J.data[:] = np.concatenate(values)[self.source]
+        return self.J
+
+    def solve(self, J, F):
+        """Solve J * x = F, reusing the column ordering of the first call."""
+
+        if self.perm_c is None:
+            lu = splu(J)
+            # J[:, order] is factorised without further column permutation
+            self.order = np.argsort(lu.perm_c)
+            J_order = csc_matrix((r_[1.:len(J.data)+1.], J.indices, J.indptr), J.shape)[:, self.order]
+            self.order_source = J_order.data.astype(int) - 1
+            self.J_order = J_order
+            self.perm_c = lu.perm_c
+
+        # the first system is factorised like all later ones, so that the
+        # result for a snapshot does not depend on the snapshots before it
+        self.J_order.data[:] = J.data[self.order_source]
+        x = np.empty(len(F))
+        x[self.order] = splu(self.J_order, permc_spec='NATURAL').solve(F)
+        return x
+
+
+@profiled
 def network_pf(network, snapshots=None, skip_pre=False, x_tol=1e-6, use_seed=False,
-               distribute_slack=False, slack_weights='p_set'):
+               distribute_slack=False, slack_weights='p_set', algorithm='nr',
+               seed_fallback='flat', workers=1, executor='thread'):
     """
     Full non-linear power flow for generic network.
 
@@ -187,8 +434,22 @@ def network_pf(network, snapshots=None, skip_pre=False, x_tol=1e-6, use_seed=Fal
         Skip the preliminary steps of computing topology, calculating dependent values and finding bus controls.
     x_tol: float
         Tolerance for Newton-Raphson power flow.
-    use_seed : bool, default False
+    use_seed : bool|str, default False
         Use a seed for the initial guess for the Newton-Raphson algorithm.
+        If ``True``, the voltage angles and magnitudes stored in
+        ``network.buses_t`` are used, with ``'dc'`` the voltage angles of
+        the linear power flow and magnitudes of 1 p.u. With ``'previous'``
+        each snapshot starts from the solution of the preceding snapshot
+        and with ``'extrapolate'`` from the linear extrapolation of the
+        solutions of the two preceding snapshots, where the snapshots are
+        taken in the given order. Otherwise the algorithm starts from a
+        flat guess.
+    seed_fallback : str, default 'flat'
+        Start for the snapshots which do not converge from the solution
+        of the preceding snapshots with ``use_seed='previous'`` or
+        ``'extrapolate'``, either 'flat' or 'dc' for the voltage angles
+        of the linear power flow. The iterations of both attempts are
+        counted.
     distribute_slack : bool, default False
         If ``True``, distribute the slack power across generators proportional to generator dispatch by default
         or according to the distribution scheme provided in ``slack_weights``.
@@ -204,6 +465,23 @@ def network_pf(network, snapshots=None, skip_pre=False, x_tol=1e-6, use_seed=Fal
         corresponding subnetwork as index/keys.
         When specifying custom weights with buses as index/keys the slack power of a bus is distributed
         among its generators in proportion to their nominal capacity (``p_nom``) if given, otherwise evenly.
+    algorithm : str, default 'nr'
+        Algorithm solving the power flow equations, either 'nr' for
+        Newton-Raphson or 'fdxb' and 'fdbx' for the XB and BX versions of
+        the fast-decoupled power flow, which factorise the susceptance
+        matrices once per sub-network. The fast-decoupled power flow needs
+        more (but much cheaper) iterations and does not support
+        ``distribute_slack``.
+    workers : int, default 1
+        Number of threads or processes solving the power flows of the
+        sub-networks and of contiguous blocks of the snapshots in
+        parallel, each on its own copy of the network. The results are
+        identical to the serial power flow, except that seeding with the
+        preceding snapshots starts afresh in each block.
+    executor : str, default 'thread'
+        Run the workers in a pool of threads ('thread') or processes
+        ('process'). Processes avoid the global interpreter lock, but the
+        network has to be pickled for each of them.
 
     Returns
     -------
@@ -215,13 +493,17 @@ def network_pf(network, snapshots=None, skip_pre=False, x_tol=1e-6, use_seed=Fal
 
     return _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=False, x_tol=x_tol,
                                        use_seed=use_seed, distribute_slack=distribute_slack,
-                                       slack_weights=slack_weights)
+                                       slack_weights=slack_weights, algorithm=algorithm,
+                                       seed_fallback=seed_fallback, workers=workers,
+                                       executor=executor)
 
 
-def newton_raphson_sparse(f, guess, dfdx, x_tol=1e-10, lim_iter=100, distribute_slack=False, slack_weights=None):
+def newton_raphson_sparse(f, guess, dfdx, x_tol=1e-10, lim_iter=100, distribute_slack=False, slack_weights=None,
+                          solve=spsolve):
     """Solve f(x) = 0 with initial guess for x and dfdx(x). dfdx(x) should
     return a sparse Jacobian.  Terminate if error on norm of f(x) is <
-    x_tol or there were more than lim_iter iterations.
+    x_tol or there were more than lim_iter iterations. `solve(J, F)`
+    solves the linear equations J * dx = F of each iteration.
 
     """
 
@@ -238,7 +520,7 @@ def newton_raphson_sparse(f, guess, dfdx, x_tol=1e-10, lim_iter=100, distribute_
 
         n_iter +=1
 
-        guess = guess - spsolve(dfdx(guess, **slack_args),F)
+        guess = guess - solve(dfdx(guess, **slack_args),F)
 
         F = f(guess, **slack_args)
         diff = norm(F,np.Inf)
@@ -252,6 +534,58 @@ def newton_raphson_sparse(f, guess, dfdx, x_tol=1e-10, lim_iter=100, distribute_
 
     return guess, n_iter, diff, converged
 
+def fast_decoupled_sparse(Y, s, v_ang, v_mag_pu, n_pv, solve_B_p, solve_B_pp,
+                          x_tol=1e-10, lim_iter=100):
+    """Solve the power flow equations V * conj(Y * V) = s for buses ordered
+    as slack, PV and PQ buses with the fast-decoupled method, starting from
+    the voltage angles `v_ang` and magnitudes `v_mag_pu`. `solve_B_p` and
+    `solve_B_pp` solve with the (factorised) reduced susceptance matrices
+    B' and B''. Terminate if the error on the norm of the mismatch of the
+    PV and PQ active and the PQ reactive powers is < x_tol or there were
+    more than lim_iter iterations.
+
+    """
+
+    v_ang = np.array(v_ang, dtype=float)
+    v_mag_pu = np.array(v_mag_pu, dtype=float)
+
+    def mismatch():
+        V = v_mag_pu*np.exp(1j*v_ang)
+        mismatch = V*np.conj(Y*V) - s
+        F = r_[mismatch.real[1:], mismatch.imag[1+n_pv:]]
+        return mismatch, norm(F, np.Inf)
+
+    converged = False
+    n_iter = 0
+    mis, diff = mismatch()
+
+    logger.debug("Error at iteration %d: %f", n_iter, diff)
+
+    while diff > x_tol and n_iter < lim_iter:
+
+        n_iter += 1
+
+        # P-theta half iteration
+        v_ang[1:] -= solve_B_p(mis.real[1:]/v_mag_pu[1:])
+        mis, diff = mismatch()
+        if diff <= x_tol:
+            break
+
+        # Q-V half iteration
+        if len(v_mag_pu) > 1 + n_pv:
+            v_mag_pu[1+n_pv:] -= solve_B_pp(mis.imag[1+n_pv:]/v_mag_pu[1+n_pv:])
+            mis, diff = mismatch()
+
+        logger.debug("Error at iteration %d: %f", n_iter, diff)
+
+    if diff > x_tol:
+        logger.warning("Warning, we didn't reach the required tolerance within %d iterations, error is at %f. See the section \"Troubleshooting\" in the documentation for tips to fix this. ", n_iter, diff)
+    elif not np.isnan(diff):
+        converged = True
+
+    return v_ang, v_mag_pu, n_iter, diff, converged
+
+@profiled(info=_sub_network_info)
 def sub_network_pf_singlebus(sub_network, snapshots=None, skip_pre=False,
                              distribute_slack=False, slack_weights='p_set', linear=False):
     """
@@ -297,18 +631,13 @@ def sub_network_pf_singlebus(sub_network, snapshots=None, skip_pre=False,
     network.buses_t.v_ang.loc[snapshots,sub_network.slack_bus] = 0.
 
     if distribute_slack:
-        for bus, group in sub_network.generators().groupby('bus'):
-            if slack_weights in ['p_nom', 'p_nom_opt']:
-                assert not all(network.generators[slack_weights]) == 0, "Invalid slack weights! Generator attribute {} is always zero.".format(slack_weights)
-                bus_generator_shares = network.generators[slack_weights].loc[group.index].pipe(normed).fillna(0)
-            elif slack_weights == 'p_set':
-                generators_t_p_choice = get_switchable_as_dense(network, 'Generator', slack_weights, snapshots)
-                assert not generators_t_p_choice.isna().all().all(), "Invalid slack weights! Generator attribute {} is always NaN.".format(slack_weights)
-                assert not (generators_t_p_choice == 0).all().all(), "Invalid slack weights! Generator attribute {} is always zero.".format(slack_weights)
-                bus_generator_shares = generators_t_p_choice.loc[snapshots,group.index].apply(normed, axis=1).fillna(0)
-            else:
-                bus_generator_shares = slack_weights.pipe(normed).fillna(0)
-            network.generators_t.p.loc[snapshots,group.index] += bus_generator_shares.multiply(-network.buses_t.p.loc[snapshots,bus], axis=0)
+        if type(slack_weights) == str and slack_weights == 'p_set':
+            generators_t_p_choice = get_switchable_as_dense(network, 'Generator', slack_weights, snapshots)
+            assert not generators_t_p_choice.isna().all().all(), "Invalid slack weights! Generator attribute {} is always NaN.".format(slack_weights)
+            assert not (generators_t_p_choice == 0).all().all(), "Invalid slack weights! Generator attribute {} is always zero.".format(slack_weights)
+        gen_buses, bus_shares, gen_shares = _slack_shares(sub_network, slack_weights, snapshots)
+        bus_p = network.buses_t.p.loc[snapshots,buses_o].values
+        network.generators_t.p.loc[snapshots,sub_network.generators_i()] -= gen_shares*bus_p[:,gen_buses]
     else:
         network.generators_t.p.loc[snapshots,sub_network.slack_generator] -= network.buses_t.p.loc[snapshots,sub_network.slack_bus]
 
@@ -320,8 +649,10 @@ def sub_network_pf_singlebus(sub_network, snapshots=None, skip_pre=False,
     return 0, 0., True # dummy substitute for newton raphson output
 
 
+@profiled(info=_sub_network_info)
 def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_seed=False,
-                   distribute_slack=False, slack_weights='p_set'):
+                   distribute_slack=False, slack_weights='p_set', algorithm='nr',
+                   seed_fallback='flat'):
     """
     Non-linear power flow for connected sub-network.
 
@@ -334,8 +665,22 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
         Skip the preliminary steps of computing topology, calculating dependent values and finding bus controls.
     x_tol: float
         Tolerance for Newton-Raphson power flow.
-    use_seed : bool, default False
+    use_seed : bool|str, default False
         Use a seed for the initial guess for the Newton-Raphson algorithm.
+        If ``True``, the voltage angles and magnitudes stored in
+        ``network.buses_t`` are used, with ``'dc'`` the voltage angles of
+        the linear power flow and magnitudes of 1 p.u. With ``'previous'``
+        each snapshot starts from the solution of the preceding snapshot
+        and with ``'extrapolate'`` from the linear extrapolation of the
+        solutions of the two preceding snapshots, where the snapshots are
+        taken in the given order. Otherwise the algorithm starts from a
+        flat guess.
+    seed_fallback : str, default 'flat'
+        Start for the snapshots which do not converge from the solution
+        of the preceding snapshots with ``use_seed='previous'`` or
+        ``'extrapolate'``, either 'flat' or 'dc' for the voltage angles
+        of the linear power flow. The iterations of both attempts are
+        counted.
     distribute_slack : bool, default False
         If ``True``, distribute the slack power across generators proportional to generator dispatch by default
         or according to the distribution scheme provided in ``slack_weights``.
@@ -348,6 +693,10 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
         that has the buses or the generators of the subnetwork as index/keys.
         When using custom weights with buses as index/keys the slack power of a bus is distributed
         among its generators in proportion to their nominal capacity (``p_nom``) if given, otherwise evenly.
+    algorithm : str, default 'nr'
+        Algorithm solving the power flow equations, either 'nr' for
+        Newton-Raphson or 'fdxb' and 'fdbx' for the XB and BX versions of
+        the fast-decoupled power flow (see :func:`calculate_B_fast_decoupled`).
 
     Returns
     -------
@@ -363,6 +712,15 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
         valid_strings = ['p_nom', 'p_nom_opt', 'p_set']
         assert slack_weights in valid_strings, "String value for 'slack_weights' must be one of {}. Is {}.".format(valid_strings, slack_weights)
 
+    valid_algorithms = ['nr', 'fdxb', 'fdbx']
+    assert algorithm in valid_algorithms, "Value for 'algorithm' must be one of {}. Is {}.".format(valid_algorithms, algorithm)
+    valid_seeds = [True, False, 'dc', 'previous', 'extrapolate']
+    assert use_seed in valid_seeds, "Value for 'use_seed' must be one of {}. Is {}.".format(valid_seeds, use_seed)
+    valid_fallbacks = ['flat', 'dc']
+    assert seed_fallback in valid_fallbacks, "Value for 'seed_fallback' must be one of {}. Is {}.".format(valid_fallbacks, seed_fallback)
+    if algorithm != 'nr' and distribute_slack:
+        raise NotImplementedError("The fast-decoupled power flow does not support distribute_slack.")
+
     snapshots = _as_snapshots(sub_network.network, snapshots)
     logger.info("Performing non-linear load-flow on {} sub-network {} for snapshots {}".format(sub_network.network.sub_networks.at[sub_network.name,"carrier"], sub_network, snapshots))
 
@@ -381,14 +739,9 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
     sn_buses = sub_network.buses().index
     sn_generators = sub_network.generators().index
 
-    generator_slack_weights_b = False
-    bus_slack_weights_b = False
     if type(slack_weights) == pd.Series:
-        if all(i in sn_generators for i in slack_weights.index):
-            generator_slack_weights_b = True
-        elif all(i in sn_buses for i in slack_weights.index):
-            bus_slack_weights_b = True
-        else:
+        if not (slack_weights.index.isin(sn_generators).all() or
+                slack_weights.index.isin(sn_buses).all()):
             raise AssertionError("Custom slack weights pd.Series/dict must only have the",
                                  "generators or buses of the subnetwork as index/keys.")
 
@@ -397,74 +750,36 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
 
     _calculate_controllable_nodal_power_balance(sub_network, network, snapshots, buses_o)
 
-    def f(guess, distribute_slack=False, slack_weights=None):
+    n_pv = len(sub_network.pvs)
+    n_pvpq = len(sub_network.pvpqs)
 
+    def voltages(guess):
         last_pq = -1 if distribute_slack else None
-        network.buses_t.v_ang.loc[now,sub_network.pvpqs] = guess[:len(sub_network.pvpqs)]
-        network.buses_t.v_mag_pu.loc[now,sub_network.pqs] = guess[len(sub_network.pvpqs):last_pq]
+        v_ang = r_[0., guess[:n_pvpq]]
+        v_mag_pu = r_[v_mag_pu_fixed, guess[n_pvpq:last_pq]]
+        return v_mag_pu*np.exp(1j*v_ang)
 
-        v_mag_pu = network.buses_t.v_mag_pu.loc[now,buses_o]
-        v_ang = network.buses_t.v_ang.loc[now,buses_o]
-        V = v_mag_pu*np.exp(1j*v_ang)
+    def f(guess, distribute_slack=False, slack_weights=None):
+
+        V = voltages(guess)
 
         if distribute_slack:
-            slack_power = slack_weights*guess[-1]
+            slack_power = np.asarray(slack_weights, dtype=float)*guess[-1]
             mismatch = V*np.conj(sub_network.Y*V) - s + slack_power
         else:
             mismatch = V*np.conj(sub_network.Y*V) - s
 
         if distribute_slack:
-            F = r_[real(mismatch)[:],imag(mismatch)[1+len(sub_network.pvs):]]
+            F = r_[mismatch.real[:],mismatch.imag[1+n_pv:]]
         else:
-            F = r_[real(mismatch)[1:],imag(mismatch)[1+len(sub_network.pvs):]]
+            F = r_[mismatch.real[1:],mismatch.imag[1+n_pv:]]
 
         return F
 
 
     def dfdx(guess, distribute_slack=False, slack_weights=None):
 
-        last_pq = -1 if distribute_slack else None
-        network.buses_t.v_ang.loc[now,sub_network.pvpqs] = guess[:len(sub_network.pvpqs)]
-        network.buses_t.v_mag_pu.loc[now,sub_network.pqs] = guess[len(sub_network.pvpqs):last_pq]
-
-        v_mag_pu = network.buses_t.v_mag_pu.loc[now,buses_o]
-        v_ang = network.buses_t.v_ang.loc[now,buses_o]
-
-        V = v_mag_pu*np.exp(1j*v_ang)
-
-        index = r_[:len(buses_o)]
-
-        #make sparse diagonal matrices
-        V_diag = csr_matrix((V,(index,index)))
-        V_norm_diag = csr_matrix((V/abs(V),(index,index)))
-        I_diag = csr_matrix((sub_network.Y*V,(index,index)))
-
-        dS_dVa = 1j*V_diag*np.conj(I_diag - sub_network.Y*V_diag)
-
-        dS_dVm = V_norm_diag*np.conj(I_diag) + V_diag * np.conj(sub_network.Y*V_norm_diag)
-
-        J10 = dS_dVa[1+len(sub_network.pvs):,1:].imag
-        J11 = dS_dVm[1+len(sub_network.pvs):,1+len(sub_network.pvs):].imag
-
-        if distribute_slack:
-            J00 = dS_dVa[:,1:].real
-            J01 = dS_dVm[:,1+len(sub_network.pvs):].real
-            J02 = csr_matrix(slack_weights,(1,1+len(sub_network.pvpqs))).T
-            J12 = csr_matrix((1,len(sub_network.pqs))).T
-            J_P_blocks = [J00, J01, J02]
-            J_Q_blocks = [J10, J11, J12]
-        else:
-            J00 = dS_dVa[1:,1:].real
-            J01 = dS_dVm[1:,1+len(sub_network.pvs):].real
-            J_P_blocks = [J00, J01]
-            J_Q_blocks = [J10, J11]
-
-        J = svstack([
-            shstack(J_P_blocks),
-            shstack(J_Q_blocks)
-        ], format="csr")
-
-        return J
+        return jacobian(voltages(guess), slack_weights if distribute_slack else None)
 
 
     #Set what we know: slack V and v_mag_pu for PV buses
@@ -473,149 +788,153 @@ def sub_network_pf(sub_network, snapshots=None, skip_pre=False, x_tol=1e-6, use_
     network.buses_t.v_mag_pu.loc[snapshots,sub_network.slack_bus] = v_mag_pu_set.loc[:,sub_network.slack_bus]
     network.buses_t.v_ang.loc[snapshots,sub_network.slack_bus] = 0.
 
-    if not use_seed:
+    temporal_seed = use_seed in ('previous', 'extrapolate')
+    if use_seed == 'dc' or (temporal_seed and seed_fallback == 'dc'):
+        #voltage angles of the linear power flow
+        calculate_B_H(sub_network, skip_pre=True)
+        p = network.buses_t.p.loc[snapshots,buses_o].values - sub_network.p_bus_shift
+        v_ang_dc = solve_B(sub_network, p[:,1:].T).T
+
+    if use_seed == 'dc':
+        network.buses_t.v_mag_pu.loc[snapshots,sub_network.pqs] = 1.
+        network.buses_t.v_ang.loc[snapshots,sub_network.pvpqs] = v_ang_dc
+    elif not use_seed or temporal_seed:
         network.buses_t.v_mag_pu.loc[snapshots,sub_network.pqs] = 1.
         network.buses_t.v_ang.loc[snapshots,sub_network.pvpqs] = 0.
 
+    if algorithm == 'nr':
+        jacobian = _Jacobian(sub_network.Y, n_pv, distribute_slack)
+    else:
+        #factorise B' and B'' once for all iterations and snapshots
+        calculate_B_fast_decoupled(sub_network, algorithm, skip_pre=True)
+        solve_B_p = splu(sub_network.B_p).solve
+        solve_B_pp = splu(sub_network.B_pp).solve if len(sub_network.pqs) else None
+
     slack_args = {'distribute_slack': distribute_slack}
     slack_variable_b = 1 if distribute_slack else 0
 
     if distribute_slack:
+        gen_buses, bus_shares, gen_shares = _slack_shares(sub_network, slack_weights, snapshots)
+
+    def solve(guess):
+        if algorithm == 'nr':
+            return newton_raphson_sparse(f, guess, dfdx, x_tol=x_tol,
+                                         solve=jacobian.solve, **slack_args)
+        else:
+            v_ang, v_mag_pu, n_iter, diff, converged = fast_decoupled_sparse(
+                sub_network.Y, s, r_[0., guess[:n_pvpq]], r_[v_mag_pu_fixed, guess[n_pvpq:]],
+                n_pv, solve_B_p, solve_B_pp, x_tol=x_tol)
+            return r_[v_ang[1:], v_mag_pu[1+n_pv:]], n_iter, diff, converged
+
+    #buses_o is ordered as slack, PV and PQ buses
+    ss = (network.buses_t.p.loc[snapshots,buses_o].values
+          + 1j*network.buses_t.q.loc[snapshots,buses_o].values)
+    v_mag_pu = network.buses_t.v_mag_pu.loc[snapshots,buses_o].values
+    v_ang = network.buses_t.v_ang.loc[snapshots,buses_o].values
 
-        if type(slack_weights) == str and slack_weights == 'p_set':
-            generators_t_p_choice = get_switchable_as_dense(network, 'Generator', slack_weights, snapshots)
-            bus_generation = generators_t_p_choice.rename(columns=network.generators.bus)
-            slack_weights_calc = pd.DataFrame(bus_generation.groupby(bus_generation.columns, axis=1).sum(), columns=buses_o).apply(normed, axis=1).fillna(0)
-        
-        elif type(slack_weights) == str and slack_weights in ['p_nom', 'p_nom_opt']:
-            assert not all(network.generators[slack_weights]) == 0, "Invalid slack weights! Generator attribute {} is always zero.".format(slack_weights)
-            slack_weights_calc = network.generators.groupby('bus').sum()[slack_weights].reindex(buses_o).pipe(normed).fillna(0)
-        
-        elif generator_slack_weights_b:
-            # convert generator-based slack weights to bus-based slack weights
-            slack_weights_calc = slack_weights.rename(network.generators.bus).groupby(slack_weights.index.name).sum().reindex(buses_o).pipe(normed).fillna(0)
-
-        elif bus_slack_weights_b:
-            # take bus-based slack weights
-            slack_weights_calc = slack_weights.reindex(buses_o).pipe(normed).fillna(0)
-
-    ss = np.empty((len(snapshots), len(buses_o)), dtype=np.complex)
     roots = np.empty((len(snapshots), len(sub_network.pvpqs) + len(sub_network.pqs) + slack_variable_b))
     iters = pd.Series(0, index=snapshots)
     diffs = pd.Series(index=snapshots)
     convs = pd.Series(False, index=snapshots)
     for i, now in enumerate(snapshots):
-        p = network.buses_t.p.loc[now,buses_o]
-        q = network.buses_t.q.loc[now,buses_o]
-        ss[i] = s = p + 1j*q
+        s = ss[i]
+        v_mag_pu_fixed = v_mag_pu[i,:1+n_pv]
 
         #Make a guess for what we don't know: V_ang for PV and PQs and v_mag_pu for PQ buses
-        guess = r_[network.buses_t.v_ang.loc[now,sub_network.pvpqs],network.buses_t.v_mag_pu.loc[now,sub_network.pqs]]
+        guess = r_[v_ang[i,1:], v_mag_pu[i,1+n_pv:]]
 
         if distribute_slack:
             guess = np.append(guess, [0]) # for total slack power
-            if type(slack_weights) is str and slack_weights == 'p_set':
-                # snapshot-dependent slack weights
-                slack_args["slack_weights"] = slack_weights_calc.loc[now]
+            # snapshot-dependent slack weights for 'p_set'
+            slack_args["slack_weights"] = bus_shares[i] if bus_shares.ndim == 2 else bus_shares
+
+        #Start from the solution of the previous snapshot(s)
+        seeded = temporal_seed and i > 0 and convs.iat[i-1]
+        if seeded:
+            if use_seed == 'extrapolate' and i > 1 and convs.iat[i-2]:
+                guess = 2*roots[i-1] - roots[i-2]
             else:
-                slack_args["slack_weights"] = slack_weights_calc
+                guess = roots[i-1].copy()
 
         #Now try and solve
         start = time.time()
-        roots[i], n_iter, diff, converged = newton_raphson_sparse(f, guess, dfdx, x_tol=x_tol, **slack_args)
-        logger.info("Newton-Raphson solved in %d iterations with error of %f in %f seconds", n_iter,diff,time.time()-start)
+        roots[i], n_iter, diff, converged = solve(guess)
+
+        if seeded and not converged:
+            logger.info("Power flow did not converge from the previous solution at snapshot %s, restarting from a %s start", now, seed_fallback)
+            guess[:] = 0.
+            guess[n_pvpq:n_pvpq+len(sub_network.pqs)] = 1.
+            if seed_fallback == 'dc':
+                guess[:n_pvpq] = v_ang_dc[i]
+            roots[i], n_retry, diff, converged = solve(guess)
+            n_iter += n_retry
+
+        logger.info("%s solved in %d iterations with error of %f in %f seconds",
+                    "Newton-Raphson" if algorithm == 'nr' else "Fast-decoupled power flow",
+                    n_iter, diff, time.time()-start)
         iters[now] = n_iter
         diffs[now] = diff
         convs[now] = converged
 
 
     #now set everything
-    if distribute_slack:
-        last_pq = -1
-        slack_power = roots[:,-1]
-    else:
-        last_pq = None
-    network.buses_t.v_ang.loc[snapshots,sub_network.pvpqs] = roots[:,:len(sub_network.pvpqs)]
-    network.buses_t.v_mag_pu.loc[snapshots,sub_network.pqs] = roots[:,len(sub_network.pvpqs):last_pq]
-
-    v_mag_pu = network.buses_t.v_mag_pu.loc[snapshots,buses_o].values
-    v_ang = network.buses_t.v_ang.loc[snapshots,buses_o].values
+    last_pq = -1 if distribute_slack else None
+    v_ang[:,1:] = roots[:,:n_pvpq]
+    v_mag_pu[:,1+n_pv:] = roots[:,n_pvpq:last_pq]
+    network.buses_t.v_ang.loc[snapshots,buses_o] = v_ang
+    network.buses_t.v_mag_pu.loc[snapshots,buses_o] = v_mag_pu
 
     V = v_mag_pu*np.exp(1j*v_ang)
 
-    #add voltages to branches
+    #branch flows for all snapshots at once
     buses_indexer = buses_o.get_indexer
     branch_bus0 = []; branch_bus1 = []
     for c in sub_network.iterate_components(network.passive_branch_components):
         branch_bus0 += list(c.df.loc[c.ind, 'bus0'])
         branch_bus1 += list(c.df.loc[c.ind, 'bus1'])
-    v0 = V[:,buses_indexer(branch_bus0)]
-    v1 = V[:,buses_indexer(branch_bus1)]
-
-    i0 = np.empty((len(snapshots), sub_network.Y0.shape[0]), dtype=np.complex)
-    i1 = np.empty((len(snapshots), sub_network.Y1.shape[0]), dtype=np.complex)
-    for i, now in enumerate(snapshots):
-        i0[i] = sub_network.Y0*V[i]
-        i1[i] = sub_network.Y1*V[i]
+    s0 = V[:,buses_indexer(branch_bus0)]*np.conj((sub_network.Y0*V.T).T)
+    s1 = V[:,buses_indexer(branch_bus1)]*np.conj((sub_network.Y1*V.T).T)
 
-    s0 = pd.DataFrame(v0*np.conj(i0), columns=branches_i, index=snapshots)
-    s1 = pd.DataFrame(v1*np.conj(i1), columns=branches_i, index=snapshots)
+    #the branches are ordered by component
+    end = 0
     for c in sub_network.iterate_components(network.passive_branch_components):
-        s0t = s0.loc[:,c.name]
-        s1t = s1.loc[:,c.name]
-        c.pnl.p0.loc[snapshots,s0t.columns] = s0t.values.real
-        c.pnl.q0.loc[snapshots,s0t.columns] = s0t.values.imag
-        c.pnl.p1.loc[snapshots,s1t.columns] = s1t.values.real
-        c.pnl.q1.loc[snapshots,s1t.columns] = s1t.values.imag
-
-    s_calc = np.empty((len(snapshots), len(buses_o)), dtype=np.complex)
-    for i in np.arange(len(snapshots)):
-        s_calc[i] = V[i]*np.conj(sub_network.Y*V[i])
-    slack_index = buses_o.get_loc(sub_network.slack_bus)
+        start, end = end, end + len(c.ind)
+        c.pnl.p0.loc[snapshots,c.ind] = s0.real[:,start:end]
+        c.pnl.q0.loc[snapshots,c.ind] = s0.imag[:,start:end]
+        c.pnl.p1.loc[snapshots,c.ind] = s1.real[:,start:end]
+        c.pnl.q1.loc[snapshots,c.ind] = s1.imag[:,start:end]
+
+    s_calc = V*np.conj((sub_network.Y*V.T).T)
     if distribute_slack:
-        network.buses_t.p.loc[snapshots,sn_buses] = s_calc.real[:,buses_indexer(sn_buses)]
+        network.buses_t.p.loc[snapshots,buses_o] = s_calc.real
     else:
-        network.buses_t.p.loc[snapshots,sub_network.slack_bus] = s_calc[:,slack_index].real
-    network.buses_t.q.loc[snapshots,sub_network.slack_bus] = s_calc[:,slack_index].imag
-    network.buses_t.q.loc[snapshots,sub_network.pvs] = s_calc[:,buses_indexer(sub_network.pvs)].imag
+        network.buses_t.p.loc[snapshots,sub_network.slack_bus] = s_calc.real[:,0]
+    network.buses_t.q.loc[snapshots,buses_o[:1+n_pv]] = s_calc.imag[:,:1+n_pv]
 
     #set shunt impedance powers
     shunt_impedances_i = sub_network.shunt_impedances_i()
     if len(shunt_impedances_i):
-        #add voltages
-        shunt_impedances_v_mag_pu = v_mag_pu[:,buses_indexer(network.shunt_impedances.loc[shunt_impedances_i, 'bus'])]
-        network.shunt_impedances_t.p.loc[snapshots,shunt_impedances_i] = (shunt_impedances_v_mag_pu**2)*network.shunt_impedances.loc[shunt_impedances_i, 'g_pu'].values
-        network.shunt_impedances_t.q.loc[snapshots,shunt_impedances_i] = (shunt_impedances_v_mag_pu**2)*network.shunt_impedances.loc[shunt_impedances_i, 'b_pu'].values
+        shunt_impedances = network.shunt_impedances.loc[shunt_impedances_i]
+        shunt_impedances_v_mag_pu2 = v_mag_pu[:,buses_indexer(shunt_impedances.bus)]**2
+        network.shunt_impedances_t.p.loc[snapshots,shunt_impedances_i] = shunt_impedances_v_mag_pu2*shunt_impedances.g_pu.values
+        network.shunt_impedances_t.q.loc[snapshots,shunt_impedances_i] = shunt_impedances_v_mag_pu2*shunt_impedances.b_pu.values
 
     #let slack generator take up the slack
     if distribute_slack:
-        distributed_slack_power = network.buses_t.p.loc[snapshots,sn_buses] - ss[:,buses_indexer(sn_buses)].real
-        for bus, group in sub_network.generators().groupby('bus'):
-            if type(slack_weights) == str and slack_weights == 'p_set':
-                generators_t_p_choice = get_switchable_as_dense(network, 'Generator', slack_weights, snapshots)
-                bus_generator_shares = generators_t_p_choice.loc[snapshots,group.index].apply(normed, axis=1).fillna(0)
-                network.generators_t.p.loc[snapshots,group.index] += bus_generator_shares.multiply(distributed_slack_power.loc[snapshots,bus], axis=0)
-            else:
-                if generator_slack_weights_b:
-                    bus_generator_shares = slack_weights.loc[group.index].pipe(normed).fillna(0)
-                else:
-                    bus_generators_p_nom = network.generators.p_nom.loc[group.index]
-                    # distribute evenly if no p_nom given
-                    if all(bus_generators_p_nom) == 0:
-                        bus_generators_p_nom = 1
-                    bus_generator_shares = bus_generators_p_nom.pipe(normed).fillna(0)
-                network.generators_t.p.loc[snapshots,group.index] += distributed_slack_power.loc[snapshots,bus].apply(lambda row: row*bus_generator_shares)
+        distributed_slack_power = s_calc.real - ss.real
+        network.generators_t.p.loc[snapshots,sub_network.generators_i()] += gen_shares*distributed_slack_power[:,gen_buses]
     else:
-        network.generators_t.p.loc[snapshots,sub_network.slack_generator] += network.buses_t.p.loc[snapshots,sub_network.slack_bus] - ss[:,slack_index].real
+        network.generators_t.p.loc[snapshots,sub_network.slack_generator] += s_calc.real[:,0] - ss.real[:,0]
 
     #set the Q of the slack and PV generators
-    network.generators_t.q.loc[snapshots,sub_network.slack_generator] += network.buses_t.q.loc[snapshots,sub_network.slack_bus] - ss[:,slack_index].imag
-    network.generators_t.q.loc[snapshots,network.buses.loc[sub_network.pvs, "generator"]] += np.asarray(network.buses_t.q.loc[snapshots,sub_network.pvs] - ss[:,buses_indexer(sub_network.pvs)].imag)
+    controlling_generators = [sub_network.slack_generator] + list(network.buses.loc[sub_network.pvs, "generator"])
+    network.generators_t.q.loc[snapshots,controlling_generators] += s_calc.imag[:,:1+n_pv] - ss.imag[:,:1+n_pv]
 
     return iters, diffs, convs
 
 
-def network_lpf(network, snapshots=None, skip_pre=False):
+@profiled
+def network_lpf(network, snapshots=None, skip_pre=False, workers=1, executor='thread'):
     """
     Linear power flow for generic network.
 
@@ -627,63 +946,100 @@ def network_lpf(network, snapshots=None, skip_pre=False):
     skip_pre : bool, default False
         Skip the preliminary steps of computing topology, calculating
         dependent values and finding bus controls.
+    workers : int, default 1
+        Number of threads or processes solving the power flows of the
+        sub-networks and of contiguous blocks of the snapshots in
+        parallel, each on its own copy of the network. The results are
+        identical to the serial power flow.
+    executor : str, default 'thread'
+        Run the workers in a pool of threads ('thread') or processes
+        ('process'). Processes avoid the global interpreter lock, but the
+        network has to be pickled for each of them.
 
     Returns
     -------
     None
     """
 
-    _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=True)
+    _network_prepare_and_run_pf(network, snapshots, skip_pre, linear=True,
+                                workers=workers, executor=executor)
 
 
-def apply_line_types(network):
-    """Calculate line electrical parameters x, r, b, g from standard
-    types.
+# attributes of the lines, transformers and shunt impedances which are read
+# or written by calculate_dependent_values
+_dependent_attrs = {"Line": ["type", "length", "num_parallel", "r", "x", "b", "g",
+                             "v_nom", "x_pu", "r_pu", "b_pu", "g_pu",
+                             "x_pu_eff", "r_pu_eff"],
+                    "Transformer": ["type", "tap_position", "num_parallel", "model",
+                                    "r", "x", "g", "b", "s_nom", "phase_shift",
+                                    "tap_side", "tap_ratio", "x_pu", "r_pu",
+                                    "b_pu", "g_pu", "x_pu_eff", "r_pu_eff"],
+                    "ShuntImpedance": ["b", "g", "v_nom", "b_pu", "g_pu"]}
 
-    """
+# attributes of the standard types and the bus defining the nominal voltage
+_type_attrs = {"Line": ("line_types", ["r_per_length", "x_per_length",
+                                       "c_per_length", "f_nom"]),
+               "Transformer": ("transformer_types", ["vscr", "vsc", "pfe", "s_nom",
+                                                     "i0", "phase_shift", "tap_side",
+                                                     "tap_neutral", "tap_step"])}
 
-    lines_with_types_b = network.lines.type != ""
-    if lines_with_types_b.zsum() == 0:
-        return
+_bus_attrs = {"Line": "bus0", "ShuntImpedance": "bus"}
 
-    missing_types = (pd.Index(network.lines.loc[lines_with_types_b, 'type'].unique())
-                     .difference(network.line_types.index))
-    assert missing_types.empty, ("The type(s) {} do(es) not exist in network.line_types"
-                                 .format(", ".join(missing_types)))
 
-    # Get a copy of the lines data
-    l = (network.lines.loc[lines_with_types_b, ["type", "length", "num_parallel"]]
-         .join(network.line_types, on='type'))
+def _dependent_inputs(network, component):
+    """Return the attributes of `component` used by calculate_dependent_values
+    as dictionary of arrays, together with the nominal voltages of the buses
+    ("bus_v_nom") and the position ("type_i") and attributes ("type_*") of
+    the standard types."""
 
-    for attr in ["r","x"]:
-        l[attr] = l[attr + "_per_length"] * l["length"] / l["num_parallel"]
-    l["b"] = 2*np.pi*1e-9*l["f_nom"] * l["c_per_length"] * l["length"] * l["num_parallel"]
+    df = network.df(component)
 
-    # now set calculated values on live lines
-    for attr in ["r", "x", "b"]:
-        network.lines.loc[lines_with_types_b, attr] = l[attr]
+    v = {attr: df[attr].values if attr in df.columns else np.full(len(df), np.nan)
+         for attr in _dependent_attrs[component]}
 
+    # positions -1 of missing buses and types pick the appended NaN
+    if component in _bus_attrs:
+        i = network.buses.index.get_indexer(df[_bus_attrs[component]])
+        v["bus_v_nom"] = r_[network.buses.v_nom.values, np.nan][i]
 
+    if component in _type_attrs:
+        list_name, attrs = _type_attrs[component]
+        types = getattr(network, list_name)
+        v["type_i"] = types.index.get_indexer(df["type"])
+        for attr in attrs:
+            v["type_" + attr] = r_[types[attr].values.astype(float), np.nan][v["type_i"]]
 
-def apply_transformer_types(network):
-    """Calculate transformer electrical parameters x, r, b, g from
-    standard types.
+    return v
+
+
+def _check_types(v, list_name):
+    typed = v["type"] != ""
+    missing = pd.Index(v["type"][typed & (v["type_i"] == -1)]).unique()
+    assert missing.empty, ("The type(s) {} do(es) not exist in network.{}"
+                           .format(", ".join(missing), list_name))
+    return typed
 
-    """
 
-    trafos_with_types_b = network.transformers.type != ""
-    if trafos_with_types_b.zsum() == 0:
+def _apply_line_types(v):
+    typed = _check_types(v, "line_types")
+    if not typed.any():
         return
 
-    missing_types = (pd.Index(network.transformers.loc[trafos_with_types_b, 'type'].unique())
-                     .difference(network.transformer_types.index))
-    assert missing_types.empty, ("The type(s) {} do(es) not exist in network.transformer_types"
-                                 .format(", ".join(missing_types)))
+    length = v["length"][typed]
+    num_parallel = v["num_parallel"][typed]
+
+    for attr in ["r","x"]:
+        v[attr][typed] = v["type_" + attr + "_per_length"][typed] * length / num_parallel
+    v["b"][typed] = (2*np.pi*1e-9*v["type_f_nom"][typed] * v["type_c_per_length"][typed]
+                     * length * num_parallel)
+
 
-    # Get a copy of the transformers data
-    # (joining pulls in "phase_shift", "s_nom", "tap_side" from TransformerType)
-    t = (network.transformers.loc[trafos_with_types_b, ["type", "tap_position", "num_parallel"]]
-         .join(network.transformer_types, on='type'))
+def _apply_transformer_types(v):
+    typed = _check_types(v, "transformer_types")
+    if not typed.any():
+        return
+
+    t = {attr: v["type_" + attr][typed] for attr in _type_attrs["Transformer"][1]}
 
     t["r"] = t["vscr"] /100.
     t["x"] = np.sqrt((t["vsc"]/100.)**2 - t["r"]**2)
@@ -692,25 +1048,113 @@ def apply_transformer_types(network):
     t["g"] = t["pfe"]/(1000. * t["s_nom"])
 
     #for some bizarre reason, some of the standard types in pandapower have i0^2 < g^2
-    t["b"] = - np.sqrt(((t["i0"]/100.)**2 - t["g"]**2).clip(lower=0))
+    t["b"] = - np.sqrt(((t["i0"]/100.)**2 - t["g"]**2).clip(min=0))
 
+    num_parallel = v["num_parallel"][typed]
     for attr in ["r","x"]:
-        t[attr] /= t["num_parallel"]
+        t[attr] /= num_parallel
 
     for attr in ["b","g"]:
-        t[attr] *= t["num_parallel"]
+        t[attr] *= num_parallel
 
     #deal with tap positions
 
-    t["tap_ratio"] = 1. + (t["tap_position"] - t["tap_neutral"]) * (t["tap_step"]/100.)
+    t["tap_ratio"] = 1. + (v["tap_position"][typed] - t["tap_neutral"]) * (t["tap_step"]/100.)
 
-    # now set calculated values on live transformers
     for attr in ["r", "x", "g", "b", "phase_shift", "s_nom", "tap_side", "tap_ratio"]:
-        network.transformers.loc[trafos_with_types_b, attr] = t[attr]
+        v[attr][typed] = t[attr]
 
     #TODO: status, rate_A
 
 
+def _apply_transformer_t_model(v):
+    z_series = v["r_pu"] + 1j*v["x_pu"]
+    y_shunt = v["g_pu"] + 1j*v["b_pu"]
+
+    ts_b = (v["model"] == "t") & (y_shunt != 0.)
+
+    if not ts_b.any():
+        return
+
+    za,zb,zc = wye_to_delta(z_series[ts_b]/2,z_series[ts_b]/2,1/y_shunt[ts_b])
+
+    v["r_pu"][ts_b] = zc.real
+    v["x_pu"][ts_b] = zc.imag
+    v["g_pu"][ts_b] = (2/za).real
+    v["b_pu"][ts_b] = (2/za).imag
+
+
+def _calculate_dependent_values(component, v):
+    """Calculate the dependent values of `component` in the dictionary of
+    arrays `v` (see _dependent_inputs) in place."""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if component == "Line":
+            _apply_line_types(v)
+
+            v["v_nom"] = v["bus_v_nom"].copy()
+            v["x_pu"] = v["x"]/(v["v_nom"]**2)
+            v["r_pu"] = v["r"]/(v["v_nom"]**2)
+            v["b_pu"] = v["b"]*v["v_nom"]**2
+            v["g_pu"] = v["g"]*v["v_nom"]**2
+            v["x_pu_eff"] = v["x_pu"].copy()
+            v["r_pu_eff"] = v["r_pu"].copy()
+
+        elif component == "Transformer":
+            _apply_transformer_types(v)
+
+            #convert transformer impedances from base power s_nom to base = 1 MVA
+            v["x_pu"] = v["x"]/v["s_nom"]
+            v["r_pu"] = v["r"]/v["s_nom"]
+            v["b_pu"] = v["b"]*v["s_nom"]
+            v["g_pu"] = v["g"]*v["s_nom"]
+            v["x_pu_eff"] = v["x_pu"]*v["tap_ratio"]
+            v["r_pu_eff"] = v["r_pu"]*v["tap_ratio"]
+
+            _apply_transformer_t_model(v)
+
+        elif component == "ShuntImpedance":
+            v["v_nom"] = v["bus_v_nom"].copy()
+            v["b_pu"] = v["b"]*v["v_nom"]**2
+            v["g_pu"] = v["g"]*v["v_nom"]**2
+
+
+def _apply_to_rows(network, component, func, attrs, rows):
+    """Apply `func` to the dictionary of arrays of the boolean `rows` of
+    `component` and write back `attrs`."""
+
+    if not rows.any():
+        return
+
+    v = {k: values[rows] for k, values in iteritems(_dependent_inputs(network, component))}
+    func(v)
+
+    df = network.df(component)
+    for attr in attrs:
+        df.loc[rows, attr] = v[attr]
+
+
+def apply_line_types(network):
+    """Calculate line electrical parameters x, r, b, g from standard
+    types.
+
+    """
+
+    _apply_to_rows(network, "Line", _apply_line_types, ["r", "x", "b"],
+                   rows=(network.lines.type != "").values)
+
+
+def apply_transformer_types(network):
+    """Calculate transformer electrical parameters x, r, b, g from
+    standard types.
+
+    """
+
+    _apply_to_rows(network, "Transformer", _apply_transformer_types,
+                   ["r", "x", "g", "b", "phase_shift", "s_nom", "tap_side", "tap_ratio"],
+                   rows=(network.transformers.type != "").values)
+
+
 def wye_to_delta(z1,z2,z3):
     """Follows http://home.earthlink.net/~w6rmk/math/wyedelta.htm"""
     summand = z1*z2 + z2*z3 + z3*z1
@@ -720,51 +1164,57 @@ def wye_to_delta(z1,z2,z3):
 def apply_transformer_t_model(network):
     """Convert given T-model parameters to PI-model parameters using wye-delta transformation"""
 
-    z_series = network.transformers.r_pu + 1j*network.transformers.x_pu
-    y_shunt = network.transformers.g_pu + 1j*network.transformers.b_pu
-
-    ts_b = (network.transformers.model == "t") & (y_shunt != 0.)
+    _apply_to_rows(network, "Transformer", _apply_transformer_t_model,
+                   ["r_pu", "x_pu", "g_pu", "b_pu"],
+                   rows=(network.transformers.model == "t").values)
 
-    if ts_b.zsum() == 0:
-        return
 
-    za,zb,zc = wye_to_delta(z_series.loc[ts_b]/2,z_series.loc[ts_b]/2,1/y_shunt.loc[ts_b])
+def _differs(a, b):
+    """Elementwise inequality of two arrays, where NaNs compare equal."""
 
-    network.transformers.loc[ts_b,"r_pu"] = real(zc)
-    network.transformers.loc[ts_b,"x_pu"] = imag(zc)
-    network.transformers.loc[ts_b,"g_pu"] = real(2/za)
-    network.transformers.loc[ts_b,"b_pu"] = imag(2/za)
+    differs = a != b
+    if a.dtype.kind == 'f' and b.dtype.kind == 'f':
+        differs &= ~(np.isnan(a) & np.isnan(b))
+    return differs
 
 
+@profiled
 def calculate_dependent_values(network):
-    """Calculate per unit impedances and append voltages to lines and shunt impedances."""
+    """Calculate per unit impedances and append voltages to lines and shunt impedances.
 
-    apply_line_types(network)
-    apply_transformer_types(network)
-
-    network.lines["v_nom"] = network.lines.bus0.map(network.buses.v_nom)
+    The inputs and dependent values of each component are compared to those
+    of the last call and only the rows which changed (e.g. because of new
+    lines, changed impedances, bus voltages or standard types) are
+    recalculated.
+    """
 
-    network.lines["x_pu"] = network.lines.x/(network.lines.v_nom**2)
-    network.lines["r_pu"] = network.lines.r/(network.lines.v_nom**2)
-    network.lines["b_pu"] = network.lines.b*network.lines.v_nom**2
-    network.lines["g_pu"] = network.lines.g*network.lines.v_nom**2
-    network.lines["x_pu_eff"] = network.lines["x_pu"]
-    network.lines["r_pu_eff"] = network.lines["r_pu"]
+    for component in ["Line", "Transformer", "ShuntImpedance"]:
+        df = network.df(component)
+        v = _dependent_inputs(network, component)
+
+        last_index, last = network._dependent_values.get(component, (None, None))
+        if last_index is not None and last_index.equals(df.index):
+            changed = np.zeros(len(df), dtype=bool)
+            for k, values in iteritems(v):
+                changed |= _differs(values, last[k])
+            if not changed.any():
+                continue
+        else:
+            changed = np.ones(len(df), dtype=bool)
 
+        new = {k: values[changed] for k, values in iteritems(v)}
+        _calculate_dependent_values(component, new)
 
-    #convert transformer impedances from base power s_nom to base = 1 MVA
-    network.transformers["x_pu"] = network.transformers.x/network.transformers.s_nom
-    network.transformers["r_pu"] = network.transformers.r/network.transformers.s_nom
-    network.transformers["b_pu"] = network.transformers.b*network.transformers.s_nom
-    network.transformers["g_pu"] = network.transformers.g*network.transformers.s_nom
-    network.transformers["x_pu_eff"] = network.transformers["x_pu"]* network.transformers["tap_ratio"]
-    network.transformers["r_pu_eff"] = network.transformers["r_pu"]* network.transformers["tap_ratio"]
+        values = {}
+        for k in v:
+            values[k] = v[k].copy()
+            values[k][changed] = new[k]
 
-    apply_transformer_t_model(network)
+        for attr in _dependent_attrs[component]:
+            if attr not in df.columns or _differs(values[attr], v[attr]).any():
+                df[attr] = values[attr].copy()
 
-    network.shunt_impedances["v_nom"] = network.shunt_impedances["bus"].map(network.buses.v_nom)
-    network.shunt_impedances["b_pu"] = network.shunt_impedances.b*network.shunt_impedances.v_nom**2
-    network.shunt_impedances["g_pu"] = network.shunt_impedances.g*network.shunt_impedances.v_nom**2
+        network._dependent_values[component] = (df.index, values)
 
 
 def find_slack_bus(sub_network):
@@ -801,6 +1251,7 @@ def find_slack_bus(sub_network):
     logger.debug("Slack bus for sub-network {} is {}".format(sub_network.name, sub_network.slack_bus))
 
 
+@profiled(info=_sub_network_info)
 def find_bus_controls(sub_network):
     """Find slack and all PV and PQ buses for a sub_network.
     This function also fixes sub_network.buses_o, a DataFrame
@@ -836,6 +1287,7 @@ def find_bus_controls(sub_network):
     sub_network.buses_o = sub_network.pvpqs.insert(0, sub_network.slack_bus)
 
 
+@profiled(info=_sub_network_info)
 def calculate_B_H(sub_network,skip_pre=False):
     """Calculate B and H matrices for AC or DC sub-networks."""
 
@@ -876,6 +1328,38 @@ def calculate_B_H(sub_network,skip_pre=False):
 
     sub_network.p_bus_shift = sub_network.K * sub_network.p_branch_shift
 
+def solve_B(sub_network, p):
+    """
+    Solve the linear power flow equations B[1:,1:] * v = p for the voltage
+    angles (or magnitude deviations for DC) of all but the slack bus.
+
+    The sparse LU factorisation of the slack-reduced weighted Laplacian is
+    cached on the sub_network and reused as long as B does not change, so
+    calculate_B_H must have been called before. `p` may have one column
+    per snapshot, all columns are solved at once.
+
+    If B[1:,1:] is singular, e.g. because a bus is only connected by
+    branches without susceptance, the system is solved with spsolve as in
+    previous versions, which warns and returns NaN.
+    """
+
+    B = sub_network.B[1:, 1:].tocsc()
+    p = np.asarray(p, dtype=float)
+    cached = getattr(sub_network, '_B_factor', None)
+    if (cached is None or cached[0].shape != B.shape
+        or (cached[0] != B).nnz > 0):
+        try:
+            cached = (B, splu(B))
+        except RuntimeError:
+            logger.warning("The susceptance matrix of sub-network {} is "
+                           "singular, the voltage angles cannot be determined "
+                           "for all buses.".format(sub_network.name))
+            sub_network._B_factor = None
+            return spsolve(B, p).reshape(p.shape)
+        sub_network._B_factor = cached
+    return cached[1].solve(p)
+
+@profiled(info=_sub_network_info)
 def calculate_PTDF(sub_network,skip_pre=False):
     """
     Calculate the Power Transfer Distribution Factor (PTDF) for
@@ -917,15 +1401,12 @@ def calculate_PTDF(sub_network,skip_pre=False):
     sub_network.PTDF = sub_network.H*B_inverse
 
 
-def calculate_Y(sub_network,skip_pre=False):
-    """Calculate bus admittance matrices for AC sub-networks."""
-
-    if not skip_pre:
-        calculate_dependent_values(sub_network.network)
-
-    if sub_network.network.sub_networks.at[sub_network.name,"carrier"] != "AC":
-        logger.warning("Non-AC networks not supported for Y!")
-        return
+def _admittance_matrices(sub_network, resistances=True, shunts=True,
+                         tap_ratios=True, phase_shifts=True):
+    """Return the branch admittance matrices Y0 and Y1 and the bus
+    admittance matrix Y of an AC sub-network, optionally neglecting the
+    resistances, the shunt admittances, the tap ratios or the phase shifts
+    (as needed for the fast-decoupled power flow)."""
 
     branches = sub_network.branches()
     buses_o = sub_network.buses_o
@@ -938,15 +1419,21 @@ def calculate_Y(sub_network,skip_pre=False):
     num_branches = len(branches)
     num_buses = len(buses_o)
 
-    y_se = 1/(branches["r_pu"] + 1.j*branches["x_pu"])
+    r_pu = branches["r_pu"] if resistances else 0.
+    y_se = 1/(r_pu + 1.j*branches["x_pu"])
 
     y_sh = branches["g_pu"]+ 1.j*branches["b_pu"]
+    if not shunts:
+        y_sh = 0.*y_sh
 
     tau = branches["tap_ratio"].fillna(1.)
 
     #catch some transformers falsely set with tau = 0 by pypower
     tau[tau==0] = 1.
 
+    if not tap_ratios:
+        tau[:] = 1.
+
     #define the HV tap ratios
     tau_hv = pd.Series(1.,branches.index)
     tau_hv[branches.tap_side==0] = tau[branches.tap_side==0]
@@ -957,6 +1444,8 @@ def calculate_Y(sub_network,skip_pre=False):
 
 
     phase_shift = np.exp(1.j*branches["phase_shift"].fillna(0.)*np.pi/180.)
+    if not phase_shifts:
+        phase_shift[:] = 1.
 
     #build the admittance matrix elements for each branch
     Y11 = (y_se + 0.5*y_sh)/tau_lv**2
@@ -968,6 +1457,8 @@ def calculate_Y(sub_network,skip_pre=False):
     b_sh = network.shunt_impedances.b_pu.groupby(network.shunt_impedances.bus).sum().reindex(buses_o, fill_value = 0.)
     g_sh = network.shunt_impedances.g_pu.groupby(network.shunt_impedances.bus).sum().reindex(buses_o, fill_value = 0.)
     Y_sh = g_sh + 1.j*b_sh
+    if not shunts:
+        Y_sh = 0.*Y_sh
 
     #get bus indices
     bus0 = buses_o.get_indexer(branches.bus0)
@@ -980,13 +1471,67 @@ def calculate_Y(sub_network,skip_pre=False):
     #build Y{0,1} such that Y{0,1} * V is the vector complex branch currents
 
     i = r_[np.arange(num_branches), np.arange(num_branches)]
-    sub_network.Y0 = csr_matrix((r_[Y00,Y01],(i,r_[bus0,bus1])), (num_branches,num_buses))
-    sub_network.Y1 = csr_matrix((r_[Y10,Y11],(i,r_[bus0,bus1])), (num_branches,num_buses))
+    Y0 = csr_matrix((r_[Y00,Y01],(i,r_[bus0,bus1])), (num_branches,num_buses))
+    Y1 = csr_matrix((r_[Y10,Y11],(i,r_[bus0,bus1])), (num_branches,num_buses))
 
     #now build bus admittance matrix
-    sub_network.Y = C0.T * sub_network.Y0 + C1.T * sub_network.Y1 + \
-       csr_matrix((Y_sh, (np.arange(num_buses), np.arange(num_buses))))
+    Y = C0.T * Y0 + C1.T * Y1 + \
+       csr_matrix((Y_sh, (np.arange(num_buses), np.arange(num_buses))), (num_buses, num_buses))
+
+    return Y0, Y1, Y
+
+
+@profiled(info=_sub_network_info)
+def calculate_Y(sub_network,skip_pre=False):
+    """Calculate bus admittance matrices for AC sub-networks."""
+
+    if not skip_pre:
+        calculate_dependent_values(sub_network.network)
+
+    if sub_network.network.sub_networks.at[sub_network.name,"carrier"] != "AC":
+        logger.warning("Non-AC networks not supported for Y!")
+        return
+
+    sub_network.Y0, sub_network.Y1, sub_network.Y = _admittance_matrices(sub_network)
+
+
+@profiled(info=_sub_network_info)
+def calculate_B_fast_decoupled(sub_network, algorithm='fdxb', skip_pre=False):
+    """
+    Calculate the susceptance matrices B' and B'' of the fast-decoupled
+    power flow for AC sub-networks.
+
+    Sets sub_network.B_p, reduced to the PV and PQ buses, and
+    sub_network.B_pp, reduced to the PQ buses, as sparse CSC matrices.
+    B' neglects the shunt admittances and tap ratios, B'' the phase
+    shifts. The resistances are neglected in B' for the XB version
+    ('fdxb') and in B'' for the BX version ('fdbx').
+
+    Parameters
+    ----------
+    sub_network : pypsa.SubNetwork
+    algorithm : str, default 'fdxb'
+        'fdxb' or 'fdbx'
+    skip_pre : bool, default False
+        Skip the preliminary steps of calculating dependent values and
+        finding bus controls.
+    """
+
+    assert algorithm in ['fdxb', 'fdbx'], "Fast-decoupled algorithm must be 'fdxb' or 'fdbx'. Is {}.".format(algorithm)
+
+    if not skip_pre:
+        calculate_dependent_values(sub_network.network)
+        find_bus_controls(sub_network)
+
+    n_pv = len(sub_network.pvs)
+
+    _, _, Y_p = _admittance_matrices(sub_network, resistances=(algorithm == 'fdbx'),
+                                     shunts=False, tap_ratios=False)
+    _, _, Y_pp = _admittance_matrices(sub_network, resistances=(algorithm == 'fdxb'),
+                                      phase_shifts=False)
 
+    sub_network.B_p = -Y_p.imag[1:, 1:].tocsc()
+    sub_network.B_pp = -Y_pp.imag[1+n_pv:, 1+n_pv:].tocsc()
 
 
 def aggregate_multi_graph(sub_network):
@@ -1073,6 +1618,7 @@ def find_tree(sub_network, weight='x_pu'):
             sub_network.T[branch_i,j] = sign
 
 
+@profiled(info=_sub_network_info)
 def find_cycles(sub_network, weight='x_pu'):
     """
     Find all cycles in the sub_network and record them in sub_network.C.
@@ -1121,6 +1667,7 @@ def find_cycles(sub_network, weight='x_pu'):
                 sub_network.C[b_i,c] = sign
                 c+=1
 
+@profiled(info=_sub_network_info)
 def sub_network_lpf(sub_network, snapshots=None, skip_pre=False):
     """
     Linear power flow for connected sub-network.
@@ -1184,7 +1731,7 @@ def sub_network_lpf(sub_network, snapshots=None, skip_pre=False):
     v_diff = np.zeros((len(snapshots), len(buses_o)))
     if len(branches_i) > 0:
         p = network.buses_t['p'].loc[snapshots, buses_o].values - sub_network.p_bus_shift
-        v_diff[:,1:] = spsolve(sub_network.B[1:, 1:], p[:,1:].T).T
+        v_diff[:,1:] = solve_B(sub_network, p[:,1:].T).T
         flows = pd.DataFrame(v_diff * sub_network.H.T,
                              columns=branches_i, index=snapshots) + sub_network.p_branch_shift
 
@@ -0,0 +1,307 @@
+
+
+## Copyright 2020 Tom Brown (KIT, FIAS), Jonas Hoersch (KIT, FIAS)
+
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+
+## You should have received a copy of the GNU General Public License
+## along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Hooks for profiling the stages of power flow, optimisation and clustering.
+
+The stages of the power flow, the linear optimal power flow (with and
+without pyomo) and the network clustering emit events while profiling
+hooks are registered. A hook is any callable taking the event, a
+dictionary with the keys
+
+- ``stage`` : name of the stage, e.g. "define_nodal_balance_constraints"
+- ``path`` : names of the enclosing stages and the stage joined by "/"
+- ``level`` : nesting depth of the stage
+- ``start`` : wall time (``time.time()``) at the start of the stage
+- ``wall``, ``cpu`` : wall and process time spent in the stage in seconds
+- ``max_rss`` : peak resident set size of the process after the stage in
+  bytes and ``max_rss_increase`` the growth of the peak within the stage
+  (NaN where the ``resource`` module is not available)
+- ``memory``, ``memory_peak`` : change of the memory traced by
+  ``tracemalloc`` and its peak in bytes (NaN if not tracing)
+- ``objects`` : change of the number of objects tracked by the garbage
+  collector (only if a hook asks for it)
+
+plus stage specific information, e.g. the number of ``variables`` and
+``constraints`` added to the linear problem by a stage of the LOPF
+without pyomo or the ``sub_network`` of a power flow. Without any hooks,
+the stages cost no more than a function call.
+
+Example
+-------
+>>> with pypsa.profiling.Profile() as profile:
+...     network.lopf(pyomo=False)
+>>> profile.to_frame().groupby('stage').wall.sum()
+
+"""
+
+# make the code as Python 3 compatible as possible
+from __future__ import division, absolute_import
+
+__author__ = "Tom Brown (KIT, FIAS), Jonas Hoersch (KIT, FIAS)"
+__copyright__ = "Copyright 2020 Tom Brown (KIT, FIAS), Jonas Hoersch (KIT, FIAS), GNU GPL 3"
+
+from contextlib import contextmanager
+from functools import wraps
+import gc, sys, threading, time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_hooks = []
+# the stages are opened and closed per thread, e.g. by the thread pool of
+# the parallel power flow
+_local = threading.local()
+
+_process_time = time.process_time if hasattr(time, 'process_time') else time.clock
+
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+_rss_unit = 1 if sys.platform == 'darwin' else 1024
+
+
+def add_hook(hook):
+    """
+    Register a profiling hook, which is called with the event of every stage
+    finished from now on.
+
+    Parameters
+    ----------
+    hook : callable
+        Function taking the event dictionary. If it has a true attribute
+        `objects`, the change of the number of objects tracked by the garbage
+        collector is recorded, which is expensive for large models.
+    """
+    _hooks.append(hook)
+
+def remove_hook(hook):
+    """
+    Unregister a profiling hook registered by :func:`add_hook`.
+    """
+    _hooks.remove(hook)
+
+def _max_rss():
+    if resource is None:
+        return np.nan
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _rss_unit
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+def _open_stages():
+    """
+    Return the names of the stages open in the current thread.
+    """
+    return list(_stack())
+
+@contextmanager
+def _within(stages):
+    """
+    Context manager nesting the stages of the current thread into the
+    `stages` returned by :func:`_open_stages` in another thread.
+    """
+    previous = _stack()
+    _local.stack = list(stages)
+    try:
+        yield
+    finally:
+        _local.stack = previous
+
+def _traced_memory():
+    if tracemalloc is None or not tracemalloc.is_tracing():
+        return np.nan, np.nan
+    return tracemalloc.get_traced_memory()
+
+@contextmanager
+def stage(name, counters=None, size=None, **info):
+    """
+    Context manager marking a stage for the profiling hooks.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage
+    counters : callable, optional
+        Function returning a dictionary of counts, e.g. the size of the
+        linear problem. It is called at the beginning and the end of the
+        stage and the differences are added to the event.
+    size : callable, optional
+        Function returning a dictionary of counts, which is called at the
+        end of the stage and added to the event as is.
+    **info
+        Further information added to the event.
+
+    Yields
+    ------
+    info : dict
+        Information added to the event, which can be extended within the
+        stage.
+
+    Examples
+    --------
+    >>> with stage('concatenate_lp_file', fn=problem_fn):
+    ...     concatenate(problem_fn)
+    """
+    if not _hooks:
+        yield info
+        return
+
+    objects = any(getattr(hook, 'objects', False) for hook in _hooks)
+    before = counters() if counters is not None else {}
+    n_objects = len(gc.get_objects()) if objects else np.nan
+    max_rss = _max_rss()
+    memory, _ = _traced_memory()
+    start, cpu = time.time(), _process_time()
+
+    stack = _stack()
+    stack.append(name)
+    try:
+        yield info
+    finally:
+        event = dict(stage=name, path='/'.join(stack), level=len(stack) - 1,
+                     start=start, wall=time.time() - start,
+                     cpu=_process_time() - cpu)
+        stack.pop()
+
+        event['max_rss'] = _max_rss()
+        event['max_rss_increase'] = event['max_rss'] - max_rss
+        current, event['memory_peak'] = _traced_memory()
+        event['memory'] = current - memory
+        event['objects'] = (len(gc.get_objects()) - n_objects
+                            if objects else np.nan)
+        if counters is not None:
+            after = counters()
+            event.update((k, v - before.get(k, 0)) for k, v in after.items())
+        if size is not None:
+            event.update(size())
+        event.update(info)
+
+        for hook in list(_hooks):
+            hook(event)
+
+def profiled(func=None, name=None, counters=None, size=None, info=None):
+    """
+    Decorator marking calls of a function as stage for the profiling hooks.
+
+    Parameters
+    ----------
+    func : callable
+    name : str, optional
+        Name of the stage, defaults to the name of the function
+    counters, size : callable, optional
+        Called with the arguments of the function, otherwise as in
+        :func:`stage`.
+    info : callable, optional
+        Called with the arguments of the function, returns a dictionary
+        with further information for the event.
+
+    Examples
+    --------
+    >>> @profiled(info=lambda sub_network, *args, **kwargs:
+    ...           {'sub_network': sub_network.name})
+    ... def sub_network_lpf(sub_network, snapshots=None, skip_pre=False):
+    ...     pass
+    """
+    def decorator(func):
+        stage_name = func.__name__ if name is None else name
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+            count = (None if counters is None else
+                     lambda: counters(*args, **kwargs))
+            total = None if size is None else lambda: size(*args, **kwargs)
+            extra = {} if info is None else info(*args, **kwargs)
+            with stage(stage_name, counters=count, size=total, **extra):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator if func is None else decorator(func)
+
+
+class Profile(object):
+    """
+    Profiling hook collecting the events of all stages run within its
+    context.
+
+    Parameters
+    ----------
+    objects : bool, default False
+        Record the change of the number of objects tracked by the garbage
+        collector.
+    trace_memory : bool, default False
+        Start ``tracemalloc`` (if not yet running) to record the allocated
+        memory of each stage. This slows down the stages considerably.
+
+    Examples
+    --------
+    >>> with Profile(trace_memory=True) as profile:
+    ...     network.lpf()
+    >>> profile.to_frame()
+    """
+
+    columns = ['stage', 'path', 'level', 'start', 'wall', 'cpu', 'max_rss',
+               'max_rss_increase', 'memory', 'memory_peak', 'objects']
+
+    def __init__(self, objects=False, trace_memory=False):
+        self.objects = objects
+        self.trace_memory = trace_memory
+        self.events = []
+        self._started_tracing = False
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __enter__(self):
+        if (self.trace_memory and tracemalloc is not None
+            and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            self._started_tracing = True
+        add_hook(self)
+        return self
+
+    def __exit__(self, *args):
+        remove_hook(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def to_frame(self):
+        """
+        Return the collected events as pandas.DataFrame with one row per
+        stage in the order the stages finished.
+        """
+        df = pd.DataFrame(self.events)
+        extra = [c for c in df.columns if c not in self.columns]
+        return df.reindex(columns=self.columns + extra)
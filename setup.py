@@ -19,7 +19,7 @@ setup(
     long_description_content_type='text/x-rst',
     url='https://github.com/PyPSA/PyPSA',
     license='GPLv3',
-    packages=find_packages(exclude=['doc', 'test']),
+    packages=find_packages(exclude=['doc', 'test', 'benchmarks']),
     include_package_data=True,
     install_requires=[
         'six >= 1.13.0',
@@ -3,6 +3,7 @@ from itertools import product
 import os
 from numpy.testing import assert_array_almost_equal as equal
 import sys
+import numpy as np
 
 solver_name = 'glpk' if sys.platform == 'win32' else 'cbc'
 
@@ -36,16 +37,284 @@ def test_lopf():
               n_r.links_t.p0.loc[:,n.links.index],decimal=4)
 
     if sys.version_info.major >= 3:
-        status, cond = n.lopf(snapshots=snapshots, solver_name=solver_name,
-                              pyomo=False)
-        assert status == 'ok'
-        equal(n.generators_t.p.loc[:,n.generators.index],
-              n_r.generators_t.p.loc[:,n.generators.index],decimal=2)
-        equal(n.lines_t.p0.loc[:,n.lines.index],
-              n_r.lines_t.p0.loc[:,n.lines.index],decimal=2)
-        equal(n.links_t.p0.loc[:,n.links.index],
-              n_r.links_t.p0.loc[:,n.links.index],decimal=2)
+        for formulation, presolve in product(["angles", "kirchhoff", "ptdf"],
+                                             [False, True]):
+            status, cond = n.lopf(snapshots=snapshots, solver_name=solver_name,
+                                  formulation=formulation, presolve=presolve,
+                                  pyomo=False)
+            assert status == 'ok'
+            equal(n.generators_t.p.loc[:,n.generators.index],
+                  n_r.generators_t.p.loc[:,n.generators.index],decimal=2)
+            equal(n.lines_t.p0.loc[:,n.lines.index],
+                  n_r.lines_t.p0.loc[:,n.lines.index],decimal=2)
+            equal(n.links_t.p0.loc[:,n.links.index],
+                  n_r.links_t.p0.loc[:,n.links.index],decimal=2)
+
+
+def test_lopf_size_estimate():
+    if sys.version_info.major < 3:
+        return
+    import re
+    from pypsa.linopf import estimate_lopf_size, prepare_lopf
+    from pypsa.linopt import get_var, get_con
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    gas = n.generators.index[n.generators.carrier == "gas"]
+    n.generators.loc[gas, "p_nom_extendable"] = False
+    n.generators.loc[gas, ["committable", "min_up_time", "start_up_cost"]] = [True, 3, 10.]
+    n.generators.loc[n.generators.index.difference(gas), "ramp_limit_up"] = 0.5
+
+    for formulation in ["angles", "kirchhoff"]:
+        size = n.lopf(pyomo=False, formulation=formulation, dry_run=True)
+
+        fdp, problem_fn = prepare_lopf(n, formulation=formulation)
+        with open(problem_fn) as f:
+            lp = f.read()
+        os.close(fdp); os.remove(problem_fn)
+
+        assert size.variables == n._xCounter - 1
+        assert size.constraints == n._cCounter - 1
+        for refs, get, kind in [(n.vars, get_var, "variables"),
+                                (n.cons, get_con, "constraints")]:
+            for c, attr in refs.index:
+                assert (get(n, c, attr).values >= 0).sum() == \
+                    size.blocks.at[(c, attr), kind]
+        matrix = lp[lp.index("s.t."):lp.index("\nbounds\n")]
+        assert size.nonzeros == len(re.findall(r" x\d+", matrix))
+
+
+def test_lopf_basis():
+    if sys.version_info.major < 3 or solver_name != 'cbc':
+        return
+    import pandas as pd
+    from tempfile import mkstemp
+    from pypsa.linopf import prepare_lopf
+    from pypsa.linopt import read_basis, write_basis
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n.lopf(pyomo=False, solver_name=solver_name, store_basis=True)
+    basis = n.basis
+    assert len(basis) > 0
+    assert basis.name1.str.split('|').str[0].isin(n.all_components).all()
+    assert (basis.name2[basis.status.isin(['UL', 'LL'])] == '').all()
+
+    # the references of the rebuilt problem differ, the labels carry over
+    n.add("Generator", "new gen", bus=n.buses.index[0], p_nom=100.,
+          marginal_cost=1000.)
+    status, cond = n.lopf(pyomo=False, solver_name=solver_name,
+                          warmstart=True, store_basis=True)
+    assert status == 'ok'
+    assert n.basis.name1.str.contains("new gen").any()
+
+    fdp, problem_fn = prepare_lopf(n)
+    fd, basis_fn = mkstemp(suffix='.bas')
+    try:
+        write_basis(n, basis, basis_fn)
+        with open(basis_fn) as f:
+            lines = f.read().splitlines()
+        assert lines[0].endswith('VALUES') and lines[-1] == 'ENDATA'
+        assert len(lines) == len(basis) + 2
+        pd.testing.assert_frame_equal(read_basis(n, basis_fn), basis)
+
+        # entries of a variable at a bound have no constraint name
+        with open(basis_fn, 'w') as f:
+            f.write('NAME          PYPSA\n XU x1 c1\n UL x2\n LL x3 1.5\n'
+                    ' XL x999999999 c1\nENDATA\n')
+        small = read_basis(n, basis_fn)
+        assert small.status.tolist() == ['XU', 'UL', 'LL']
+        assert (small.name2 == ['', '', '']).tolist() == [False, True, True]
+        assert small['values'].tolist() == ['', '', '1.5']
+    finally:
+        os.close(fd); os.remove(basis_fn)
+        os.close(fdp); os.remove(problem_fn)
+
+    objective = n.objective
+    n.lopf(pyomo=False, solver_name=solver_name)
+    assert abs(n.objective - objective) <= 1e-6 * abs(objective)
+
+
+def test_lopf_references():
+    if sys.version_info.major < 3:
+        return
+    from pypsa.linopf import prepare_lopf
+    from pypsa.linopt import get_var, get_con, linexpr, define_constraints
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n.generators.loc["Manchester Wind", "p_nom_extendable"] = False
+    n.generators.loc["Frankfurt Gas", "p_nom_max"] = 0.
+    n.generators.loc["Manchester Wind", "ramp_limit_up"] = 0.5
+    n.generators_t.p_max_pu.loc[n.snapshots[:3], "Manchester Wind"] = 0.
+    n.calculate_dependent_values()
+    n.determine_network_topology()
+
+    def extra_functionality(n, snapshots):
+        # the summaries are complete when extra_functionality is called
+        assert n.variables.at[("Generator", "p"), "pnl"]
+        assert not n.variables.at[("Generator", "p_nom"), "pnl"]
+        assert ("Bus", "marginal_price") in n.constraints.index
+        p = get_var(n, "Generator", "p")
+        lhs = linexpr((1, p["Norway Gas"]), (-1, p["Frankfurt Gas"]))
+        define_constraints(n, lhs, "<=", 100., "Generator", "gas_balance")
+        assert ("Generator", "gas_balance") in n.constraints.index
+
+    fdp, problem_fn = prepare_lopf(n, presolve=True,
+                                   extra_functionality=extra_functionality)
+    os.close(fdp); os.remove(problem_fn)
+
+    # substituted variables are referenced with -1
+    p = get_var(n, "Generator", "p")
+    assert p.shape == (len(n.snapshots), len(n.generators))
+    assert (p.loc[n.snapshots[:3], "Manchester Wind"] == -1).all()
+    assert (p.drop(columns="Manchester Wind").values >= 0).all()
+    assert (p.loc[n.snapshots[3:]].values >= 0).all()
+    p_nom = get_var(n, "Generator", "p_nom")
+    assert p_nom["Frankfurt Gas"] == -1
+    assert (p_nom.drop("Frankfurt Gas") >= 0).all()
+    assert p.equals(n.vars.Generator.pnl.p)
+    assert p_nom.equals(n.vars.Generator.df.p_nom)
+
+    # ramps which can never be reached are dropped and referenced with -1
+    ramp = get_con(n, "Generator", "mu_ramp_limit_up")
+    assert ramp.shape == (len(n.snapshots) - 1, 1)
+    max_pu = n.generators_t.p_max_pu["Manchester Wind"]
+    reachable = (max_pu > 0.5).loc[n.snapshots[1:]]
+    assert ((ramp["Manchester Wind"] >= 0) == reachable).all()
+    assert (ramp.loc[n.snapshots[1:3]] == -1).all().all()
+    assert ramp.equals(n.cons.Generator.pnl.mu_ramp_limit_up)
+    assert len(n.constraints) == len(n.cons)
+
+
+def test_lopf_angles():
+    if sys.version_info.major < 3:
+        return
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n.lopf(pyomo=False, solver_name=solver_name, calculate_angles=False)
+    assert n.buses_t.v_ang.empty
+
+    n.lopf(pyomo=False, solver_name=solver_name, formulation="angles")
+    v_ang = n.buses_t.v_ang.copy()
+
+    # the angles recovered from the injections match the angle variables
+    for formulation in ["kirchhoff", "ptdf"]:
+        n.lopf(pyomo=False, solver_name=solver_name, formulation=formulation)
+        equal(n.buses_t.v_ang.loc[:, v_ang.columns], v_ang, decimal=6)
+
+
+def test_lopf_duals():
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n_r = pypsa.Network(os.path.join(csv_folder_name, "results-lopf"))
+
+    # the nodal balances are built in bulk, the objective and the shadow
+    # prices must not change
+    for formulation in ["angles", "cycles", "kirchhoff", "ptdf"]:
+        n.lopf(solver_name=solver_name, formulation=formulation)
+        equal(n.objective / n_r.objective, 1, decimal=6)
+        equal(n.buses_t.marginal_price.loc[:,n.buses.index],
+              n_r.buses_t.marginal_price.loc[:,n.buses.index], decimal=2)
+
+    if sys.version_info.major >= 3:
+        mu_upper = n.lines_t.mu_upper.loc[:,n.lines.index]
+        co2_mu = n.global_constraints.mu
+        n.lopf(solver_name=solver_name, pyomo=False)
+        equal(n.lines_t.mu_upper.loc[:,n.lines.index], mu_upper, decimal=2)
+        equal(n.global_constraints.mu, co2_mu, decimal=2)
+
+
+def test_l_duals():
+    from pypsa.opt import l_duals, l_values
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n.lopf(solver_name=solver_name, free_memory={})
+    model = n.model
+    buses = list(n.buses.index)
+    snapshots = list(n.snapshots)
+
+    # block-wise extraction matches the extraction element by element
+    duals = [[model.dual[model.power_balance[bus, sn]] for sn in snapshots]
+             for bus in buses]
+    equal(l_duals(model.power_balance, model.dual, False, buses, snapshots), duals)
+    gens = list(n.generators.index)
+    values = [[model.generator_p[gen, sn].value for sn in snapshots]
+              for gen in gens]
+    equal(l_values(model.generator_p, False, gens, snapshots), values)
+
+    # missing constraints give NaN, freeing removes the data and duals
+    n_duals = len(model.dual)
+    extracted = l_duals(model.power_balance, model.dual, True,
+                        buses + ["missing"], snapshots)
+    equal(extracted[:-1], duals)
+    assert np.isnan(extracted[-1]).all()
+    assert len(model.power_balance) == 0
+    assert len(model.dual) == n_duals - len(buses) * len(snapshots)
+
+
+def test_free_memory():
+    import pandas as pd
+    from pypsa.descriptors import empty_network
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+
+    n = pypsa.Network(csv_folder_name)
+    n.generators_t.p_max_pu = n.generators_t.p_max_pu.copy()
+
+    # time-series in any memory layout and of any dtype are restored
+    a = np.arange(6. * len(n.snapshots)).reshape(-1, 3)
+    blocks = {"c": np.ascontiguousarray(a[::2]),
+              "f": np.asfortranarray(a[::2]),
+              "strided": np.asfortranarray(a)[::2],
+              "int": a[::2].astype(int),
+              "bool": a[::2] % 2 == 0,
+              "object": a[::2].astype(str).astype(object)}
+    for k, block in blocks.items():
+        n.loads_t[k] = pd.DataFrame(block, index=n.snapshots,
+                                    columns=["x", "y", "z"], copy=False)
+    expected = {k: df.copy() for k, df in n.loads_t.items()}
+    p_max_pu = n.generators_t.p_max_pu.copy()
+
+    with empty_network(n):
+        assert n.loads_t is None and n.generators_t is None
+    assert type(n.loads_t) is pypsa.descriptors.Dict
+    for k, df in expected.items():
+        pd.testing.assert_frame_equal(n.loads_t[k], df)
+    pd.testing.assert_frame_equal(n.generators_t.p_max_pu, p_max_pu)
+
+    if sys.version_info.major < 3:
+        return
+    for k in blocks:
+        del n.loads_t[k]
+    n.lopf(pyomo=False, solver_name=solver_name)
+    objective, p = n.objective, n.generators_t.p.copy()
+    n.lopf(pyomo=False, solver_name=solver_name, free_memory={"pypsa"})
+    equal(n.objective / objective, 1, decimal=6)
+    equal(n.generators_t.p, p, decimal=4)
+    pd.testing.assert_frame_equal(n.generators_t.p_max_pu, p_max_pu)
 
 
 if __name__ == "__main__":
     test_lopf()
+    test_lopf_size_estimate()
+    test_lopf_basis()
+    test_lopf_references()
+    test_lopf_angles()
+    test_lopf_duals()
+    test_l_duals()
+    test_free_memory()
@@ -44,5 +44,116 @@ def test_lpf():
     np.testing.assert_array_almost_equal(network.links_t.p0[network.links.index],network_r.links_t.p0[network.links.index])
 
 
+def test_consistency_check():
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples", "ac-dc-meshed", "ac-dc-data")
+
+    network = pypsa.Network(csv_folder_name)
+
+    report = network.consistency_check()
+    assert (report.severity != "error").all()
+    network.consistency_check(fail_fast=True)
+
+    gen = network.generators.index[0]
+    network.generators.at[gen, "bus"] = "missing bus"
+    network.generators_t.p_max_pu.iloc[1, 0] = np.nan
+    network.lines.loc[network.lines.index[0], ["x", "r"]] = 0.
+
+    report = network.consistency_check().set_index(["component", "check"])
+    errors = report[report.severity == "error"]
+    assert errors.loc[("Generator", "bus"), "elements"].equals(pd.Index([gen], name="name"))
+    assert errors.loc[("Generator", "nan"), "snapshots"].equals(network.snapshots[[1]])
+    assert ("Line", "impedance") in errors.index
+
+    try:
+        network.consistency_check(fail_fast=True)
+    except ValueError as e:
+        assert gen in str(e)
+    else:
+        raise AssertionError("fail_fast did not raise")
+
+
+def test_calculate_dependent_values():
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples", "ac-dc-meshed", "ac-dc-data")
+
+    network = pypsa.Network(csv_folder_name)
+    network.calculate_dependent_values()
+
+    line = network.lines.index[0]
+    bus = network.lines.at[line, "bus0"]
+    network.lines.at[line, "x"] = 2.
+    network.buses.at[bus, "v_nom"] = 220.
+    network.add("Line", "typed", bus0=bus, bus1=network.lines.at[line, "bus1"],
+                type="Al/St 240/40 2-bundle 220.0", length=10.)
+    network.calculate_dependent_values()
+
+    lines = network.lines
+    assert lines.at[line, "x_pu"] == 2./220.**2
+    assert lines.at["typed", "x"] == network.line_types.at["Al/St 240/40 2-bundle 220.0", "x_per_length"] * 10.
+    np.testing.assert_array_almost_equal(lines.x_pu, lines.x / lines.bus0.map(network.buses.v_nom)**2)
+
+    network.line_types.loc["Al/St 240/40 2-bundle 220.0", "x_per_length"] *= 2
+    network.calculate_dependent_values()
+    assert network.lines.at["typed", "x"] == network.line_types.at["Al/St 240/40 2-bundle 220.0", "x_per_length"] * 10.
+
+
+def test_parallel_lpf():
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples", "ac-dc-meshed", "ac-dc-data")
+
+    network = pypsa.Network(csv_folder_name)
+    network.lpf()
+
+    for executor in ["thread", "process"]:
+        network_p = network.copy()
+        network_p.lpf(workers=3, executor=executor)
+
+        for c in network.iterate_components(["Bus", "Generator", "Line", "Link"]):
+            for attr in ["p", "p0", "p1", "v_ang", "v_mag_pu"]:
+                if attr in c.pnl and not c.pnl[attr].empty:
+                    np.testing.assert_array_equal(network_p.pnl(c.name)[attr], c.pnl[attr])
+
+
+def test_solve_B():
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples", "ac-dc-meshed", "ac-dc-data")
+
+    network = pypsa.Network(csv_folder_name)
+    network.lpf()
+
+    sub_network = network.sub_networks.obj[network.sub_networks.carrier == "AC"].iloc[0]
+    factor = sub_network._B_factor
+    B = sub_network.B[1:, 1:].toarray()
+    p = np.random.RandomState(0).rand(B.shape[0], 3)
+    np.testing.assert_array_almost_equal(pypsa.pf.solve_B(sub_network, p), np.linalg.solve(B, p))
+
+    # the factorisation is reused as long as B is unchanged
+    v_ang = network.buses_t.v_ang.copy()
+    sub_network.lpf()
+    assert sub_network._B_factor is factor
+    np.testing.assert_array_equal(network.buses_t.v_ang, v_ang)
+
+    line = sub_network.lines_i()[0]
+    network.lines.at[line, "x"] *= 2
+    network.calculate_dependent_values()
+    sub_network.lpf()
+    assert sub_network._B_factor is not factor
+    B = sub_network.B[1:, 1:].toarray()
+    np.testing.assert_array_almost_equal(pypsa.pf.solve_B(sub_network, p), np.linalg.solve(B, p))
+
+    # a bus connected by a branch without susceptance gives NaN angles
+    network = pypsa.Network()
+    network.set_snapshots(range(2))
+    network.madd("Bus", ["bus0", "bus1", "bus2"])
+    network.add("Line", "line0", bus0="bus0", bus1="bus1", x=0.1, s_nom=1.)
+    network.add("Line", "line1", bus0="bus1", bus1="bus2", x=np.inf, s_nom=1.)
+    network.add("Generator", "gen", bus="bus0", control="Slack")
+    network.add("Load", "load", bus="bus1", p_set=1.)
+    network.lpf()
+    assert (network.buses_t.v_ang["bus0"] == 0.).all()
+    assert network.buses_t.v_ang["bus2"].isnull().all()
+
+
 if __name__ == "__main__":
     test_lpf()
+    test_consistency_check()
+    test_calculate_dependent_values()
+    test_parallel_lpf()
+    test_solve_B()
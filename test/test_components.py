@@ -0,0 +1,41 @@
+import pypsa
+
+
+def test_component_schema():
+    n1 = pypsa.Network()
+    n2 = pypsa.Network()
+
+    # the processed attributes are computed once and shared ...
+    assert n1._schema is n2._schema
+    assert n1.components["Generator"]["attrs"].equals(
+        n2.components["Generator"]["attrs"])
+
+    # ... but changes to the attributes of one network do not leak
+    n1.components["Generator"]["attrs"].loc["p_nom", "default"] = 5.
+    n1.components["LineType"]["standard_types"].loc[:, "x_per_length"] = 0.
+    n2.add("Bus", "bus")
+    n2.add("Generator", "gen", bus="bus")
+    assert n2.generators.at["gen", "p_nom"] == 0.
+    assert (n2.components["LineType"]["standard_types"].x_per_length > 0).all()
+    assert pypsa.Network().components["Generator"]["attrs"].at["p_nom", "default"] == 0.
+
+    # the cache key depends on the content, not on the objects
+    attrs = pypsa.descriptors.Dict({k: v.copy() for k, v in
+                                    pypsa.components.component_attrs.items()})
+    assert pypsa.Network(override_component_attrs=attrs)._schema is n1._schema
+
+    attrs["Generator"].loc["my_attr"] = ["float", "MW", 1., "extra", "Input (optional)"]
+    n3 = pypsa.Network(override_component_attrs=attrs)
+    assert n3._schema is not n1._schema
+    assert "my_attr" in n3.generators.columns
+    assert "my_attr" not in n1.generators.columns
+
+    attrs["Generator"].loc["my_attr", "default"] = 2.
+    n4 = pypsa.Network(override_component_attrs=attrs)
+    assert n4._schema is not n3._schema
+    n4.add("Generator", "gen")
+    assert n4.generators.at["gen", "my_attr"] == 2.
+
+
+if __name__ == "__main__":
+    test_component_schema()
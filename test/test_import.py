@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+
+def test_lazy_import():
+    if sys.version_info < (3, 7):
+        return
+
+    # pyomo and the optimisation modules are only imported on first use
+    code = ("import sys, pypsa; n = pypsa.Network(); "
+            "assert 'pyomo' not in sys.modules; "
+            "assert 'pypsa.opf' not in sys.modules; "
+            "assert pypsa.Network.opf.__name__ == 'network_opf'; "
+            "assert 'pyomo' in sys.modules")
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+if __name__ == "__main__":
+    test_lazy_import()
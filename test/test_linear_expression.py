@@ -0,0 +1,112 @@
+import pypsa
+import os
+import sys
+import numpy as np
+from numpy.testing import assert_array_almost_equal as equal
+
+solver_name = 'glpk' if sys.platform == 'win32' else 'cbc'
+
+
+def test_linear_expression():
+    from pypsa.linopt import (LinearExpression, get_var, linexpr,
+                              define_constraints, join_exprs)
+
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+    n = pypsa.Network(csv_folder_name)
+    limit = 15000
+
+    def limit_with_strings(n, sns):
+        p = get_var(n, 'Generator', 'p')
+        for bus, gens in n.generators.groupby('bus').groups.items():
+            lhs = join_exprs(linexpr((n.snapshot_weightings[sns].values[:, None],
+                                      p[gens])))
+            define_constraints(n, lhs, '<=', limit, 'Bus', 'gen_limit_' + bus)
+
+    def limit_with_expression(n, sns):
+        p = get_var(n, 'Generator', 'p')
+        lhs = (LinearExpression((n.snapshot_weightings[sns].values[:, None], p))
+               .sum(0).groupby(n.generators.bus))
+        assert lhs.shape == (n.generators.bus.nunique(),)
+        define_constraints(n, lhs, '<=', limit, 'Bus', 'gen_limit')
+
+    n.lopf(pyomo=False, solver_name=solver_name,
+           extra_functionality=limit_with_strings)
+    objective = n.objective
+    generation = n.generators_t.p.copy()
+
+    n.lopf(pyomo=False, solver_name=solver_name,
+           extra_functionality=limit_with_expression)
+    equal(n.objective / objective, 1, decimal=6)
+    equal(n.generators_t.p, generation, decimal=2)
+    assert (n.generators_t.p.sum().groupby(n.generators.bus).sum()
+            <= limit + 1e-3).all()
+
+
+def test_read_solution():
+    if sys.version_info.major < 3:
+        return
+    from tempfile import mkstemp
+    from pypsa.linopt import read_cbc_solution, read_glpk_section
+
+    # solution of a cbc run with '-printingOptions all'
+    cbc = ("Optimal - objective value 5.00000000\n"
+           "      0 c1                     2                       3\n"
+           "      1 c2                     1                       0\n"
+           "      0 x1                     1                      -1\n"
+           "**       1 x3                    19                       0\n")
+
+    # rows and columns of a glpk report, long names span two lines
+    glpk = ("   No.   Row name   St   Activity     Lower bound   Upper bound    Marginal\n"
+            "------ ------------ -- ------------- ------------- ------------- -------------\n"
+            "     1 c1           NL             2             2                           3\n"
+            "     2 c000000000002\n"
+            "                    B              1                           5\n"
+            "     3 c3           NL             1             1                       < eps\n"
+            "\n"
+            "   No. Column name  St   Activity     Lower bound   Upper bound    Marginal\n"
+            "------ ------------ -- ------------- ------------- ------------- -------------\n"
+            "     1 x1           NU             1             0             1            -1\n"
+            "     2 x000000000002\n"
+            "                    B            2.5             0\n"
+            "\n"
+            "   No. Column name       Activity     Lower bound   Upper bound\n"
+            "------ ------------    ------------- ------------- -------------\n"
+            "     1 x1                          1             0             1\n"
+            "\n")
+
+    fd, fn = mkstemp(suffix='.sol')
+    try:
+        with open(fn, 'w') as f:
+            f.write(cbc)
+        header, x, c = read_cbc_solution(fn, 5, 4, chunksize=64)
+        assert header.startswith("Optimal - objective value 5")
+        equal(x, [np.nan, 1, np.nan, 19, np.nan])
+        equal(c, [np.nan, 3, 0, np.nan])
+
+        with open(fn, 'w') as f:
+            f.write(glpk)
+        with open(fn) as f:
+            duals = np.full(4, np.nan)
+            assert read_glpk_section(f, duals, 'Marginal', chunksize=2)
+            equal(duals, [np.nan, 3, 0, 0])
+            x = np.full(3, np.nan)
+            assert read_glpk_section(f, x, 'Activity')
+            equal(x, [np.nan, 1, 2.5])
+            # sections of MILP reports have no marginals
+            assert not read_glpk_section(f, np.full(2, np.nan), 'Marginal')
+    finally:
+        os.close(fd); os.remove(fn)
+
+    # the status of non-optimal solutions is returned without the values
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+    n = pypsa.Network(csv_folder_name)
+    n.global_constraints.constant = -1.
+    status, cond = n.lopf(pyomo=False, solver_name=solver_name)
+    assert (status, cond) == ('warning', 'infeasible')
+
+
+if __name__ == "__main__":
+    test_linear_expression()
+    test_read_solution()
@@ -19,7 +19,9 @@ import pytest
 
 @pytest.mark.skipif(pypower_version <= '5.0.0',
                     reason="PyPOWER 5.0.0 is broken with recent numpy and unmaintained since Aug 2017.")
-def test_pypower_case():
+@pytest.mark.parametrize("algorithm,use_seed", [("nr", False), ("nr", "dc"),
+                                                ("fdxb", False), ("fdbx", "dc")])
+def test_pypower_case(algorithm, use_seed):
 
     #ppopt is a dictionary with the details of the optimization routine to run
     ppopt = ppoption(PF_ALG=2)
@@ -58,7 +60,8 @@ def test_pypower_case():
     #T since version 0.8.0
     network.transformers.model = "pi"
 
-    network.pf()
+    pf = network.pf(algorithm=algorithm, use_seed=use_seed, x_tol=1e-10)
+    assert pf.converged.all().all()
 
     #compare branch flows
     for c in network.iterate_components(network.passive_branch_components):
@@ -86,3 +89,117 @@ def test_pypower_case():
     v_ang_pypower = (results_df["bus"]["v_ang"] - pypower_slack_angle)*np.pi/180.
 
     np.testing.assert_array_almost_equal(v_ang_pypsa,v_ang_pypower)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_pf(executor):
+
+    network = pypsa.Network()
+    network.import_from_pypower_ppc(case())
+    network.transformers.model = "pi"
+
+    # an isolated bus forms a single-bus sub-network
+    network.add("Bus", "isolated", v_nom=network.buses.v_nom.iloc[0])
+    network.add("Load", "isolated load", bus="isolated", p_set=10., q_set=2.)
+    network.add("Generator", "isolated gen", bus="isolated", control="Slack")
+
+    network.set_snapshots(range(5))
+    scaling = pd.Series(np.linspace(0.8, 1.2, 5), network.snapshots)
+    for c in ["p_set", "q_set"]:
+        network.loads_t[c] = pd.DataFrame(np.outer(scaling, network.loads[c]),
+                                          network.snapshots, network.loads.index)
+
+    network_p = network.copy()
+    pf = network.pf()
+    pf_p = network_p.pf(workers=2, executor=executor)
+
+    assert pf_p.converged.all().all()
+    pd.testing.assert_frame_equal(pf_p.n_iter, pf.n_iter)
+    pd.testing.assert_frame_equal(pf_p.converged, pf.converged)
+    np.testing.assert_array_almost_equal(network_p.generators_t.p["isolated gen"],
+                                         10.*scaling)
+    # the products on blocks of snapshots may differ in the last bits
+    for c in network.iterate_components(["Bus", "Generator", "Line", "Transformer"]):
+        for attr in ["p", "q", "p0", "q0", "p1", "q1", "v_ang", "v_mag_pu"]:
+            if attr in c.pnl and not c.pnl[attr].empty:
+                np.testing.assert_array_almost_equal(network_p.pnl(c.name)[attr], c.pnl[attr],
+                                                     decimal=10)
+
+
+def _reference_jacobian(Y, V, n_pv, slack_weights=None):
+    # Jacobian as assembled from the sparse blocks before _Jacobian
+    from scipy.sparse import csr_matrix, hstack as shstack, vstack as svstack
+
+    index = np.r_[:len(V)]
+    V_diag = csr_matrix((V,(index,index)))
+    V_norm_diag = csr_matrix((V/abs(V),(index,index)))
+    I_diag = csr_matrix((Y*V,(index,index)))
+
+    dS_dVa = 1j*V_diag*np.conj(I_diag - Y*V_diag)
+    dS_dVm = V_norm_diag*np.conj(I_diag) + V_diag*np.conj(Y*V_norm_diag)
+
+    J10 = dS_dVa[1+n_pv:,1:].imag
+    J11 = dS_dVm[1+n_pv:,1+n_pv:].imag
+    if slack_weights is not None:
+        J_P_blocks = [dS_dVa[:,1:].real, dS_dVm[:,1+n_pv:].real,
+                      csr_matrix(slack_weights,(1,len(V))).T]
+        J_Q_blocks = [J10, J11, csr_matrix((1,len(V)-1-n_pv)).T]
+    else:
+        J_P_blocks = [dS_dVa[1:,1:].real, dS_dVm[1:,1+n_pv:].real]
+        J_Q_blocks = [J10, J11]
+
+    return svstack([shstack(J_P_blocks), shstack(J_Q_blocks)], format="csr")
+
+
+def test_jacobian():
+    from pypsa.pf import _Jacobian
+
+    network = pypsa.Network()
+    network.import_from_pypower_ppc(case())
+    network.transformers.model = "pi"
+    network.pf()
+
+    sub_network = network.sub_networks.obj.iloc[0]
+    Y = sub_network.Y
+    n_pv = len(sub_network.pvs)
+    n = Y.shape[0]
+    state = np.random.RandomState(0)
+
+    for distribute_slack in [False, True]:
+        jacobian = _Jacobian(Y, n_pv, distribute_slack)
+        # the Jacobian is reassembled in place for new voltages
+        for i in range(2):
+            V = state.uniform(0.9, 1.1, n)*np.exp(1j*state.uniform(-0.3, 0.3, n))
+            slack_weights = state.dirichlet(np.ones(n)) if distribute_slack else None
+            J = jacobian(V, slack_weights)
+            J_ref = _reference_jacobian(Y, V, n_pv, slack_weights)
+            assert J.shape == J_ref.shape
+            np.testing.assert_array_almost_equal(J.toarray(), J_ref.toarray(), decimal=10)
+
+            F = state.rand(J.shape[0])
+            np.testing.assert_array_almost_equal(jacobian.solve(J, F),
+                                                 np.linalg.solve(J_ref.toarray(), F))
+
+
+def test_temporal_seed():
+
+    network = pypsa.Network()
+    network.import_from_pypower_ppc(case())
+    network.transformers.model = "pi"
+
+    network.set_snapshots(range(24))
+    scaling = pd.Series(1 + 0.3*np.sin(2*np.pi*np.arange(24)/24), network.snapshots)
+    for c in ["p_set", "q_set"]:
+        network.loads_t[c] = pd.DataFrame(np.outer(scaling, network.loads[c]),
+                                          network.snapshots, network.loads.index)
+
+    pf = network.pf(x_tol=1e-10)
+    v_ang = network.buses_t.v_ang.copy()
+    v_mag_pu = network.buses_t.v_mag_pu.copy()
+
+    for use_seed in ["previous", "extrapolate"]:
+        pf_seed = network.pf(use_seed=use_seed, x_tol=1e-10)
+        assert pf_seed.converged.all().all()
+        assert pf_seed.n_iter.values.sum() < pf.n_iter.values.sum()
+        np.testing.assert_array_almost_equal(network.buses_t.v_ang, v_ang)
+        np.testing.assert_array_almost_equal(network.buses_t.v_mag_pu, v_mag_pu)
@@ -73,5 +73,26 @@ def test_pf_distributed_slack():
         (network.generators_t.p - network.generators_t.p_set).apply(normed, axis=1)
     )
 
+def test_pf_distributed_slack_singlebus():
+    network = pypsa.Network()
+    network.set_snapshots(range(3))
+    network.add("Bus", "bus")
+    network.madd("Generator", ["gen0", "gen1", "gen2"], bus="bus", p_nom=[1., 2., 0.5],
+                 p_set=np.array([[1., 2., 0.], [0., 0., 3.], [2., 2., 2.]]))
+    network.add("Load", "load", bus="bus", p_set=7.)
+
+    for slack_weights in ['p_set', 'p_nom']:
+        network.pf(distribute_slack=True, slack_weights=slack_weights)
+
+        slack = network.generators_t.p - network.generators_t.p_set
+        np.testing.assert_array_almost_equal(slack.sum(axis=1), 7. - network.generators_t.p_set.sum(axis=1))
+        if slack_weights == 'p_nom':
+            weights = np.tile(network.generators.p_nom.pipe(normed).values, (3, 1))
+        else:
+            weights = network.generators_t.p_set.apply(normed, axis=1).values
+        np.testing.assert_array_almost_equal(slack.apply(normed, axis=1), weights)
+
+
 if __name__ == "__main__":
     test_pf_distributed_slack()
+    test_pf_distributed_slack_singlebus()
@@ -0,0 +1,108 @@
+import pypsa
+import os
+import sys
+import numpy as np
+from pypsa.profiling import add_hook, remove_hook, stage, profiled, Profile
+
+solver_name = 'glpk' if sys.platform == 'win32' else 'cbc'
+
+
+def test_hooks():
+    events = []
+    hook = events.append
+    counts = {"x": 0}
+
+    @profiled(counters=lambda k: {"x": counts["x"]}, info=lambda k: {"k": k})
+    def inner(k):
+        counts["x"] += k
+
+    add_hook(hook)
+    try:
+        with stage("outer", size=lambda: {"total": counts["x"]}) as info:
+            inner(2)
+            inner(3)
+            info["note"] = "extended"
+        try:
+            with stage("failing"):
+                raise ValueError()
+        except ValueError:
+            pass
+    finally:
+        remove_hook(hook)
+
+    # nested stages finish before the enclosing ones
+    assert [e["stage"] for e in events] == ["inner", "inner", "outer", "failing"]
+    assert [e["path"] for e in events] == ["outer/inner", "outer/inner", "outer", "failing"]
+    assert [e["level"] for e in events] == [1, 1, 0, 0]
+    assert [e.get("x") for e in events[:2]] == [2, 3]
+    assert [e.get("k") for e in events[:2]] == [2, 3]
+    assert events[2]["total"] == 5 and events[2]["note"] == "extended"
+    assert events[2]["wall"] >= events[0]["wall"] + events[1]["wall"]
+    for event in events:
+        assert set(Profile.columns) <= set(event)
+        assert np.isnan(event["objects"])
+
+    # removed hooks are not called anymore
+    inner(1)
+    with stage("outer"):
+        pass
+    assert len(events) == 4
+    assert pypsa.profiling._hooks == [] and pypsa.profiling._open_stages() == []
+
+
+def test_profile_lopf():
+    if sys.version_info.major < 3:
+        return
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+    n = pypsa.Network(csv_folder_name)
+
+    with Profile(objects=True) as profile:
+        n.lopf(pyomo=False, solver_name=solver_name)
+    assert pypsa.profiling._hooks == []
+    df = profile.to_frame()
+
+    assert list(df.columns[:len(Profile.columns)]) == Profile.columns
+    assert (df.level == df.path.str.count("/")).all()
+    assert df.path.iloc[-1] == "network_lopf"
+    assert df.objects.notnull().all()
+
+    # the counters of the stages add up to the size of the problem
+    build = df[df.path.str.startswith("network_lopf/prepare_lopf/")
+               & (df.level == 2)]
+    prepare = df.set_index("path").loc["network_lopf/prepare_lopf"]
+    assert build.variables.sum() == prepare.variables == n._xCounter - 1
+    assert build.constraints.sum() == prepare.constraints == n._cCounter - 1
+
+
+def test_profile_parallel_pf():
+    if sys.version_info.major < 3:
+        return
+    csv_folder_name = os.path.join(os.path.dirname(__file__), "..", "examples",
+                                   "ac-dc-meshed", "ac-dc-data")
+    n = pypsa.Network(csv_folder_name)
+    # the non-linear power flow only supports AC sub-networks
+    dc_buses = n.buses.index[n.buses.carrier == "DC"]
+    n.mremove("Link", n.links.index)
+    n.mremove("Line", n.lines.index[n.lines.bus0.isin(dc_buses)])
+    n.mremove("Bus", dc_buses)
+
+    with Profile() as profile:
+        n.pf(workers=2, executor='thread')
+    df = profile.to_frame()
+
+    # the stages of the worker threads are nested into the power flow,
+    # not into each other or into the stages of the main thread
+    assert (df.level == df.path.str.count("/")).all()
+    assert df.path.str.startswith("network_pf").all()
+    assert df.path.iloc[-1] == "network_pf"
+    sub_network_pf = df[df.stage.str.startswith("sub_network_pf")]
+    assert (sub_network_pf.sub_network.value_counts() == 2).all()
+    assert (sub_network_pf.path == "network_pf/" + sub_network_pf.stage).all()
+    assert pypsa.profiling._open_stages() == []
+
+
+if __name__ == "__main__":
+    test_hooks()
+    test_profile_lopf()
+    test_profile_parallel_pf()
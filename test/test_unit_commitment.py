@@ -122,15 +122,17 @@ and is not very comprehensive."""
 
     solver_name = "glpk"
 
-    nu.lopf(nu.snapshots,solver_name=solver_name)
-
     expected_status = np.array([[1,0,1,1],[1,1,1,0]],dtype=float).T
 
-    np.testing.assert_array_almost_equal(nu.generators_t.status.values,expected_status)
-
     expected_dispatch = np.array([[3900,0,4900,3000],[100,800,100,0]],dtype=float).T
 
-    np.testing.assert_array_almost_equal(nu.generators_t.p.values,expected_dispatch)
+    for pyomo in [True, False]:
+
+        nu.lopf(nu.snapshots,solver_name=solver_name,pyomo=pyomo)
+
+        np.testing.assert_array_almost_equal(nu.generators_t.status.values,expected_status)
+
+        np.testing.assert_array_almost_equal(nu.generators_t.p.values,expected_dispatch)
 
 
 
@@ -166,15 +168,17 @@ and is not very comprehensive."""
 
     solver_name = "glpk"
 
-    nu.lopf(nu.snapshots,solver_name=solver_name)
-
     expected_status = np.array([[0,0,1,1],[1,1,0,0]],dtype=float).T
 
-    np.testing.assert_array_almost_equal(nu.generators_t.status.values,expected_status)
-
     expected_dispatch = np.array([[0,0,3000,8000],[3000,800,0,0]],dtype=float).T
 
-    np.testing.assert_array_almost_equal(nu.generators_t.p.values,expected_dispatch)
+    for pyomo in [True, False]:
+
+        nu.lopf(nu.snapshots,solver_name=solver_name,pyomo=pyomo)
+
+        np.testing.assert_array_almost_equal(nu.generators_t.status.values,expected_status)
+
+        np.testing.assert_array_almost_equal(nu.generators_t.p.values,expected_dispatch)
 
 if __name__ == "__main__":
     test_minimum_down_time()